@@ -0,0 +1,60 @@
+'''
+Append-only journal of the evaluated matlab commands, stored in sqlite and indexed by the
+uuid varnames each line mentions, so that the log of one session can be extracted in time
+proportional to its own lines, while other threads keep appending.
+'''
+import re
+import sqlite3
+import threading
+
+_re_token = re.compile(r'(?:idata|ifunc)?_[0-9a-f]{32}')
+
+def line_tokens(line):
+    ''' returns the set of varnames mentioned in line, see ifitlib._get_idata_uuid and friends '''
+    return set(_re_token.findall(line))
+
+class Journal:
+    ''' appends use one shared connection, extractions open their own '''
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = self._connect()
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS lines (id INTEGER PRIMARY KEY AUTOINCREMENT, line TEXT NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS tokens (token TEXT NOT NULL, line_id INTEGER NOT NULL, PRIMARY KEY (token, line_id)) WITHOUT ROWID")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL") # readers and the appending writer do not block each other
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def append(self, lines):
+        ''' appends lines, in order, indexing each by its varnames, lines without varnames can never be extracted and are dropped '''
+        lines = [(l, line_tokens(l)) for l in lines]
+        lines = [(l, tokens) for (l, tokens) in lines if tokens]
+        if len(lines) == 0:
+            return
+        with self.lock, self.conn:
+            for line, tokens in lines:
+                line_id = self.conn.execute("INSERT INTO lines (line) VALUES (?)", (line, )).lastrowid
+                self.conn.executemany("INSERT INTO tokens VALUES (?, ?)", [(t, line_id) for t in tokens])
+
+    def extract(self, varnames):
+        ''' returns the newline terminated lines mentioning any of varnames, in order of appending, and removes them from the journal '''
+        varnames = list(varnames)
+        if len(varnames) == 0:
+            return []
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("CREATE TEMP TABLE extract_tokens (token TEXT PRIMARY KEY)")
+                conn.executemany("INSERT OR IGNORE INTO extract_tokens VALUES (?)", [(vn, ) for vn in varnames])
+                rows = conn.execute(
+                    "SELECT id, line FROM lines WHERE id IN "
+                    "(SELECT line_id FROM tokens JOIN extract_tokens ON tokens.token = extract_tokens.token) ORDER BY id").fetchall()
+                conn.executemany("DELETE FROM tokens WHERE token = ? AND line_id = ?", [(t, i) for (i, l) in rows for t in line_tokens(l)])
+                conn.executemany("DELETE FROM lines WHERE id = ?", [(i, ) for (i, l) in rows])
+            return [l + "\n" for (i, l) in rows]
+        finally:
+            conn.close()
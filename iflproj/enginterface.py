@@ -14,6 +14,7 @@ import os
 import sys
 import base64
 from collections import OrderedDict
+from contextlib import contextmanager
 import traceback
 
 from nodespeak import RootNode, FuncNode, ObjNode, MethodNode, MethodAsFunctionNode, add_subnode, remove_subnode
@@ -88,6 +89,9 @@ class ObjReprJson:
     def get_repr(self):
         dct = self._get_full_repr_dict()
         return dct
+    def get_plotwindow_repr(self, window):
+        ''' plotdata of a zoomed-in plot window, at the resolution of that window, or None if not supported '''
+        return None
     def set_user_data(self, json_obj):
         pass
 
@@ -102,6 +106,15 @@ class MiddleWare:
         return getattr(self, "save")
     def get_load_fct(self):
         return getattr(self, "load")
+    def get_save_deferred_fct(self):
+        return getattr(self, "save_deferred")
+    def get_footprint(self):
+        ''' approximate number of bytes held by the middleware on behalf of the graph '''
+        return 0
+    @contextmanager
+    def scope(self):
+        ''' context in which the graph's objects are used, e.g. the engine holding them '''
+        yield
     def finalize(self):
         if self.was_finalized:
             raise MiddleWare.WasAlreadyFinalizedException()
@@ -314,9 +327,24 @@ class FlatGraph:
             self.node_cmds_cache[key] = (coord[0], coord[1], cached_cmd[2], cached_cmd[3], cached_cmd[4], cached_cmd[5])
         _log('graph coords: %d coordinate sets' % len(keys))
 
-    def execute_node(self, id):
-        ''' execute a node and return a json representation of the result '''
+    def execute_node(self, id, listener=None):
+        '''
+        execute a node and return a json representation of the result
+
+        listener: optional listener(event, data) receiving "started" and "finished" events for every
+        called node, with data {"id" : node id}, and "dataupdate" events {owner id : repr} as soon as an
+        upstream method call has modified its owner object, the updates of node id itself are returned only
+        '''
         _log("execute_node: %s" % id)
+        def node_listener(event, node):
+            listener(event, { "id" : node.name })
+            if event == "finished" and node.name != id:
+                try:
+                    for key in self._owner_ids(node):
+                        listener("dataupdate", { key : self._datarepr(key) })
+                except Exception as e:
+                    # intermediate updates are a courtesy, the run goes on
+                    _log("intermediate data update failed (%s): %s" % (node.name, str(e)), error=True)
         try:
             n = self.root.subnodes[id]
 
@@ -326,29 +354,16 @@ class FlatGraph:
                 self.middleware.deregister(old)
 
             # execute (assigns a new object or None), log and register
-            obj = self.middleware.execute_through_proxy( lambda _n=n: execute_node(_n) )
+            obj = self.middleware.execute_through_proxy( lambda _n=n: execute_node(_n, node_listener if listener else None) )
             # NOTE: deregistration is handled through the execute proxy call
 
             _log("exe yields: %s" % str(obj))
             _log("returning json representation...")
 
             retobj = {'dataupdate': {} }
-            update_lst = [id]
-            if type(n) in (MethodAsFunctionNode, ):
-                update_lst.append([o[0].name for o in n.parents if type(o[0])==ObjNode ][0]) # find "owner" id...
-            if type(n) in (MethodNode, ):
-                update_lst.append([o.name for o in n.owners if type(o) == ObjNode][0]) # find "owner" id...
+            update_lst = [id] + self._owner_ids(n)
             for key in update_lst:
-                try:
-                    retobj['dataupdate'][key] = None
-                    m = self.root.subnodes[key]
-                    if m.exemodel().can_assign():
-                        objm = m.get_object()
-                        if objm:
-                            retobj['dataupdate'][key] = objm.get_repr()
-                except Exception as e:
-                    s = traceback.format_exc()
-                    raise ObjectRepresentationException(s)
+                retobj['dataupdate'][key] = self._datarepr(key)
             return retobj
 
         except InternalExecutionException as e:
@@ -364,6 +379,37 @@ class FlatGraph:
             _log("Exotic engine error (%s): %s" % (id, str(e)), error=True)
             return {'error' : "%s: %s" % (type(e).__name__, str(e))}
 
+    def _owner_ids(self, n):
+        ''' ids of the objects modified by calling n, i.e. the owner of a method node '''
+        if type(n) in (MethodAsFunctionNode, ):
+            return [[o[0].name for o in n.parents if type(o[0])==ObjNode ][0]] # find "owner" id...
+        if type(n) in (MethodNode, ):
+            return [[o.name for o in n.owners if type(o) == ObjNode][0]] # find "owner" id...
+        return []
+
+    def _datarepr(self, key):
+        ''' the representation of the object of node key, or None '''
+        try:
+            m = self.root.subnodes[key]
+            if m.exemodel().can_assign():
+                objm = m.get_object()
+                if objm:
+                    return objm.get_repr()
+            return None
+        except Exception as e:
+            s = traceback.format_exc()
+            raise ObjectRepresentationException(s)
+
+    def extract_plotwindow(self, id, window):
+        ''' returns the plotdata of the object of node id for the plot window described by window, or None '''
+        n = self.root.subnodes.get(id, None)
+        if n == None or type(n) not in (ObjNode, ):
+            return None
+        obj = n.get_object()
+        if obj == None:
+            return None
+        return obj.get_plotwindow_repr(window)
+
     def reset_all_objs(self):
         ''' assigns None to all object handle nodes '''
         for key in self.root.subnodes.keys():
@@ -726,7 +772,7 @@ def get_nodetype_candidates(pymodule):
     '''
     Investigate any module and return classes, class methods and functions under the following conditions:
     
-    1) Any entity prefixed by underscore ('_') is omitted.
+    1) Any entity prefixed by underscore ('_') is omitted, as are classes and functions imported from other modules.
     2) Any class not inheriting from a class name in 'excepted_classes' is omitted.
     '''
     classes = []
@@ -775,6 +821,8 @@ def get_nodetype_candidates(pymodule):
         # get functions
         elif inspect.isfunction(member[1]):
             fct = member[1]
+            if fct.__module__ != pymodule.__name__:
+                continue
             isprivatefunction = re.match('_', fct.__name__)
             if not isprivatefunction:
                 functions.append(fct)
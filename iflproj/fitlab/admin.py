@@ -1,7 +1,7 @@
 from django.contrib import admin
-from .models import GraphUiRequest, GraphReply, GraphSession, TabId
+from .models import GraphUiRequest, GraphSession, GraphSessionBlobs, TabId
 
 admin.site.register(GraphUiRequest)
-admin.site.register(GraphReply)
 admin.site.register(GraphSession)
+admin.site.register(GraphSessionBlobs)
 admin.site.register(TabId)
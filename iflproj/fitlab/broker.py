@@ -0,0 +1,295 @@
+'''
+Local ipc between the web processes and the worker process.
+
+The worker hosts a unix socket server, to which web processes send single json line
+requests and receive single json line replies. Replies to ui requests are held here, in
+memory, until taken by the waiting web request or expired, and web requests briefly long-poll
+the execution events published by the worker. The broker also caches the tab ownership
+table TabId for all web processes.
+'''
+import os
+import json
+import time
+import gzip
+import base64
+import socket
+import threading
+import socketserver
+from collections import deque, OrderedDict
+
+READY_TTL_S = 600
+REPLIES_MAX_BYTES = 256*1024*1024
+EVENTS_BUFFER_LEN = 200
+TAB_TTL_S = 86400
+TAB_SWEEP_INTERVAL_S = 60
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            msg = json.loads(self.rfile.readline().decode('utf-8'))
+            ans = self.server.broker.handle(msg)
+        except Exception as e:
+            ans = { "error" : str(e) }
+        self.wfile.write((json.dumps(ans) + "\n").encode('utf-8'))
+
+def _reply_size(reply_json, reply_gz):
+    return len(reply_json or "") + len(reply_gz or b"")
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class TabTable:
+    '''
+    Cache of the tab ownership table TabId, the newest tab of a session owns it: every session is owned by
+    at most one browser tab, the most recently added or taken over. Tabs unknown here are validated against
+    TabId by the web process and then added. Tabs which have not been validated for TAB_TTL_S are expired
+    in bulk sweeps.
+    '''
+    def __init__(self):
+        self.owners = {} # gs_id -> owning tab_id
+        self.tabs = {} # tab_id -> [gs_id, last seen, last time seen was persisted]
+        self.lock = threading.Lock()
+        self.swept = time.time()
+
+    def _sweep(self, now):
+        if now - self.swept < TAB_SWEEP_INTERVAL_S:
+            return
+        self.swept = now
+        for tab_id in [t for t in self.tabs if now - self.tabs[t][1] > TAB_TTL_S]:
+            self._drop(tab_id)
+
+    def _drop(self, tab_id):
+        gs_id = self.tabs.pop(tab_id)[0]
+        if self.owners.get(gs_id, None) == tab_id:
+            del self.owners[gs_id]
+
+    def add(self, gs_id, tab_id):
+        ''' caches tab_id, which becomes the owner of gs_id '''
+        gs_id = str(gs_id)
+        tab_id = str(tab_id)
+        with self.lock:
+            now = time.time()
+            self._sweep(now)
+            old = self.owners.get(gs_id, None)
+            if old is not None and old != tab_id:
+                self._drop(old)
+            self.tabs[tab_id] = [gs_id, now, now]
+            self.owners[gs_id] = tab_id
+
+    def validate(self, gs_id, tab_id):
+        '''
+        returns (valid, touch), where valid is True if tab_id is the owner of gs_id, False if it was superseded,
+        and None if tab_id is not cached, touch is True if the last seen time of the tab is due to be persisted
+        '''
+        gs_id = str(gs_id)
+        tab_id = str(tab_id)
+        with self.lock:
+            now = time.time()
+            self._sweep(now)
+            tab = self.tabs.get(tab_id, None)
+            if not tab or tab[0] != gs_id:
+                return None, False
+            if self.owners.get(gs_id, None) != tab_id:
+                self._drop(tab_id)
+                return False, False
+            tab[1] = now
+            touch = now - tab[2] > TAB_SWEEP_INTERVAL_S
+            if touch:
+                tab[2] = now
+            return True, touch
+
+    def takeover(self, gs_id, tab_id):
+        ''' makes tab_id the owner of gs_id, dropping all other tabs of gs_id '''
+        gs_id = str(gs_id)
+        tab_id = str(tab_id)
+        with self.lock:
+            for other in [t for t in self.tabs if self.tabs[t][0] == gs_id and t != tab_id]:
+                self._drop(other)
+            now = time.time()
+            self.tabs[tab_id] = [gs_id, now, now]
+            self.owners[gs_id] = tab_id
+
+class Broker:
+    ''' worker side, keeps track of stored replies and buffers execution events, waking up waiters '''
+    def __init__(self, path):
+        self.path = path
+        self.replies = OrderedDict() # reqid -> (reply_json, reply_gz, time stored), oldest first
+        self.replies_bytes = 0
+        self.events = {} # gs_id -> deque of (seq, event, data, time of publication, run key)
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.tabs = TabTable()
+        self.server = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.server = _Server(self.path, _Handler)
+        self.server.broker = self
+        os.chmod(self.path, 0o660)
+        t = threading.Thread(target=self.server.serve_forever)
+        t.setDaemon(True)
+        t.setName('broker')
+        t.start()
+
+    def shutdown(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _pop_reply(self, reqid):
+        reply_json, reply_gz, _ = self.replies.pop(reqid)
+        self.replies_bytes -= _reply_size(reply_json, reply_gz)
+        return reply_json, reply_gz
+
+    def put_reply(self, reqid, reply_json, reply_gz=None):
+        '''
+        stores the reply to reqid and wakes up its waiter, replies nobody took are dropped after
+        READY_TTL_S, or oldest first while they exceed REPLIES_MAX_BYTES
+        '''
+        reqid = str(reqid)
+        with self.cond:
+            now = time.time()
+            if reqid in self.replies:
+                self._pop_reply(reqid)
+            self.replies[reqid] = (reply_json, reply_gz, now)
+            self.replies_bytes += _reply_size(reply_json, reply_gz)
+            while len(self.replies) > 1:
+                oldest = next(iter(self.replies))
+                if now - self.replies[oldest][2] <= READY_TTL_S and self.replies_bytes <= REPLIES_MAX_BYTES:
+                    break
+                self._pop_reply(oldest)
+            self.cond.notify_all()
+
+    def take_reply(self, reqid, timeout):
+        ''' blocks until the reply to reqid is stored or timeout, returns and removes (reply_json, reply_gz), or None '''
+        reqid = str(reqid)
+        with self.cond:
+            if not self.cond.wait_for(lambda: reqid in self.replies, timeout):
+                return None
+            return self._pop_reply(reqid)
+
+    def publish(self, gs_id, event, data, run=""):
+        ''' buffers an execution event of session gs_id, of the run with key run, and wakes up its pollers '''
+        gs_id = str(gs_id)
+        with self.cond:
+            now = time.time()
+            self.seq += 1
+            buf = self.events.get(gs_id, None)
+            if buf is None:
+                buf = deque(maxlen=EVENTS_BUFFER_LEN)
+                self.events[gs_id] = buf
+            buf.append((self.seq, event, data, now, run))
+            # forget buffers of sessions which have been quiet for long
+            for key in [k for k in self.events if now - self.events[k][-1][3] > READY_TTL_S]:
+                del self.events[key]
+            self.cond.notify_all()
+
+    def get_events(self, gs_id, run, after, timeout):
+        '''
+        blocks until events of the run with key run of session gs_id newer than sequence number "after" exist,
+        or timeout, returns those events and the sequence number to continue from
+        '''
+        gs_id = str(gs_id)
+        with self.cond:
+            def newer():
+                return [e for e in self.events.get(gs_id, ()) if e[0] > after and e[4] == run]
+            self.cond.wait_for(lambda: len(newer()) > 0, timeout)
+            lst = newer()
+            last = lst[-1][0] if len(lst) > 0 else after
+            return [{ "seq" : e[0], "event" : e[1], "data" : e[2] } for e in lst], last
+
+    def handle(self, msg):
+        op = msg.get("op", None)
+        if op == "take":
+            reply = self.take_reply(msg["reqid"], float(msg["timeout"]))
+            if reply is None:
+                return { "ready" : False }
+            reply_json, reply_gz = reply
+            if reply_gz is not None:
+                reply_gz = base64.b64encode(reply_gz).decode('ascii')
+            return { "ready" : True, "reply_json" : reply_json, "reply_gz" : reply_gz }
+        if op == "events":
+            events, last = self.get_events(msg["gs_id"], msg["run"], int(msg.get("after", 0)), float(msg["timeout"]))
+            return { "events" : events, "last" : last }
+        if op == "tab_add":
+            self.tabs.add(msg["gs_id"], msg["tab_id"])
+            return { "ok" : True }
+        if op == "tab_validate":
+            valid, touch = self.tabs.validate(msg["gs_id"], msg["tab_id"])
+            return { "valid" : valid, "touch" : touch }
+        if op == "tab_takeover":
+            self.tabs.takeover(msg["gs_id"], msg["tab_id"])
+            return { "ok" : True }
+        raise Exception("unknown broker op: %s" % op)
+
+'''
+Web process side.
+'''
+
+def request(path, msg, timeout):
+    ''' sends msg to the broker at path, returns its reply or None if the broker could not be reached '''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall((json.dumps(msg) + "\n").encode('utf-8'))
+        chunks = []
+        while len(chunks) == 0 or not chunks[-1].endswith(b'\n'):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return json.loads(b''.join(chunks).decode('utf-8'))
+    except (OSError, ValueError):
+        return None
+    finally:
+        sock.close()
+
+def take_reply(path, reqid, timeout):
+    '''
+    blocks until the worker has stored the reply to reqid and takes it, returns (reply_json, reply_gz),
+    False on timeout, or None if the broker is unreachable
+    '''
+    ans = request(path, { "op" : "take", "reqid" : str(reqid), "timeout" : timeout }, timeout + 5)
+    if ans is None or "ready" not in ans:
+        return None
+    if not ans["ready"]:
+        return False
+    reply_gz = ans["reply_gz"]
+    if reply_gz is not None:
+        reply_gz = base64.b64decode(reply_gz)
+    return ans["reply_json"], reply_gz
+
+def reply_text(reply_json, reply_gz):
+    ''' returns the text of a reply taken by take_reply, decompressing it if required '''
+    if reply_gz is not None:
+        return gzip.decompress(reply_gz).decode('utf-8')
+    return reply_json
+
+def get_events(path, gs_id, run, after, timeout):
+    ''' long-polls execution events of run key run of session gs_id, returns (events, last), or None if the broker is unreachable '''
+    ans = request(path, { "op" : "events", "gs_id" : str(gs_id), "run" : run, "after" : after, "timeout" : timeout }, timeout + 5)
+    if ans is None or "events" not in ans:
+        return None
+    return ans["events"], ans["last"]
+
+def tab_add(path, gs_id, tab_id):
+    ''' caches tab_id as the owner of gs_id, returns False if the broker is unreachable '''
+    return request(path, { "op" : "tab_add", "gs_id" : str(gs_id), "tab_id" : str(tab_id) }, 5) is not None
+
+def tab_validate(path, gs_id, tab_id):
+    '''
+    returns (valid, touch), see TabTable.validate, valid is None if tab_id is not cached or the broker is unreachable,
+    in which case TabId is authoritative
+    '''
+    ans = request(path, { "op" : "tab_validate", "gs_id" : str(gs_id), "tab_id" : str(tab_id) }, 5)
+    if ans is None or "valid" not in ans:
+        return None, False
+    return ans["valid"], ans.get("touch", False)
+
+def tab_takeover(path, gs_id, tab_id):
+    ''' makes tab_id the cached owner of gs_id, returns False if the broker is unreachable '''
+    return request(path, { "op" : "tab_takeover", "gs_id" : str(gs_id), "tab_id" : str(tab_id) }, 5) is not None
@@ -0,0 +1,169 @@
+'''
+Benchmarks the per-node overhead of the ifitlib bridge, running every public node type against the
+in-process stub engine of stubmatlab.
+'''
+import sys
+import os
+import time
+import copy
+import logging
+import traceback
+
+from django.core.management.base import BaseCommand
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+import stubmatlab
+import enginterface
+
+DATAFILE = 'testdata/dgauss_01.dat'
+DATAFILE_2 = 'testdata/peakonslope.dat'
+
+# per-element arguments which can not be derived from the annotations, by node name
+_ARGS = {
+    'IData.keep' : { 'low' : 0.5, 'high' : 4.0 },
+    'IData.mask' : { 'min' : 1.0, 'max' : 1.5 },
+    'IData.rebin' : { 'nbins' : 50 },
+    'IFunc.guess' : { 'guess' : { 'Amplitude' : 1.0, 'Centre' : 3.0, 'HalfWidth' : 0.5, 'Background' : 0.0 } },
+    'IFunc.fixpars' : { 'parnames' : ['Background'] },
+    'IData_1d' : { 'axis' : [0.1*i for i in range(50)], 'signal' : [float(i % 7) for i in range(50)], 'error' : [1.0]*50 },
+    'IData_2d' : { 'axes' : [[0.0, 1.0], [0.0, 1.0]], 'signal' : [[1.0, 2.0], [3.0, 4.0]] },
+    'Combine_data' : { 'filenames' : [DATAFILE, DATAFILE_2] },
+}
+
+def _per_element(value, shape):
+    ''' value repeated as a nested list of the given shape, or value itself for scalar nodes '''
+    if len(shape) == 0:
+        return copy.deepcopy(value)
+    return [_per_element(value, shape[1:]) for i in range(shape[0])]
+
+# nodes whose input datasets must be arrays, e.g. to be stacked
+_INPUT_SHAPES = {
+    'catenate' : (4, ),
+}
+
+def _build_input(ifitlib, tpe, shape):
+    ''' an IData loaded from DATAFILE, or a gauss IFunc with guessed parameters, of the given shape '''
+    if tpe == ifitlib.IData:
+        return ifitlib.IData(_per_element(DATAFILE, shape))
+    obj = ifitlib.IFunc(list(shape) or None, 'gauss')
+    obj.guess(_per_element(_ARGS['IFunc.guess']['guess'], shape))
+    return obj
+
+def _build_args(ifitlib, name, func, shape):
+    ''' returns the positional arguments of node func, IData and IFunc inputs are built by _build_input '''
+    args = []
+    for p in _positional(func):
+        if p in _ARGS.get(name, {}):
+            args.append(_per_element(_ARGS[name][p], shape))
+            continue
+        tpe = func.__annotations__.get(p, None)
+        if tpe in (ifitlib.IData, ifitlib.IFunc):
+            inshape = _INPUT_SHAPES.get(name, shape)
+            if name == 'separate' and p == 'typefunc':
+                inshape = tuple() # a type indicator, see separate
+            args.append(_build_input(ifitlib, tpe, inshape))
+        elif p == 'url':
+            args.append(_per_element(DATAFILE, shape))
+        else:
+            raise Exception("no benchmark argument for '%s'" % p)
+    return args
+
+def _positional(func):
+    ''' names of the parameters without defaults, excluding self '''
+    code = func.__code__
+    names = code.co_varnames[:code.co_argcount]
+    ndefaults = len(func.__defaults__ or ())
+    names = names[:len(names) - ndefaults]
+    return [n for n in names if n != 'self']
+
+class _NodeStats:
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.evals = 0
+        self.wall = 0.0
+        self.engine = 0.0
+        self.error = None
+
+class Command(BaseCommand):
+    help = '''Runs every public ifitlib node, followed by the get_repr of its output, against a stub engine, and
+    reports the engine calls, wall time, stub engine time and bridge overhead (wall - engine time) per node. Does not require MATLAB.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency', type=float, default=0.0, help='stub engine round trip latency in ms, 0 measures the bridge alone')
+        parser.add_argument('--repeat', type=int, default=5, help='runs per node')
+        parser.add_argument('--shape', type=int, nargs='*', default=[], help='datashape of the node inputs, e.g. --shape 4 for arrays of four datasets')
+        parser.add_argument('--nodes', type=str, nargs='*', default=None, help='benchmark only these nodes, e.g. fit IData.keep')
+
+    def handle(self, *args, **options):
+        stubmatlab.install(options["latency"]/1000.0)
+        import ifitlib
+        logging.getLogger().setLevel(logging.WARNING)
+
+        shape = tuple(options["shape"])
+        repeat = max(1, options["repeat"])
+        middleware = ifitlib._load_middleware()
+        slot = ifitlib._pool.slot(middleware.engine_idx)
+        with middleware.scope():
+            ifitlib._eval("who;", nargout=1, dontlog=True) # starts the engine
+        eng = slot.eng
+
+        nodes = []
+        classes, functions = enginterface.get_nodetype_candidates(ifitlib)
+        for c in classes:
+            cls = c['class']
+            nodes.append((cls.__name__, cls.__init__, cls, None))
+            for m in c['methods']:
+                nodes.append(("%s.%s" % (cls.__name__, m.__name__), m, m, cls))
+        for f in functions:
+            nodes.append((f.__name__, f, f, None))
+        if options["nodes"]:
+            nodes = [n for n in nodes if n[0] in options["nodes"]]
+
+        results = []
+        for name, signature, node, cls in nodes:
+            stats = _NodeStats(name)
+            results.append(stats)
+            for i in range(repeat):
+                obj = None
+                try:
+                    # inputs are created outside the measurement, and registered as the outputs of upstream nodes would be
+                    with middleware.scope():
+                        nodeargs = _build_args(ifitlib, name, signature, shape)
+                        if cls is not None:
+                            obj = _build_input(ifitlib, cls, shape)
+                            node = getattr(obj, signature.__name__)
+                    for a in nodeargs + [obj]:
+                        middleware.register(a)
+                    calls, busy, t = eng.calls, eng.busy, time.time()
+                    ans = middleware.execute_through_proxy(lambda: node(*nodeargs))
+                    if cls is not None:
+                        ans = obj
+                    if ans is not None:
+                        with middleware.scope():
+                            ans.get_repr()
+                    stats.wall += time.time() - t
+                    stats.evals += eng.calls - calls
+                    stats.engine += eng.busy - busy
+                    stats.runs += 1
+                except Exception as e:
+                    stats.error = "%s: %s" % (type(e).__name__, str(e).splitlines()[0] if str(e) else '')
+                    if options["traceback"]:
+                        traceback.print_exc()
+                    break
+                finally:
+                    nodeargs = None
+                    obj = None
+                    ans = None
+                    middleware.clear()
+
+        print("nodes: %d, datashape: %s, stub latency: %g ms, runs per node: %d" % (len(results), str(list(shape)), options["latency"], repeat))
+        print("%-16s %8s %10s %10s %10s" % ("node", "evals", "wall ms", "engine ms", "bridge ms"))
+        for s in results:
+            if s.runs == 0:
+                print("%-16s %s" % (s.name, s.error))
+                continue
+            wall = 1000*s.wall/s.runs
+            engine = 1000*s.engine/s.runs
+            print("%-16s %8.1f %10.3f %10.3f %10.3f%s" % (s.name, s.evals/s.runs, wall, engine, wall - engine, "  (%s)" % s.error if s.error else ""))
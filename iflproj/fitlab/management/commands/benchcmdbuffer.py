@@ -0,0 +1,51 @@
+'''
+Benchmarks buffered against per-statement evaluation of no-output MATLAB statements.
+'''
+import sys
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+import stubmatlab
+
+class Command(BaseCommand):
+    help = '''Times N no-output statements evaluated one by one and through a command buffer,
+    against a stub engine with a fixed round trip latency. Does not require MATLAB.'''
+
+    def add_arguments(self, parser):
+        parser.add_argument('--statements', type=int, default=1000, help='number of no-output statements')
+        parser.add_argument('--latency', type=float, default=1.0, help='stub engine round trip latency in ms')
+
+    def handle(self, *args, **options):
+        stubmatlab.install()
+        import ifitlib
+        num = options["statements"]
+        eng = stubmatlab.StubEngine(options["latency"]/1000.0)
+        ifitlib._pool.slot(0).eng = eng
+
+        # the kind of statements issued by e.g. IData_1d on an array of datasets
+        stmts = ["idata_bench(%d).Signal = [1.0, 2.0, 3.0];" % (i+1) for i in range(num)]
+
+        eng.calls = 0
+        t = time.time()
+        for s in stmts:
+            ifitlib._eval(s, nargout=0, dontlog=True)
+        t_single = time.time() - t
+        calls_single = eng.calls
+
+        eng.calls = 0
+        t = time.time()
+        with ifitlib._cmdbuffer():
+            for s in stmts:
+                ifitlib._eval(s, nargout=0, dontlog=True)
+        t_buffered = time.time() - t
+        calls_buffered = eng.calls
+
+        print("statements: %d, stub latency: %g ms" % (num, options["latency"]))
+        print("per-statement: %8.3f s, %d engine calls" % (t_single, calls_single))
+        print("buffered:      %8.3f s, %d engine calls" % (t_buffered, calls_buffered))
+        if t_buffered > 0:
+            print("speedup:       %8.1fx" % (t_single/t_buffered))
@@ -30,7 +30,7 @@ class Command(BaseCommand):
                 "created" : datetime.now().strftime("%Y%m%d_%H%M"),
                 "entries" : entries,
             }
-            examples = GraphSession.objects.filter(example=True)
+            examples = GraphSession.objects.filter(example=True).select_related('blobs')
 
             print("examples found: %d" % len(examples)) 
             for ex in examples:
@@ -42,7 +42,7 @@ class Command(BaseCommand):
                     "description" : ex.description,
                     "excomment" : ex.excomment,
                     "listidx" : ex.listidx,
-                    "graphdef" : json.loads(ex.graphdef),
+                    "graphdef" : json.loads(ex.get_blobs().graphdef),
                 }
                 entries.append(entry)
 
@@ -92,11 +92,12 @@ class Command(BaseCommand):
 
             fixes = dict()
             issues = 0
-            sessions = GraphSession.objects.all()
+            sessions = GraphSession.objects.all().select_related('blobs')
             for s in sessions:
-                if s.graphdef == "":
+                graphdef = s.get_blobs().graphdef
+                if graphdef == "":
                     continue
-                gd = json.loads(s.graphdef)
+                gd = json.loads(graphdef)
                 if gd == None:
                     continue
                 hasissues = False
@@ -141,7 +142,7 @@ class Command(BaseCommand):
                 if hasissues:
                     issues = issues +1
                     s.reset()
-                    s.graphdef = json.dumps(gd)
+                    s.blobs.graphdef = json.dumps(gd)
 
             if issues > 0:
                 input("about to save %d fixed graphs (ctrl-C to exit)..." % issues)
@@ -149,6 +150,7 @@ class Command(BaseCommand):
                 print("no graph def / module compatibility issues found")
             for s in sessions:
                 s.save()
+                s.blobs.save()
 
         except KeyboardInterrupt:
             print("exiting...")
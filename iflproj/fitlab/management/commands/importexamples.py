@@ -11,7 +11,7 @@ import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 
-from fitlab.models import GraphSession
+from fitlab.models import GraphSession, GraphSessionBlobs
 
 class Command(BaseCommand):
     help = '''Import examples from a json format named IFL and put them into the db.
@@ -92,6 +92,7 @@ class Command(BaseCommand):
             for e in tocreate:
                 if not dryrun:
                     e.save()
+                    GraphSessionBlobs.objects.create(session=e, graphdef=e.graphdef)
 
             print("objects created: ", len(tocreate))
 
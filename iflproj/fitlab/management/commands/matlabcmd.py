@@ -6,7 +6,9 @@ import os
 from django.core.management.base import BaseCommand
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
-from fitlab.models import GraphSession, GraphUiRequest, GraphReply
+from fitlab.models import GraphSession, GraphUiRequest
+from fitlab import broker
+from iflproj.settings import WRK_BROKER_SOCKET
 
 class Command(BaseCommand):
     help = '''Give a command to the live matlab instance and output the results.'''
@@ -30,27 +32,26 @@ class Command(BaseCommand):
         uireq.save()
 
         while True:
-            for i in range(10):
-                lst = GraphReply.objects.filter(reqid=uireq.id)
-                if len(lst) == 1:
-                    # success, print and exit
-                    reply = lst[0]
-
-                    obj = json.loads(reply.reply_json)
+            reply = broker.take_reply(WRK_BROKER_SOCKET, uireq.id, 5)
+            if reply:
+                # success, print and exit
+                obj = json.loads(broker.reply_text(*reply))
+                try:
+                    ans = obj["ans"]
+                    if type(ans) == list:
+                        for l in ans:
+                            print(l)
+                    else:
+                        print(ans)
+                except:
                     try:
-                        ans = obj["ans"]
-                        if type(ans) == list:
-                            for l in ans:
-                                print(l)
-                        else:
-                            print(ans)
+                        print("fatalerror: " + obj["fatalerror"])
                     except:
-                        try:
-                            print("fatalerror: " + obj["fatalerror"])
-                        except:
-                            print("command failed without any given reason")
+                        print("command failed without any given reason")
 
-                    return
-                time.sleep(0.5)
+                return
+            if reply is None:
+                # the worker is not running
+                time.sleep(5)
             print("waiting for worker reply...")
 
@@ -6,7 +6,7 @@ import logging
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 
-from fitlab.models import GraphUiRequest, GraphReply, TabId
+from fitlab.models import GraphUiRequest, TabId
 
 class Command(BaseCommand):
     help = 'Removes all pending server/worker messages in both directions.'
@@ -18,15 +18,11 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         uireqs = GraphUiRequest.objects.all()
-        replies = GraphReply.objects.all()
         tabids = TabId.objects.all()
         logging.info("purging uirequests: %d objects" % len(uireqs))
-        logging.info("purging graphreplies: %d objects" % len(replies))
         logging.info("purging tabids: %d objects" % len(tabids))
         for uireq in uireqs:
             uireq.delete()
-        for reply in replies:
-            reply.delete()
         for tid in tabids:
             tid.delete()
 
@@ -7,7 +7,9 @@ import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 
-from fitlab.models import GraphSession, GraphUiRequest, GraphReply
+from fitlab.models import GraphSession, GraphUiRequest
+from fitlab import broker
+from iflproj.settings import WRK_BROKER_SOCKET
 
 class Command(BaseCommand):
     help = '''Reset all sessions (pickles and matfiles), prompting a global re-construction 
@@ -28,12 +30,12 @@ class Command(BaseCommand):
 
         while True:
             print("waiting for worker reply...")
-            for i in range(10):
-                lst = GraphReply.objects.filter(reqid=uireq.id)
-                if len(lst) == 1:
-                    # success, print and exit
-                    reply = lst[0]
-                    print(json.loads(reply.reply_json)["msg"])
-                    return
-                time.sleep(0.5)
+            reply = broker.take_reply(WRK_BROKER_SOCKET, uireq.id, 5)
+            if reply:
+                # success, print and exit
+                print(json.loads(broker.reply_text(*reply))["msg"])
+                return
+            if reply is None:
+                # the worker is not running
+                time.sleep(5)
 
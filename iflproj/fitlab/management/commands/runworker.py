@@ -10,7 +10,10 @@ import sys
 import os
 import pickle
 import base64
+import gzip
 from queue import Queue, Empty
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 
 from django.utils import timezone
 from django.core.management.base import BaseCommand
@@ -20,46 +23,109 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 
 import nodespeak
 from iflproj import settings
-from fitlab.models import GraphUiRequest, GraphReply, GraphSession
+from fitlab.models import GraphUiRequest, GraphSession, GraphSessionBlobs
 import enginterface
+import metrics
+import cmdjournal
 from fitlab.management.commands import purgemessages
+from fitlab import broker
 from loggers import log_workers as _log, _log_sysmon 
 
 NUM_THREADS = 4
+# replies of at least this size are stored gzip compressed
+REPLY_GZIP_MIN_BYTES = 1024
+REPLY_GZIP_LEVEL = 5
+
+_m_tasks = metrics.registry.counter('ifl_tasks_total', 'Worker tasks by command and outcome.', ('cmd', 'status'))
+_m_task_seconds = metrics.registry.histogram('ifl_task_seconds', 'Worker task duration by command.', ('cmd', ))
+_m_queue_wait = metrics.registry.histogram('ifl_task_queue_wait_seconds', 'Time from request filing until a worker thread picks the task up.', ('cmd', ))
+_m_session_loads = metrics.registry.counter('ifl_session_loads_total', 'Session load attempts by path and outcome.', ('path', 'status'))
+_m_session_load_seconds = metrics.registry.histogram('ifl_session_load_seconds', 'Session load duration by path.', ('path', ))
+_m_db_users = metrics.registry.gauge('ifl_db_users', 'Registered users.')
+_m_db_sessions = metrics.registry.gauge('ifl_db_sessions', 'Stored graph sessions.')
+_m_hothandles = metrics.registry.gauge('ifl_hot_handles', 'Graph object handles holding objects, summed over live sessions.')
+_m_middleware_vars = metrics.registry.gauge('ifl_middleware_vars', 'Registered middleware varnames, summed over live sessions.')
+_m_matlab_vars = metrics.registry.gauge('ifl_matlab_vars', 'Variables in the MATLAB workspace.')
 
 class SoftGraphSession:
-    def __init__(self, gs_id, username):
+    def __init__(self, gs_id, username, graph=None):
         '''
         gs_id : key, db key and unique obj identifier 
         username : associated user, can be used for logging and more
+        graph : an existing, e.g. unpickled, graph, else a new one is created
         '''
         self.gs_id = gs_id
         self.username = username 
-        self.graph = None
+        self.graph = graph
 
-        tree = enginterface.TreeJsonAddr(json.loads(self._loadNodeTypesJsFile()))
-        pmod = json.loads(open('pmodule.js').read())
-        mdl = importlib.import_module(pmod["module"], pmod["package"]) # rewrite fom package = dot ! 
-        self.graph = enginterface.FlatGraph(tree, mdl)
+        # a new graph binds its middleware to an engine, only create one if it is kept
+        if self.graph is None:
+            tree = enginterface.TreeJsonAddr(json.loads(self._loadNodeTypesJsFile()))
+            pmod = json.loads(open('pmodule.js').read())
+            mdl = importlib.import_module(pmod["module"], pmod["package"]) # rewrite fom package = dot ! 
+            self.graph = enginterface.FlatGraph(tree, mdl)
 
         self.touched = timezone.now()
         self.lock = threading.Lock()
+        self.footprint = 0
+        self.footprint_generation = -1 # generation at which footprint was measured
+        self.retiring = False
+        self.retired = False # set once the graph has been shut down, see locked
+        self.shutdown_done = None # event of the latest shutdown, set when it has finished, see Worker.shutdown_session
+
+        # dirty tracking, generation is bumped on every change and compared to that of the last autosave
+        self.generation = 0
+        self.stashed_generation = 0
 
     def _loadNodeTypesJsFile(self):
         text = open('fitlab/static/fitlab/nodetypes.js').read()
         m = re.search("var nodeTypes\s=\s([^;]*)", text, re.DOTALL)
         return m.group(1)
 
-    def update_and_execute(self, runid, syncset):
-        ''' returns engine update set '''
+    def update_and_execute(self, runid, syncset, listener=None):
+        ''' returns engine update set, listener receives execution events '''
         error = self.graph.graph_update(syncset)
         if error:
             return error
-        return self.graph.execute_node(runid)
+        return self.graph.execute_node(runid, listener)
+
+    @contextmanager
+    def locked(self):
+        ''' holds the session lock, with evaluations scoped to the session's middleware engine, raises if the session was retired meanwhile '''
+        with self.lock:
+            if self.retired:
+                raise Exception("session was retired (%s)" % self.gs_id)
+            with self.graph.middleware.scope():
+                yield
 
     def touch(self):
         self.touched = timezone.now()
 
+    def mark_dirty(self):
+        self.generation += 1
+
+    def is_dirty(self):
+        return self.generation != self.stashed_generation
+
+    def update_footprint(self):
+        '''
+        approximate memory use in bytes, python side plus middleware side, remeasured only if the session
+        changed since the last measurement, and not while it is busy, in which case the last value is kept
+        '''
+        generation = self.generation
+        if self.footprint_generation == generation or not self.lock.acquire(blocking=False):
+            return self.footprint
+        try:
+            if not self.retired:
+                with self.graph.middleware.scope():
+                    self.footprint = len(pickle.dumps(self.graph)) + self.graph.middleware.get_footprint()
+                self.footprint_generation = generation
+        except Exception as e:
+            _log("footprint update failed: %s (%s)" % (str(e), self.gs_id), error=True)
+        finally:
+            self.lock.release()
+        return self.footprint
+
     def test(self):
         cmds = json.loads('[[["node_add",454.25,401.3333333333333,"o0","","","obj"],["node_rm","o0"]],[["node_add",382.75,281.3333333333333,"o1","","","Pars"],["node_rm","o1"]],[["node_add",348,367.3333333333333,"f0","","C","Colour"],["node_rm","f0"]],[["link_add","o1",0,"f0",0,0],["link_rm","o1",0,"f0",0,0]],[["link_add","f0",0,"o0",0,0],["link_rm","f0",0,"o0",0,0]],[["node_data","o1","\\"red\\""],["node_data","o1",{}]]]')
 
@@ -71,7 +137,10 @@ Utility
 '''
 
 def to_djangodb_str(obj):
-    tosave = base64.b64encode(pickle.dumps(obj))
+    return bytes_to_djangodb_str(pickle.dumps(obj))
+
+def bytes_to_djangodb_str(b):
+    tosave = base64.b64encode(b)
     return str(tosave)[2:]
 
 def from_djangodb_str(s):
@@ -81,7 +150,7 @@ def from_djangodb_str(s):
     return obj
 
 class Task:
-    def __init__(self, username, gs_id, sync_obj_str, reqid, cmd):
+    def __init__(self, username, gs_id, sync_obj_str, reqid, cmd, created=None, idem_key=""):
         self.username = username
         self.gs_id = gs_id
         self.reqid = reqid
@@ -89,6 +158,19 @@ class Task:
         if sync_obj_str:
             self.sync_obj = json.loads(sync_obj_str)
         self.cmd = cmd
+        self.created = created or timezone.now()
+        # client given key, identical keyed commands share one execution while in flight
+        self.idem_key = idem_key or ""
+
+    def merge(self, other):
+        ''' merges a later "update" task into this one, redo lists are concatenated and only the newest coords are kept '''
+        if not other.sync_obj:
+            return
+        if not self.sync_obj:
+            self.sync_obj = other.sync_obj
+            return
+        self.sync_obj['sync'] = self.sync_obj['sync'] + other.sync_obj['sync']
+        self.sync_obj['coords'] = other.sync_obj['coords']
 
 '''
 cmd impl.
@@ -101,6 +183,13 @@ class Workers:
     def __init__(self):
         self.taskqueue = Queue()
         self.sessions = {}
+        # queued "update" tasks which can still absorb later updates, keyed by gs_id
+        self.pending_updates = {}
+        self.pendinglock = threading.Lock()
+        # keyed tasks in flight: (gs_id, cmd, idem_key) -> reqids waiting for the first one's reply
+        self.inflight = {}
+        self.inflight_keys = {} # reqid of the executing task -> its inflight key
+        self.inflightlock = threading.Lock()
         self.terminated = False
 
         self.threads = []
@@ -125,6 +214,26 @@ class Workers:
         self.tmon.start()
         self.termination_events[self.tmon.getName()] = threading.Event()
 
+        # write-behind autosave jobs, and the number of those pending per gs_id
+        self.ioqueue = Queue()
+        self.iopending = {}
+        self.iocond = threading.Condition()
+
+        self.tio = threading.Thread(target=self.io_wrk)
+        self.tio.setDaemon(True)
+        self.tio.setName('%s_io' % (self.tio.getName().replace('Thread-','T')))
+        self.tio.start()
+        self.termination_events[self.tio.getName()] = threading.Event()
+
+        metrics.registry.gauge('ifl_live_sessions', 'Sessions loaded in the worker.', fct=lambda: len(self.sessions))
+        metrics.registry.gauge('ifl_queued_tasks', 'Tasks waiting for a worker thread.', fct=lambda: self.taskqueue.qsize())
+        metrics.registry.gauge('ifl_pending_autosaves', 'Write-behind autosaves not yet stored.', fct=lambda: sum(self.iopending.values()))
+        metrics.registry.gauge('ifl_session_footprint_bytes', 'Summed approximate footprint of live sessions.', fct=lambda: sum([s.footprint for s in list(self.sessions.values())]))
+
+        # web processes block on the broker until their reply is stored
+        self.broker = broker.Broker(settings.WRK_BROKER_SOCKET)
+        self.broker.start()
+
         self.shutdownlock = threading.Lock()
         self.waiting_for_termination = threading.Event()
         self.waiting_for_termination.clear()
@@ -134,8 +243,37 @@ class Workers:
         for key in self.termination_events.keys():
             e = self.termination_events[key]
             e.wait()
+        self.broker.shutdown()
+
+    def reply(self, reqid, reply_json):
+        '''
+        hands the reply to a request to the broker, compressed if it is large, which wakes up its waiting
+        web process, duplicate requests attached to it get the same reply
+        '''
+        with self.inflightlock:
+            key = self.inflight_keys.pop(reqid, None)
+            reqids = self.inflight.pop(key) if key else [reqid]
+
+        reply_json = str(reply_json)
+        reply_gz = None
+        if len(reply_json) >= REPLY_GZIP_MIN_BYTES:
+            reply_gz = gzip.compress(reply_json.encode('utf-8'), compresslevel=REPLY_GZIP_LEVEL)
+            reply_json = None
+        for r in reqids:
+            self.broker.put_reply(r, reply_json, reply_gz)
+
+    def release(self, task):
+        ''' forgets an in flight keyed task, for tasks that did not reply '''
+        with self.inflightlock:
+            key = self.inflight_keys.pop(task.reqid, None)
+            if key:
+                reqids = self.inflight.pop(key)
+                if len(reqids) > 1:
+                    _log("dropping %d duplicate requests without reply (%s)" % (len(reqids) - 1, task.gs_id), error=True)
 
     def monitor_wrk(self):
+        num_matlab_vars = 0
+        last_evals = None
         try:
             while not self.terminated:
                 last = timezone.now()
@@ -143,9 +281,9 @@ class Workers:
                 _log("gathering statistics...")
 
                 # db users
-                num_users = len(User.objects.all())
+                num_users = User.objects.count()
                 # db sessions
-                num_sessions = len(GraphSession.objects.all())
+                num_sessions = GraphSession.objects.count()
                 # live data
                 num_livesessions = len(self.sessions.keys())
                 # number of graph handles holding objects
@@ -162,14 +300,23 @@ class Workers:
                 for key in self.sessions:
                     ses = self.sessions[key]
                     num_middleware_vars += len(ses.graph.middleware.varnames)
-                # total matlab vars
-                num_matlab_vars = 0
-                try:
-                    someses = self.sessions[next(iter(self.sessions))]
-                    who = someses.graph.middleware.totalwho()
-                    num_matlab_vars = len(who)
-                except Exception as e:
-                    pass
+                # total matlab vars, only re-counted if the engine was used since the last count
+                m_evals = metrics.registry.get('ifl_matlab_evals_total')
+                evals = m_evals.total() if m_evals else 0
+                if evals != last_evals:
+                    try:
+                        someses = self.sessions[next(iter(self.sessions))]
+                        who = someses.graph.middleware.totalwho()
+                        num_matlab_vars = len(who)
+                        last_evals = evals
+                    except Exception as e:
+                        pass
+
+                _m_db_users.set(num_users)
+                _m_db_sessions.set(num_sessions)
+                _m_hothandles.set(num_hothandles)
+                _m_middleware_vars.set(num_middleware_vars)
+                _m_matlab_vars.set(num_matlab_vars)
 
                 # log monitored values
                 _log_sysmon(num_users, num_sessions, num_livesessions, num_hothandles, num_middleware_vars, num_matlab_vars)
@@ -198,7 +345,8 @@ class Workers:
                         continue
                     if (timezone.now() - ses.touched).seconds > settings.WRK_SESSION_RETIRE_TIMEOUT_S:
                         self.shutdown_session(ses.gs_id)
-    
+                self.enforce_memory_budget()
+
             _log("clean up retiring sessions...")
             keys = [key for key in self.sessions.keys()]
             for key in keys:
@@ -210,9 +358,72 @@ class Workers:
         finally:
             self.termination_events[self.tcln.getName()].set()
 
+    def io_wrk(self):
+        ''' write-behind thread, stores autosave snapshots, exits when the cleanup thread is done and the queue is empty '''
+        try:
+            while True:
+                try:
+                    job = self.ioqueue.get(block=True, timeout=0.1)
+                except Empty:
+                    if self.terminated and self.termination_events[self.tcln.getName()].is_set():
+                        break
+                    continue
+
+                gs_id, graph_pickle, save_fct, filepath = job
+                try:
+                    save_fct()
+                    GraphSessionBlobs.store(gs_id, stashed_pickle=bytes_to_djangodb_str(graph_pickle))
+                    GraphSession.objects.filter(id=gs_id).update(
+                        stashed_matfile=filepath,
+                        stashed=timezone.now())
+                except Exception as e:
+                    _log("write-behind autosave failed: %s (%s)" % (str(e), gs_id), error=True)
+                finally:
+                    with self.iocond:
+                        self.iopending[gs_id] -= 1
+                        if self.iopending[gs_id] == 0:
+                            del self.iopending[gs_id]
+                        self.iocond.notify_all()
+
+            _log("exiting...")
+        finally:
+            self.termination_events[self.tio.getName()].set()
+
+    def flush_autosaves(self, gs_id=None):
+        ''' blocks until pending write-behind autosaves of gs_id, or of all sessions, have been stored '''
+        with self.iocond:
+            while (self.iopending.get(gs_id, 0) if gs_id else len(self.iopending)) > 0:
+                self.iocond.wait()
+
+    def enforce_memory_budget(self, keep=None):
+        ''' evicts least-recently-touched sessions, through the autosave path, while the summed footprint exceeds the budget '''
+        budget = settings.WRK_MEMORY_BUDGET_MB * 1024 * 1024
+        if budget <= 0:
+            return
+        # measured here rather than after every task, which would hold the session lock for it
+        sessions = sorted(list(self.sessions.values()), key=lambda s: s.touched)
+        total = sum([s.update_footprint() for s in sessions])
+        for ses in sessions:
+            if total <= budget:
+                break
+            if ses.gs_id == keep:
+                continue
+            _log("memory budget exceeded (%d > %d bytes), evicting session %s" % (total, budget, ses.gs_id))
+            self.shutdown_session(ses.gs_id)
+            total = total - ses.footprint
+
     def get_soft_session(self, task):
-        ''' if this returns None, a session must be created or loaded '''
-        s = self.sessions.get(task.gs_id, None)
+        ''' if this returns None, a session must be created or loaded, sessions being retired are not live '''
+        with self.shutdownlock:
+            s = self.sessions.get(task.gs_id, None)
+            done = s.shutdown_done if s and s.retiring else None
+        if done:
+            # wait for the shutdown, whose autosave a reload must see, a failed shutdown leaves the session live
+            done.wait()
+            with self.shutdownlock:
+                s = self.sessions.get(task.gs_id, None)
+                if s and s.retiring:
+                    return None
         if s:
             s.touch()
         return s
@@ -226,44 +437,74 @@ class Workers:
         logtext = "".join(loglines)
 
         # append and save
-        obj = GraphSession.objects.filter(id=session.gs_id)[0]
-        prevlog = obj.loglines
+        prevlog = GraphSessionBlobs.load(session.gs_id, 'loglines')
         if prevlog == None:
             prevlog = ""
 
         # filter previous log to contain only the currently registered varnames
-        regexs = [re.compile(vn) for vn in session.graph.middleware.varnames]
-        lst = []
-        for l in prevlog.splitlines():
-            if True in [r.search(l)!=None for r in regexs]:
-                lst.append(l)
-        prevlog = "\n".join(lst)
+        varnames = session.graph.middleware.varnames
+        prevlog = "".join([l for l in prevlog.splitlines(True) if cmdjournal.line_tokens(l) & varnames])
 
         # save to disk
-        obj.loglines = prevlog + logtext
-        obj.logheader = session.graph.middleware.get_logheader()
-        obj.save()
+        GraphSessionBlobs.store(session.gs_id, loglines=prevlog + logtext)
+        GraphSession.objects.filter(id=session.gs_id).update(logheader=session.graph.middleware.get_logheader())
 
     def shutdown_session(self, gs_id, nosave=False):
         ''' shuts down a session the right way '''
         _log("retiring session %s" % gs_id)
 
-        with self.shutdownlock:
-            session = self.sessions.get(gs_id, None)
-            if session:
-                with session.lock:
-                    try:
-                        if not nosave:
-                            self.autosave(session)
-                        self.extract_log(session)
-                        session.graph.shutdown()
-                        del self.sessions[gs_id]
-                    except Exception as e:
-                        _log("session shutdown error: " + str(e) + " (%s)" % gs_id, error=True)
+        # only the lookup is global, which allows different sessions to be shut down in parallel
+        while True:
+            with self.shutdownlock:
+                session = self.sessions.get(gs_id, None)
+                if not session:
+                    return
+                if not session.retiring:
+                    # the event of this shutdown is in place before anyone can see the session retiring
+                    done = threading.Event()
+                    session.shutdown_done = done
+                    session.retiring = True
+                    break
+                done = session.shutdown_done
+            # another thread is shutting the session down, callers rely on its autosave being queued on return
+            done.wait()
+
+        try:
+            with session.locked():
+                try:
+                    if not nosave:
+                        self.autosave(session)
+                    self.extract_log(session)
+                    session.graph.shutdown()
+                    session.retired = True
+                    del self.sessions[gs_id]
+                except Exception as e:
+                    with self.shutdownlock:
+                        session.retiring = False
+                    _log("session shutdown error: " + str(e) + " (%s)" % gs_id, error=True)
+        finally:
+            done.set()
+
+    def shutdown_sessions(self, ids, nosave=False):
+        ''' shuts down the live sessions among ids in parallel, reporting progress, returns the number of sessions shut down '''
+        live = [gs_id for gs_id in ids if gs_id in self.sessions]
+        total = len(live)
+        _log("shutting down %d sessions..." % total)
+        if total == 0:
+            return 0
+        with ThreadPoolExecutor(max_workers=NUM_THREADS) as executor:
+            futures = [executor.submit(self.shutdown_session, gs_id, nosave) for gs_id in live]
+            done = 0
+            for f in as_completed(futures):
+                done = done + 1
+                if done % 10 == 0 or done == total:
+                    _log("shut down %d/%d sessions" % (done, total))
+        return total
 
     def load_session(self, task):
         ''' fallbacks are: load -> revert -> reconstruct '''
         _log("autoloading stashed session (%s)" % task.gs_id)
+        self.flush_autosaves(task.gs_id)
 
         # load gs from DB
         obj = None
@@ -274,24 +515,39 @@ class Workers:
         if obj.username != task.username:
             raise Exception("username validation failed for sender: %s (%s)" % (task.username, task.gs_id))
 
+        graph = None
         try:
-            if not obj.stashed:
-                raise Exception("'stashed' timezone.time flag was null")
-
-            # load python & matlab structures
-            session = SoftGraphSession(task.gs_id, obj.username)
-            session.graph = from_djangodb_str(obj.stashed_pickle)
-            filepath = os.path.join(settings.MATFILES_DIRNAME, obj.stashed_matfile)
-            if os.path.isfile(filepath):
-                session.graph.middleware.get_load_fct()(filepath)
-            self.sessions[task.gs_id] = session
+            with _m_session_load_seconds.time(path="load"):
+                if not obj.stashed:
+                    raise Exception("'stashed' timezone.time flag was null")
+
+                # load python & matlab structures
+                graph = from_djangodb_str(GraphSessionBlobs.load(task.gs_id, 'stashed_pickle'))
+                filepath = os.path.join(settings.MATFILES_DIRNAME, obj.stashed_matfile)
+                if os.path.isfile(filepath):
+                    graph.middleware.get_load_fct()(filepath)
+                session = SoftGraphSession(task.gs_id, obj.username, graph)
+                self.sessions[task.gs_id] = session
+            _m_session_loads.inc(path="load", status="ok")
 
         except Exception as e:
+            _m_session_loads.inc(path="load", status="failed")
+            self.discard_graph(graph)
             _log("autoload failed: %s (%s)" % (str(e), task.gs_id), error=True)
             return self.revert_session(task)
 
         return self.sessions.get(task.gs_id, None)
 
+    def discard_graph(self, graph):
+        ''' releases the engine binding and variables of a loaded graph which did not become a session '''
+        if graph is None:
+            return
+        try:
+            with graph.middleware.scope():
+                graph.shutdown()
+        except Exception as e:
+            _log("discarding graph failed: %s" % str(e), error=True)
+
     def revert_session(self, task):
         ''' fallbacks are: load -> revert -> reconstruct '''
         _log("reverting quicksaved session (%s)" % task.gs_id)
@@ -305,21 +561,28 @@ class Workers:
         if obj.username != task.username:
             raise Exception("username validation failed for session id: %s, sender: %s" % (obj.username, task.username))
 
+        graph = None
         try:
-            if not obj.quicksaved:
-                raise Exception("'quicksaved' timezone.time flag was never set")
-
-            # load python & matlab structures
-            session = SoftGraphSession(task.gs_id, obj.username)
-            session.graph = from_djangodb_str(obj.quicksave_pickle)
-            filepath = os.path.join(settings.MATFILES_DIRNAME, obj.quicksave_matfile)
-            if os.path.isfile(filepath):
-                session.graph.middleware.get_load_fct()(filepath)
-            else:
-                raise Exception("matfile not found")
-            self.sessions[task.gs_id] = session
+            with _m_session_load_seconds.time(path="revert"):
+                if not obj.quicksaved:
+                    raise Exception("'quicksaved' timezone.time flag was never set")
+
+                # load python & matlab structures
+                graph = from_djangodb_str(GraphSessionBlobs.load(task.gs_id, 'quicksave_pickle'))
+                filepath = os.path.join(settings.MATFILES_DIRNAME, obj.quicksave_matfile)
+                if os.path.isfile(filepath):
+                    graph.middleware.get_load_fct()(filepath)
+                else:
+                    raise Exception("matfile not found")
+                session = SoftGraphSession(task.gs_id, obj.username, graph)
+                # the quicksave differs from the stash
+                session.mark_dirty()
+                self.sessions[task.gs_id] = session
+            _m_session_loads.inc(path="revert", status="ok")
 
         except Exception as e:
+            _m_session_loads.inc(path="revert", status="failed")
+            self.discard_graph(graph)
             _log("revert failed: %s (%s)" % (str(e), task.gs_id), error=True)
             # fallback: reconstruct
             return self.reconstruct_session(task)
@@ -329,6 +592,7 @@ class Workers:
     def reconstruct_session(self, task):
         ''' fallbacks are: load -> revert -> reconstruct '''
         _log("reconstructing session from graphdef (%s)" % task.gs_id)
+        self.flush_autosaves(task.gs_id)
 
         try:
             obj = GraphSession.objects.filter(id=task.gs_id)[0]
@@ -339,52 +603,63 @@ class Workers:
 
         session = None
         try:
-            session = SoftGraphSession(task.gs_id, obj.username)
-            session.graph.inject_graphdef(json.loads(obj.graphdef))
-            
-            # delete the matfile and reference
-            if os.path.exists(obj.quicksave_matfile):
-                os.remove(obj.quicksave_matfile)
-            if os.path.exists(obj.stashed_matfile):
-                os.remove(obj.stashed_matfile)
-            obj.quicksave_matfile = ""
-            obj.stashed_matfile = ""
-            # over-write the pickle
-            obj.quicksave_pickle = to_djangodb_str(session.graph)
-            obj.stashed_pickle = to_djangodb_str(session.graph)
-            # reset
-            obj.quicksaved = timezone.now()
-            obj.stashed = timezone.now()
-            obj.save()
-            self.sessions[task.gs_id] = session
+            with _m_session_load_seconds.time(path="reconstruct"):
+                session = SoftGraphSession(task.gs_id, obj.username)
+                session.graph.inject_graphdef(json.loads(GraphSessionBlobs.load(task.gs_id, 'graphdef')))
+                
+                # delete the matfile and reference
+                if os.path.exists(obj.quicksave_matfile):
+                    os.remove(obj.quicksave_matfile)
+                if os.path.exists(obj.stashed_matfile):
+                    os.remove(obj.stashed_matfile)
+                obj.quicksave_matfile = ""
+                obj.stashed_matfile = ""
+                # over-write the pickle
+                pickle_str = to_djangodb_str(session.graph)
+                GraphSessionBlobs.store(task.gs_id, quicksave_pickle=pickle_str, stashed_pickle=pickle_str)
+                # reset
+                obj.quicksaved = timezone.now()
+                obj.stashed = timezone.now()
+                obj.save(update_fields=['quicksave_matfile', 'stashed_matfile', 'quicksaved', 'stashed'])
+                self.sessions[task.gs_id] = session
+            _m_session_loads.inc(path="reconstruct", status="ok")
         except Exception as e:
+            _m_session_loads.inc(path="reconstruct", status="failed")
             _log("reconstruct failed: %s (%s)" % (str(e), task.gs_id), error=True)
 
         return session
 
     def autosave(self, session):
-        ''' pariodic, automatic save or "stash" session '''
-        # python structure
-        obj = GraphSession.objects.filter(id=session.gs_id)[0]
-        obj.stashed_pickle = to_djangodb_str(session.graph)
+        '''
+        pariodic, automatic save or "stash" session, skipped if the session is clean
 
-        # mat file
+        Takes a snapshot while the caller holds the session lock, the snapshot is
+        then written behind by the io thread.
+        '''
+        if not session.is_dirty():
+            _log("autosave skipped, session is clean (%s)" % session.gs_id)
+            return
+
+        # python structure, the graph holds only handles, which makes this cheap
+        graph_pickle = pickle.dumps(session.graph)
+
+        # mat file snapshot
         if not os.path.exists(settings.MATFILES_DIRNAME):
             os.makedirs(settings.MATFILES_DIRNAME)
         filepath = os.path.join(settings.MATFILES_DIRNAME, session.gs_id + "_autosave.mat")
-        save_fct = session.graph.middleware.get_save_fct()
-        save_fct(filepath)
-        obj.stashed_matfile = filepath
+        save_fct = session.graph.middleware.get_save_deferred_fct()(filepath)
 
-        obj.stashed = timezone.now()
-        obj.save()
+        session.stashed_generation = session.generation
+        with self.iocond:
+            self.iopending[session.gs_id] = self.iopending.get(session.gs_id, 0) + 1
+        self.ioqueue.put((session.gs_id, graph_pickle, save_fct, filepath))
 
     def quicksave(self, session):
         ''' user controlled save action '''
         # python structure
         obj = GraphSession.objects.filter(id=session.gs_id)[0]
-        obj.quicksave_pickle = to_djangodb_str(session.graph)
-        obj.graphdef = json.dumps(session.graph.extract_graphdef())
+        pickle_str = to_djangodb_str(session.graph)
+        graphdef = json.dumps(session.graph.extract_graphdef())
 
         # mat file
         if not os.path.exists(settings.MATFILES_DIRNAME):
@@ -392,33 +667,67 @@ class Workers:
         filepath = os.path.join(settings.MATFILES_DIRNAME, session.gs_id + ".mat")
         save_fct = session.graph.middleware.get_save_fct()
         save_fct(filepath)
+        GraphSessionBlobs.store(session.gs_id, quicksave_pickle=pickle_str, graphdef=graphdef)
         obj.quicksave_matfile = filepath
         obj.quicksaved = timezone.now()
-        obj.save()
+        obj.save(update_fields=['quicksave_matfile', 'quicksaved'])
     
     def reset_session(self, gs_id):
         '''  '''
         self.shutdown_session(gs_id, nosave=True)
+        self.flush_autosaves(gs_id)
 
         obj = GraphSession.objects.filter(id=gs_id)[0]
-        obj.stashed_pickle = "reset"
-        obj.quicksave_pickle = "reset"
-        obj.loglines = ""
-        obj.logheader = ""
-        obj.stashed_matfile = ""
-        obj.quicksave_matfile = ""
+        obj.reset()
         obj.stashed = timezone.now()
         obj.quicksaved = timezone.now()
         obj.save()
+        obj.blobs.save()
 
     def _get_user_softsessions(self, task):
         sess = self.sessions
         return [sess[key] for key in sess.keys() if sess[key].username == task.username]
 
+    def enqueue(self, task):
+        '''
+        queues a task, coalescing consecutive "update" tasks of the same session into one, a keyed task
+        identical to one in flight is attached to it instead
+        '''
+        if task.idem_key:
+            key = (task.gs_id, task.cmd, task.idem_key)
+            with self.inflightlock:
+                reqids = self.inflight.get(key, None)
+                if reqids is not None:
+                    reqids.append(task.reqid)
+                    _log("attached duplicate '%s' request to the one in flight (%s)" % (task.cmd, task.gs_id))
+                    return
+                self.inflight[key] = [task.reqid]
+                self.inflight_keys[task.reqid] = key
+        with self.pendinglock:
+            pending = self.pending_updates.get(task.gs_id, None)
+            if task.cmd == "update":
+                if pending:
+                    pending.merge(task)
+                    _log("merged queued update task (%s)" % task.gs_id)
+                    return
+                self.pending_updates[task.gs_id] = task
+            elif pending:
+                # any later update must not overtake this task
+                del self.pending_updates[task.gs_id]
+            self.taskqueue.put(task)
+
+    def dequeue(self, task):
+        ''' closes an "update" task for merging, must be called before its sync_obj is read '''
+        if task.cmd != "update":
+            return
+        with self.pendinglock:
+            if self.pending_updates.get(task.gs_id, None) is task:
+                del self.pending_updates[task.gs_id]
+
     def mainwork(self):
         ''' Process a batch of UIRequest objects. Called from the main thread. '''
         for uireq in GraphUiRequest.objects.all():
-            self.taskqueue.put(Task(uireq.username, uireq.gs_id, uireq.syncset, uireq.id, uireq.cmd))
+            self.enqueue(Task(uireq.username, uireq.gs_id, uireq.syncset, uireq.id, uireq.cmd, uireq.created, uireq.idem_key))
             uireq.delete()
 
     def threadwork(self):
@@ -431,8 +740,12 @@ class Workers:
                 task = None
             if not task:
                 continue
+            self.dequeue(task)
+            _m_queue_wait.observe((timezone.now() - task.created).total_seconds(), cmd=task.cmd)
 
             _log("doing task '%s' (%s)" % (task.cmd, task.gs_id))
+            started = time.time()
+            status = "ok"
             try:
 
                 # attach/load-attach
@@ -443,18 +756,17 @@ class Workers:
 
                     gd = None
                     update = None
-                    with session.lock:
+                    with session.locked():
                         try:
                             gd = session.graph.extract_graphdef()
                             update = session.graph.extract_update()
-
                         except:
                             _log("autoload failed, requesting fallback cmd='revert' (%s)" % task.gs_id, error=True)
                             task.cmd = "revert"
-                            self.taskqueue.put(task)
+                            self.enqueue(task)
 
-                    graphreply = GraphReply(reqid=task.reqid, reply_json=json.dumps({ "graphdef" : gd, "dataupdate" : update }))
-                    graphreply.save()
+                    self.reply(task.reqid, json.dumps({ "graphdef" : gd, "dataupdate" : update }))
+                    self.enforce_memory_budget(keep=task.gs_id)
 
                 # revert - to last active save
                 elif task.cmd == "revert":
@@ -465,7 +777,7 @@ class Workers:
 
                     gd = None
                     update = None
-                    with session.lock:
+                    with session.locked():
                         try:
                             gd = session.graph.extract_graphdef()
                             update = session.graph.extract_update()
@@ -473,8 +785,8 @@ class Workers:
                             if not session:
                                 raise Exception("session could not be reverted: %s" % task.gs_id)
 
-                    graphreply = GraphReply(reqid=task.reqid, reply_json=json.dumps({ "graphdef" : gd, "dataupdate" : update }))
-                    graphreply.save()
+                    self.reply(task.reqid, json.dumps({ "graphdef" : gd, "dataupdate" : update }))
+                    self.enforce_memory_budget(keep=task.gs_id)
 
                 # reset
                 elif task.cmd == "reset":
@@ -483,8 +795,7 @@ class Workers:
                     gd = None
                     update = None
 
-                    graphreply = GraphReply(reqid=task.reqid, reply_json=json.dumps({ "graphdef" : gd, "dataupdate" : update }))
-                    graphreply.save()
+                    self.reply(task.reqid, json.dumps({ "graphdef" : gd, "dataupdate" : update }))
 
                 # save
                 elif task.cmd == "save":
@@ -492,7 +803,8 @@ class Workers:
                     if not session:
                         raise Exception("save failed: session was not live (%s)" % task.gs_id)
 
-                    with session.lock:
+                    with session.locked():
+                        session.mark_dirty()
                         anyerrors = session.graph.graph_update(task.sync_obj['sync'])
                         if anyerrors:
                             raise Exception("errors encountered during update: %s" % anyerrors)
@@ -500,8 +812,7 @@ class Workers:
                         session.graph.graph_coords(task.sync_obj['coords'])
                         self.quicksave(session)
     
-                        graphreply = GraphReply(reqid=task.reqid, reply_json='{"message" : "save success"}' )
-                        graphreply.save()
+                        self.reply(task.reqid, '{"message" : "save success"}')
 
                 # update & run
                 elif task.cmd == "update_run":
@@ -509,11 +820,15 @@ class Workers:
                     if not session:
                         raise Exception("update_run failed: session was not live (%s)" % task.gs_id)
 
-                    with session.lock:
-                        json_obj = session.update_and_execute(task.sync_obj['run_id'], task.sync_obj['sync'])
+                    def publish(event, data, gs_id=task.gs_id, run=task.idem_key):
+                        self.broker.publish(gs_id, event, data, run)
+
+                    with session.locked():
+                        session.mark_dirty()
+                        json_obj = session.update_and_execute(task.sync_obj['run_id'], task.sync_obj['sync'], listener=publish)
     
-                        graphreply = GraphReply(reqid=task.reqid, reply_json=json.dumps(json_obj))
-                        graphreply.save()
+                        self.reply(task.reqid, json.dumps(json_obj))
+                    self.enforce_memory_budget(keep=task.gs_id)
 
                 # update
                 elif task.cmd == "update":
@@ -521,7 +836,8 @@ class Workers:
                     if not session:
                         raise Exception("update failed: session was not live (%s)" % task.gs_id)
                     
-                    with session.lock:
+                    with session.locked():
+                        session.mark_dirty()
                         error1 = session.graph.graph_update(task.sync_obj['sync'])
                         error2 = session.graph.graph_coords(task.sync_obj['coords'])
                     
@@ -529,8 +845,7 @@ class Workers:
                     # TODO: impl
 
                     # NOTE: at this time, update replies are not read, nor is this needed
-                    #graphreply = GraphReply(reqid=task.reqid, reply_json=json.dumps(error1))
-                    #graphreply.save()
+                    #self.reply(task.reqid, json.dumps(error1))
 
                 # clear objects
                 elif task.cmd == "clear_data":
@@ -538,12 +853,23 @@ class Workers:
                     if not session:
                         raise Exception("clear_data failed: session was not live (%s)" % task.gs_id)
 
-                    with session.lock:
+                    with session.locked():
+                        session.mark_dirty()
                         session.graph.reset_all_objs()
                         update = session.graph.extract_update()
 
-                        graphreply = GraphReply(reqid=task.reqid, reply_json=json.dumps({ "dataupdate" : update }))
-                        graphreply.save()
+                        self.reply(task.reqid, json.dumps({ "dataupdate" : update }))
+
+                # plotdata of a zoomed-in plot window
+                elif task.cmd == "plotwindow":
+                    session = self.get_soft_session(task)
+                    if not session:
+                        raise Exception("plotwindow failed: session was not live (%s)" % task.gs_id)
+
+                    with session.locked():
+                        plotdata = session.graph.extract_plotwindow(task.sync_obj['id'], task.sync_obj['window'])
+
+                    self.reply(task.reqid, json.dumps({ "plotdata" : plotdata }))
 
                 # extract log lines
                 elif task.cmd == "extract_log":
@@ -551,19 +877,17 @@ class Workers:
                     if not session:
                         raise Exception("extract_log failed: session was not live (%s)" % task.gs_id)
 
-                    with session.lock:
+                    with session.locked():
                         self.extract_log(session)
 
-                        graphreply = GraphReply(reqid=task.reqid, reply_json='{"message" : "command log extraction successful"}' )
-                        graphreply.save()
+                        self.reply(task.reqid, '{"message" : "command log extraction successful"}')
 
                 # save & shutdown
                 elif task.cmd == "autosave_shutdown":
                     for session in self._get_user_softsessions(task):
                         self.shutdown_session(task.gs_id)
 
-                    graphreply = GraphReply(reqid=task.reqid, reply_json='{"message" : "save-shutdown successful"}' )
-                    graphreply.save()
+                    self.reply(task.reqid, '{"message" : "save-shutdown successful"}')
 
                 # hard shutdown
                 elif task.cmd == "shutdown":
@@ -581,14 +905,14 @@ class Workers:
                     obj.excomment = ""
                     obj.save()
                     session = SoftGraphSession(gs_id=str(obj.id), username=obj.username)
-                    with session.lock:
-                        self.sessions[obj.id] = session
+                    session.mark_dirty()
+                    with session.locked():
+                        self.sessions[session.gs_id] = session
     
                         self.quicksave(session)
                         self.autosave(session)
     
-                        graphreply = GraphReply(reqid=task.reqid, reply_json=obj.id)
-                        graphreply.save()
+                        self.reply(task.reqid, obj.id)
 
                 # clone
                 elif task.cmd == "clone":
@@ -600,29 +924,29 @@ class Workers:
                     session = self.get_soft_session(task)
                     if not session:
                         # get stored graphdef
-                        gd = json.loads(obj.graphdef)
+                        gd = json.loads(GraphSessionBlobs.load(task.gs_id, 'graphdef'))
                     else:
                         # get live session graphdef
-                        with session.lock:
+                        with session.locked():
                             gd = session.graph.extract_graphdef()
 
                     newobj = GraphSession()
                     newobj.example = False
-                    newobj.graphdef = json.dumps(gd)
                     newobj.title = obj.title + " [CLONE]"
                     newobj.description = obj.description
                     newobj.username = task.username
                     newobj.save()
+                    GraphSessionBlobs.store(newobj.id, graphdef=json.dumps(gd))
 
                     # this causes loading to fail, resulting in a reconstruct @ load or revert
                     self.reset_session(newobj.id)
 
-                    graphreply = GraphReply(reqid=task.reqid, reply_json=newobj.id)
-                    graphreply.save()
+                    self.reply(task.reqid, newobj.id)
 
                 # delete
                 elif task.cmd == "delete":
                     self.shutdown_session(task.gs_id)
+                    self.flush_autosaves(task.gs_id)
 
                     obj = GraphSession.objects.filter(id=task.gs_id)[0]
                     if os.path.exists(obj.stashed_matfile):
@@ -631,45 +955,36 @@ class Workers:
                         os.remove(obj.quicksave_matfile)
                     obj.delete()
 
-                    graphreply = GraphReply(reqid=task.reqid, reply_json='{"message" : "delete success"}' )
-                    graphreply.save()
+                    self.reply(task.reqid, '{"message" : "delete success"}')
 
 
                 # reset all sessions (admin command)
                 elif task.cmd == "admin_resetall":
-                    sesionobjs = GraphSession.objects.all()
-                    numreset = 0
-                    for obj in sesionobjs:
-                        # TODO: create a plural shutdown_sessions to improve lock acquisition performance
-                        self.shutdown_session(str(obj.id), nosave=False)
-
-                        if obj.stashed_pickle != "reset":
-                            numreset = numreset + 1
-
-                        obj.stashed_pickle = "reset"
-                        obj.quicksave_pickle = "reset"
-                        obj.loglines = ""
-                        obj.logheader = ""
-                        obj.stashed_matfile = ""
-                        obj.quicksave_matfile = ""
-                        obj.stashed = timezone.now()
-                        obj.quicksaved = timezone.now()
-                        obj.save()
-
-                    graphreply = GraphReply(reqid=task.reqid, reply_json=json.dumps({ "msg" : "sessions activaly reset: %d" % numreset }))
-                    graphreply.save()
+                    self.shutdown_sessions(list(self.sessions), nosave=False)
+                    self.flush_autosaves()
+
+                    # one bulk update for all reset fields
+                    numreset = GraphSessionBlobs.objects.exclude(stashed_pickle="reset").count()
+                    now = timezone.now()
+                    GraphSessionBlobs.objects.update(
+                        stashed_pickle="reset",
+                        quicksave_pickle="reset",
+                        loglines="")
+                    GraphSession.objects.update(
+                        logheader="",
+                        stashed_matfile="",
+                        quicksave_matfile="",
+                        stashed=now,
+                        quicksaved=now)
+                    _log("reset %d sessions" % numreset)
+
+                    self.reply(task.reqid, json.dumps({ "msg" : "sessions activaly reset: %d" % numreset }))
 
                 # shutdown all sessions (admin command)
                 elif task.cmd == "admin_shutdownall":
-                    numshutdown = 0
-                    keys = list(self.sessions)
-                    for k in keys:
-                        # (k becomes the session id)
-                        self.shutdown_session(k, nosave=False)
-                        numshutdown = numshutdown + 1
+                    numshutdown = self.shutdown_sessions(list(self.sessions), nosave=False)
 
-                    graphreply = GraphReply(reqid=task.reqid, reply_json=json.dumps({ "msg" : "sessions shut down: %d" % numshutdown }))
-                    graphreply.save()
+                    self.reply(task.reqid, json.dumps({ "msg" : "sessions shut down: %d" % numshutdown }))
 
                 # shutdown all sessions (admin command)
                 elif task.cmd == "admin_showvars":
@@ -680,8 +995,7 @@ class Workers:
                     except:
                         pass
 
-                    graphreply = GraphReply(reqid=task.reqid, reply_json=json.dumps({ "vars" : who }))
-                    graphreply.save()
+                    self.reply(task.reqid, json.dumps({ "vars" : who }))
 
                 # execute live matlab command (admin command)
                 elif task.cmd == "admin_matlabcmd":
@@ -692,8 +1006,7 @@ class Workers:
                     import ifitlib
                     ans = ifitlib._eval(mlcmd, nargout=nargout, dontlog=True)
 
-                    graphreply = GraphReply(reqid=task.reqid, reply_json=json.dumps({ "ans" : json.dumps(ans) }))
-                    graphreply.save()
+                    self.reply(task.reqid, json.dumps({ "ans" : json.dumps(ans) }))
 
                 #
                 else:
@@ -702,10 +1015,14 @@ class Workers:
                 _log("task done")
 
             except Exception as e:
+                status = "error"
                 _log("fatal error: " + str(e), error=True)
 
-                graphreply = GraphReply(reqid=task.reqid, reply_json=json.dumps( { "fatalerror" : str(e) } ))
-                graphreply.save()
+                self.reply(task.reqid, json.dumps( { "fatalerror" : str(e) } ))
+
+            self.release(task)
+            _m_task_seconds.observe(time.time() - started, cmd=task.cmd)
+            _m_tasks.inc(cmd=task.cmd, status=status)
 
         _log("exit")
         self.termination_events[threading.current_thread().getName()].set()
@@ -721,6 +1038,10 @@ class Command(BaseCommand):
         c.handle()
 
         workers = Workers()
+
+        if settings.WRK_METRICS_PORT:
+            _log("serving metrics at 127.0.0.1:%d..." % settings.WRK_METRICS_PORT)
+            metrics.start_http_server(settings.WRK_METRICS_PORT)
         
         _log("starting workers...")
         _log("looking for tasks...")
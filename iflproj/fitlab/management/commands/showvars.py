@@ -6,7 +6,9 @@ import os
 from django.core.management.base import BaseCommand
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
-from fitlab.models import GraphSession, GraphUiRequest, GraphReply
+from fitlab.models import GraphSession, GraphUiRequest
+from fitlab import broker
+from iflproj.settings import WRK_BROKER_SOCKET
 
 class Command(BaseCommand):
     help = '''List of currently loaded MATLAB variables.'''
@@ -22,14 +24,14 @@ class Command(BaseCommand):
         uireq.save()
 
         while True:
-            for i in range(10):
-                lst = GraphReply.objects.filter(reqid=uireq.id)
-                if len(lst) == 1:
-                    # success, print and exit
-                    reply = lst[0]
-                    lst = json.loads(reply.reply_json)["vars"]
-                    for l in lst:
-                        print(l)
-                    return
-                time.sleep(0.5)
+            reply = broker.take_reply(WRK_BROKER_SOCKET, uireq.id, 5)
+            if reply:
+                # success, print and exit
+                lst = json.loads(broker.reply_text(*reply))["vars"]
+                for l in lst:
+                    print(l)
+                return
+            if reply is None:
+                # the worker is not running
+                time.sleep(5)
             print("waiting for worker reply...")
@@ -0,0 +1,56 @@
+# Generated by Django 2.0.1 on 2026-10-19 11:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BLOB_FIELDS = ('loglines', 'graphdef', 'stashed_pickle', 'quicksave_pickle')
+
+def split_blobs(apps, schema_editor):
+    GraphSession = apps.get_model('fitlab', 'GraphSession')
+    GraphSessionBlobs = apps.get_model('fitlab', 'GraphSessionBlobs')
+    for gs in GraphSession.objects.all().iterator():
+        GraphSessionBlobs.objects.create(session_id=gs.id, **{ f : getattr(gs, f) for f in BLOB_FIELDS })
+
+def join_blobs(apps, schema_editor):
+    GraphSession = apps.get_model('fitlab', 'GraphSession')
+    GraphSessionBlobs = apps.get_model('fitlab', 'GraphSessionBlobs')
+    for blobs in GraphSessionBlobs.objects.all().iterator():
+        GraphSession.objects.filter(id=blobs.session_id).update(**{ f : getattr(blobs, f) for f in BLOB_FIELDS })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fitlab', '0030_graphsession_logheader'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GraphSessionBlobs',
+            fields=[
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='blobs', serialize=False, to='fitlab.GraphSession')),
+                ('loglines', models.TextField(blank=True, null=True)),
+                ('graphdef', models.TextField(blank=True)),
+                ('stashed_pickle', models.TextField(blank=True)),
+                ('quicksave_pickle', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.RunPython(split_blobs, join_blobs),
+        migrations.RemoveField(
+            model_name='graphsession',
+            name='graphdef',
+        ),
+        migrations.RemoveField(
+            model_name='graphsession',
+            name='loglines',
+        ),
+        migrations.RemoveField(
+            model_name='graphsession',
+            name='quicksave_pickle',
+        ),
+        migrations.RemoveField(
+            model_name='graphsession',
+            name='stashed_pickle',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.0.1 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fitlab', '0031_graphsessionblobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='graphuirequest',
+            name='idem_key',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
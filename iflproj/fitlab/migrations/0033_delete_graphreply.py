@@ -0,0 +1,16 @@
+# Generated by Django 2.0.1 on 2026-10-19 14:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fitlab', '0032_graphuirequest_idem_key'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='GraphReply',
+        ),
+    ]
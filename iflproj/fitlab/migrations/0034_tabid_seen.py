@@ -0,0 +1,24 @@
+# Generated by Django 2.0.1 on 2026-10-19 14:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fitlab', '0033_delete_graphreply'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tabid',
+            name='seen',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='seen'),
+        ),
+        migrations.AlterField(
+            model_name='tabid',
+            name='gs_id',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+    ]
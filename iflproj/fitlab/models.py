@@ -1,10 +1,42 @@
+from datetime import timedelta
+
 from django.db import models
-from django.db.models import TextField, CharField, DateTimeField, BooleanField, IntegerField
+from django.db.models import TextField, CharField, DateTimeField, BooleanField, IntegerField, OneToOneField
 from django.utils import timezone
 
 class TabId(models.Model):
+    '''
+    Browser tab ownership of sessions, the newest tab of a session owns it. This table is the source of truth,
+    the worker broker caches it so that validations do not query it, and seen is refreshed only periodically.
+    '''
     created = DateTimeField('created', default=timezone.now)
-    gs_id = CharField(max_length=200)
+    seen = DateTimeField('seen', default=timezone.now, db_index=True)
+    gs_id = CharField(max_length=200, db_index=True)
+
+    @staticmethod
+    def is_owner(gs_id, tab_id):
+        ''' True if tab_id exists and no newer tab of gs_id does, superseded tabs are deleted '''
+        try:
+            tab_id = int(tab_id)
+        except (ValueError, TypeError):
+            return False
+        if not TabId.objects.filter(id=tab_id, gs_id=gs_id).exists():
+            return False
+        if TabId.objects.filter(gs_id=gs_id, id__gt=tab_id).exists():
+            TabId.objects.filter(id=tab_id).delete()
+            return False
+        return True
+    @staticmethod
+    def takeover(gs_id, tab_id):
+        ''' deletes all other tabs of gs_id '''
+        TabId.objects.filter(gs_id=gs_id).exclude(id=tab_id).delete()
+    @staticmethod
+    def touch(tab_id):
+        TabId.objects.filter(id=tab_id).update(seen=timezone.now())
+    @staticmethod
+    def purge(ttl_s):
+        ''' deletes tabs not seen for ttl_s '''
+        TabId.objects.filter(seen__lt=timezone.now() - timedelta(seconds=ttl_s)).delete()
 
 class GraphUiRequest(models.Model):
     created = DateTimeField('created', default=timezone.now)
@@ -12,12 +44,7 @@ class GraphUiRequest(models.Model):
     gs_id = CharField(max_length=200)
     cmd = CharField(max_length=200, default="update_run")
     syncset = TextField(blank=True, null=True)
-
-class GraphReply(models.Model):
-    created = DateTimeField('created', default=timezone.now)
-    reqid = CharField(max_length=200, unique=True)
-    reply_json = TextField()
-    reply_error = TextField(blank=True, null=True)
+    idem_key = CharField(max_length=64, default="", blank=True)
 
 class GraphSession(models.Model):
     created = DateTimeField('created', default=timezone.now)
@@ -25,7 +52,6 @@ class GraphSession(models.Model):
     listidx = IntegerField(default=0)
     title = CharField(max_length=200, default="", blank=True, null=True)
     description = TextField(blank=True, null=True)
-    loglines = TextField(blank=True, null=True)
     logheader = TextField(blank=True, null=True)
 
     example = BooleanField(default=False)
@@ -35,22 +61,54 @@ class GraphSession(models.Model):
     quicksaved = DateTimeField('quicksaved', blank=True, null=True)
     stashed = DateTimeField('stashed', blank=True, null=True)
 
-    graphdef = TextField(blank=True)
-
     # stashed live data on top of quicksave
-    stashed_pickle = TextField(blank=True)
     stashed_matfile = CharField(max_length=200, default="", blank=True)
 
     # restore point / quick save
-    quicksave_pickle = TextField(blank=True)
     quicksave_matfile = CharField(max_length=200, default="", blank=True)
 
     def __str__(self):
        return 'session %s, idx %s, %s' % (self.id, self.listidx, self.title)
+    def get_blobs(self):
+        ''' returns the blob row of this (saved) session, creating it if missing '''
+        try:
+            return self.blobs
+        except GraphSessionBlobs.DoesNotExist:
+            self.blobs = GraphSessionBlobs.objects.create(session=self)
+            return self.blobs
     def reset(self):
-        self.stashed_pickle = "reset"
-        self.quicksave_pickle = "reset"
-        self.loglines = ""
+        ''' resets the session and its blob row in memory, both must be saved by the caller '''
+        blobs = self.get_blobs()
+        blobs.stashed_pickle = "reset"
+        blobs.quicksave_pickle = "reset"
+        blobs.loglines = ""
         self.logheader = ""
         self.stashed_matfile = ""
         self.quicksave_matfile = ""
+
+class GraphSessionBlobs(models.Model):
+    '''
+    The heavy columns of a GraphSession, kept apart so that listing and metadata queries do not
+    load them. Use load and store to access single columns by session id.
+    '''
+    session = OneToOneField(GraphSession, on_delete=models.CASCADE, primary_key=True, related_name='blobs')
+
+    loglines = TextField(blank=True, null=True)
+    graphdef = TextField(blank=True)
+    stashed_pickle = TextField(blank=True)
+    quicksave_pickle = TextField(blank=True)
+
+    def __str__(self):
+       return 'blobs of session %s' % self.session_id
+    @staticmethod
+    def load(gs_id, name):
+        ''' loads the single column name, "" if the session has no blob row '''
+        lst = GraphSessionBlobs.objects.filter(session_id=gs_id).values_list(name, flat=True)
+        if len(lst) == 0:
+            return ""
+        return lst[0]
+    @staticmethod
+    def store(gs_id, **fields):
+        ''' updates the given columns only, creating the blob row if missing '''
+        if GraphSessionBlobs.objects.filter(session_id=gs_id).update(**fields) == 0:
+            GraphSessionBlobs.objects.create(session_id=gs_id, **fields)
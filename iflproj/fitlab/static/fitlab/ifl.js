@@ -60,6 +60,10 @@ class GraphInterfaceIFL extends GraphInterface {
 
     // error node
     this._errorNode = null;
+    // idempotency key of the run whose execution events are being polled
+    this._pollingRun = null;
+    // request and idempotency key of a timed out run, resent if the same run is requested again
+    this._timedOutRun = null;
   }
 
   // overloaded _dblclickNodeCB becomes run/execute node
@@ -85,6 +89,35 @@ class GraphInterfaceIFL extends GraphInterface {
       $("body").css("cursor", "default");
     }.bind(this));
   }
+  pollRunEvents(idem_key, after) {
+    // node started/finished events and intermediate data updates of the run idem_key, polled until its reply arrives
+    if (this._pollingRun != idem_key) return;
+    this.ajaxcall_noerror("/ifl/ajax_events/", { "run" : idem_key, "after" : after }, function(obj) {
+      if (this._pollingRun != idem_key) return;
+      for (let e of obj["events"]) {
+        if (e["event"] == "dataupdate") {
+          this.showDataUpdate(e["data"]);
+          continue;
+        }
+        let m = this.graphData.getNode(e["data"]["id"]);
+        if (m == null) continue;
+        if (e["event"] == "started") m.gNode.state = NodeState.RUNNING;
+        else if (e["event"] == "finished") this.graphData.updateNodeState(m);
+      }
+      if (obj["events"].length > 0) this.updateUi();
+      this.pollRunEvents(idem_key, obj["last"]);
+    }.bind(this));
+  }
+  showDataUpdate(update) {
+    // displays an intermediate data update while the ui is locked by a run, the run reply syncs the final state
+    for (let key in update) {
+      let m = this.graphData.getNode(key);
+      if (m == null) continue;
+      m.obj = update[key];
+      this.graphData.updateNodeState(m);
+      fireEvents(this._nodeDataUpdateListn, "dataUpdate", m);
+    }
+  }
   revertSession() {
     $("body").css("cursor", "wait");
 
@@ -125,6 +158,12 @@ class GraphInterfaceIFL extends GraphInterface {
       // empty
     }.bind(this));
   }
+  loadPlotWindow(id, window, success_cb) {
+    // plotdata of node id at the resolution of a zoomed-in plot window
+    this.ajaxcall_noerror("/ifl/ajax_plotwindow/", { "id" : id, "window" : window }, function(obj) {
+      success_cb(obj["plotdata"]);
+    }.bind(this));
+  }
   runSelectedNode() {
     if (this.graphData.getSelectedNode()) {
       this.run(this.graphData.getSelectedNode().id);
@@ -136,8 +175,8 @@ class GraphInterfaceIFL extends GraphInterface {
   }
 
   // server communication
-  ajaxcall(url, data, success_cb, fail_cb=null) {
-    this.isalive = simpleajax(url, data, this.gs_id, this.tab_id, success_cb, fail_cb, true);
+  ajaxcall(url, data, success_cb, fail_cb=null, idem_key=null) {
+    this.isalive = simpleajax(url, data, this.gs_id, this.tab_id, success_cb, fail_cb, true, idem_key);
   }
   ajaxcall_noerror(url, data, success_cb) {
     // call with showfail=false, which turns off django and offline fails
@@ -168,9 +207,25 @@ class GraphInterfaceIFL extends GraphInterface {
     post_data["sync"] = this.undoredo.getSyncSet();
     post_data["run_id"] = id;
 
+    // a retry of a timed out run attaches to the execution still in progress on the server, resending the
+    // request as it was sent, since its sync set has been drained from the buffer, unless the graph changed since
+    let idem_key = null;
+    let retry = this._timedOutRun;
+    if (retry != null && retry.post_data["run_id"] == id && post_data["sync"].length == 0) {
+      post_data = retry.post_data;
+      idem_key = retry.idem_key;
+    }
+    else
+      idem_key = Date.now().toString(36) + Math.random().toString(36).slice(2);
+    this._timedOutRun = null;
+    this._pollingRun = idem_key;
+    this.pollRunEvents(idem_key, 0);
+
     this.ajaxcall("/ifl/ajax_run_node/", post_data,
       function(obj) {
         this.lock = false;
+        this._pollingRun = null;
+        if (obj['timeout'] != null) this._timedOutRun = { "post_data" : post_data, "idem_key" : idem_key };
 
         // fail section
         let failmsg = obj['error'];
@@ -198,9 +253,11 @@ class GraphInterfaceIFL extends GraphInterface {
       function() {
         // unhandled server exception section
         this.lock = false;
+        this._pollingRun = null;
         this.graphData.updateNodeState(n);
         this.updateUi();
-      }.bind(this)
+      }.bind(this),
+      idem_key
     );
   }
 }
@@ -211,13 +268,15 @@ function wrap_ajax_validation_ids(gs_id, tab_id) {
   // GraphInterface utility function
   return { "gs_id" : gs_id, "tab_id" : tab_id };
 }
-function simpleajax(url, data, gs_id, tab_id, success_cb, fail_cb=null, showfail=true) {
+function simpleajax(url, data, gs_id, tab_id, success_cb, fail_cb=null, showfail=true, idem_key=null) {
   // GraphInterface utility function
   let isalive = true;
+  let post = { "gs_id": gs_id, "tab_id": tab_id, "data_str" : JSON.stringify(data) };
+  if (idem_key != null) post["idem_key"] = idem_key;
   $.ajax({
     type: "POST",
     url: url,
-    data: { "gs_id": gs_id, "tab_id": tab_id, "data_str" : JSON.stringify(data) },
+    data: post,
   })
   .fail(function(xhr, statusText, errorThrown) {
     if (!showfail) return
@@ -0,0 +1,883 @@
+var categories = [
+  "handles",
+  "tools",
+  "models",
+  "transforms",
+  "operators"
+];
+
+var nodeAddresses = [
+  "handles.literal",
+  "handles.idata",
+  "handles.ifunc",
+  "tools.IData",
+  "tools.IData_1d",
+  "tools.IData_2d",
+  "handles.obj",
+  "tools.IData.mask",
+  "tools.IData.keep",
+  "tools.IData.rebin",
+  "tools.IFunc",
+  "tools.IFunc.guess",
+  "tools.IFunc.fixpars",
+  "tools.fit",
+  "tools.Combine_data",
+  "models.Lin",
+  "models.Gauss",
+  "models.Lorentz",
+  "models.Exp",
+  "models.add_models",
+  "models.mult_models",
+  "models.separate",
+  "transforms.log",
+  "transforms.power",
+  "transforms.scale",
+  "transforms.add",
+  "transforms.transpose",
+  "transforms.from_model",
+  "operators.add_data",
+  "operators.subtract_data",
+  "operators.multiply_data",
+  "operators.divide_data",
+  "operators.catenate"
+];
+
+var nodeTypes = {
+  "handles": {
+    "leaf": null,
+    "branch": {
+      "literal": {
+        "leaf": {
+          "basetype": "object_literal",
+          "type": "literal",
+          "address": "handles.literal",
+          "ipars": [],
+          "itypes": [],
+          "otypes": [],
+          "static": "false",
+          "executable": "false",
+          "edit": "true",
+          "name": "literal",
+          "label": "",
+          "data": null,
+          "docstring": "Literal value handle."
+        },
+        "branch": {}
+      },
+      "obj": {
+        "leaf": {
+          "basetype": "object",
+          "type": "obj",
+          "address": "handles.obj",
+          "ipars": [],
+          "itypes": [],
+          "otypes": [],
+          "static": "false",
+          "executable": "true",
+          "edit": "true",
+          "name": "object",
+          "label": "",
+          "data": null,
+          "docstring": "Multipurpose, untyped object handle."
+        },
+        "branch": {}
+      },
+      "idata": {
+        "leaf": {
+          "basetype": "object_idata",
+          "type": "idata",
+          "address": "handles.idata",
+          "ipars": [],
+          "itypes": [
+            "IData"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "false",
+          "executable": "true",
+          "edit": "false",
+          "name": "idata",
+          "label": "",
+          "data": null,
+          "docstring": "IData object handle."
+        },
+        "branch": {}
+      },
+      "ifunc": {
+        "leaf": {
+          "basetype": "object_ifunc",
+          "type": "ifunc",
+          "address": "handles.ifunc",
+          "ipars": [],
+          "itypes": [
+            "IFunc"
+          ],
+          "otypes": [
+            "IFunc"
+          ],
+          "static": "false",
+          "executable": "true",
+          "edit": "false",
+          "name": "ifunc",
+          "label": "",
+          "data": null,
+          "docstring": "IFunc object handle."
+        },
+        "branch": {}
+      }
+    }
+  },
+  "tools": {
+    "leaf": null,
+    "branch": {
+      "IData": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "IData",
+          "address": "tools.IData",
+          "ipars": [
+            "url"
+          ],
+          "itypes": [
+            ""
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "IData",
+          "label": "IData",
+          "data": {
+            "datashape": null
+          },
+          "docstring": "Creates an IData object using data file located at url."
+        },
+        "branch": {
+          "keep": {
+            "leaf": {
+              "basetype": "method",
+              "type": "keep",
+              "address": "tools.IData.keep",
+              "ipars": [
+                "low",
+                "high"
+              ],
+              "itypes": [
+                "float",
+                "float"
+              ],
+              "otypes": [],
+              "static": "true",
+              "executable": "true",
+              "edit": "true",
+              "name": "keep",
+              "label": "keep",
+              "data": {
+                "axis": 0
+              },
+              "docstring": "Keeps data only within specified interval on given axis. (Signal=0, x=1, y=2)."
+            },
+            "branch": {}
+          },
+          "mask": {
+            "leaf": {
+              "basetype": "method",
+              "type": "mask",
+              "address": "tools.IData.mask",
+              "ipars": [
+                "min",
+                "max"
+              ],
+              "itypes": [
+                "float",
+                "float"
+              ],
+              "otypes": [],
+              "static": "true",
+              "executable": "true",
+              "edit": "true",
+              "name": "mask",
+              "label": "mask",
+              "data": {},
+              "docstring": "Masks data of the specified interval."
+            },
+            "branch": {}
+          },
+          "rebin": {
+            "leaf": {
+              "basetype": "method",
+              "type": "rebin",
+              "address": "tools.IData.rebin",
+              "ipars": [
+                "nbins"
+              ],
+              "itypes": [
+                "int"
+              ],
+              "otypes": [],
+              "static": "true",
+              "executable": "true",
+              "edit": "true",
+              "name": "rebin",
+              "label": "rebin",
+              "data": {
+                "axis": 1
+              },
+              "docstring": "Rebins using interpolate."
+            },
+            "branch": {}
+          }
+        }
+      },
+      "IFunc": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "IFunc",
+          "address": "tools.IFunc",
+          "ipars": [],
+          "itypes": [],
+          "otypes": [
+            "IFunc"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "IFunc",
+          "label": "IFunc",
+          "data": {
+            "datashape": null,
+            "symbol": "iFunc"
+          },
+          "docstring": "Creates an IFunc object, a flexible fitting model. Use iFit syntax to input a model specification in the \"symbol\" argument."
+        },
+        "branch": {
+          "fixpars": {
+            "leaf": {
+              "basetype": "method",
+              "type": "fixpars",
+              "address": "tools.IFunc.fixpars",
+              "ipars": [
+                "parnames"
+              ],
+              "itypes": [
+                "list"
+              ],
+              "otypes": [],
+              "static": "true",
+              "executable": "true",
+              "edit": "true",
+              "name": "fixpars",
+              "label": "fixpars",
+              "data": {},
+              "docstring": "Fixes parameters with the specified names. Fixed parameters will not be varied during fit optimizations."
+            },
+            "branch": {}
+          },
+          "guess": {
+            "leaf": {
+              "basetype": "method",
+              "type": "guess",
+              "address": "tools.IFunc.guess",
+              "ipars": [
+                "guess"
+              ],
+              "itypes": [
+                "dict"
+              ],
+              "otypes": [],
+              "static": "true",
+              "executable": "true",
+              "edit": "true",
+              "name": "guess",
+              "label": "guess",
+              "data": {},
+              "docstring": "Applies values to parameters by means of dictionary keys-value pairs. All values must be set simultaneously."
+            },
+            "branch": {}
+          }
+        }
+      },
+      "Combine_data": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "Combine_data",
+          "address": "tools.Combine_data",
+          "ipars": [
+            "filenames"
+          ],
+          "itypes": [
+            "list"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "Combine_data",
+          "label": "Combine_data",
+          "data": {},
+          "docstring": "Combines and outputs multiple data files into a single IData object."
+        },
+        "branch": {}
+      },
+      "IData_1d": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "IData_1d",
+          "address": "tools.IData_1d",
+          "ipars": [
+            "axis",
+            "signal",
+            "error"
+          ],
+          "itypes": [
+            "list",
+            "list",
+            "list"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "IData_1d",
+          "label": "IData_1d",
+          "data": {},
+          "docstring": "Creates an (x, y) IData object from two lists."
+        },
+        "branch": {}
+      },
+      "IData_2d": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "IData_2d",
+          "address": "tools.IData_2d",
+          "ipars": [
+            "axes",
+            "signal"
+          ],
+          "itypes": [
+            "list",
+            "list"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "IData_2d",
+          "label": "IData_2d",
+          "data": {},
+          "docstring": "Creates an two dimensional IData object from axes and signal args. The dimensionality of axes must be one higher than that of signal."
+        },
+        "branch": {}
+      },
+      "fit": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "fit",
+          "address": "tools.fit",
+          "ipars": [
+            "idata",
+            "ifunc"
+          ],
+          "itypes": [
+            "IData",
+            "IFunc"
+          ],
+          "otypes": [
+            "IFunc"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "fit",
+          "label": "fit",
+          "data": {
+            "optimizer": "fminpowell",
+            "passes": 1,
+            "tolerance": 0.0,
+            "seed": "default"
+          },
+          "docstring": "Outputs the fitted model of an IFunc model to an IData object. Each of up to \"passes\" passes refines the previous, stopping early if parameters change less than a nonzero relative \"tolerance\". Seed \"current\" starts from the model's parameter values, \"previous\" from the last fit of this model."
+        },
+        "branch": {}
+      }
+    }
+  },
+  "models": {
+    "leaf": null,
+    "branch": {
+      "Exp": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "Exp",
+          "address": "models.Exp",
+          "ipars": [],
+          "itypes": [],
+          "otypes": [
+            "IFunc"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "Exp",
+          "label": "Exp",
+          "data": {
+            "datashape": null
+          },
+          "docstring": "Creates an exponential IFunc model."
+        },
+        "branch": {}
+      },
+      "Gauss": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "Gauss",
+          "address": "models.Gauss",
+          "ipars": [],
+          "itypes": [],
+          "otypes": [
+            "IFunc"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "Gauss",
+          "label": "Gauss",
+          "data": {
+            "datashape": null
+          },
+          "docstring": "Creates a Gauss IFunc model."
+        },
+        "branch": {}
+      },
+      "Lin": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "Lin",
+          "address": "models.Lin",
+          "ipars": [],
+          "itypes": [],
+          "otypes": [
+            "IFunc"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "Lin",
+          "label": "Lin",
+          "data": {
+            "datashape": null
+          },
+          "docstring": "Creates a Linear IFunc model."
+        },
+        "branch": {}
+      },
+      "Lorentz": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "Lorentz",
+          "address": "models.Lorentz",
+          "ipars": [],
+          "itypes": [],
+          "otypes": [
+            "IFunc"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "Lorentz",
+          "label": "Lorentz",
+          "data": {
+            "datashape": null
+          },
+          "docstring": "Creates a Lorentz IFunc model."
+        },
+        "branch": {}
+      },
+      "add_models": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "add_models",
+          "address": "models.add_models",
+          "ipars": [
+            "ifunc_a",
+            "ifunc_b"
+          ],
+          "itypes": [
+            "IFunc",
+            "IFunc"
+          ],
+          "otypes": [
+            "IFunc"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "add_models",
+          "label": "add_models",
+          "data": {},
+          "docstring": "Outputs the sum of two IFunc model objects, preserving configuration state."
+        },
+        "branch": {}
+      },
+      "mult_models": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "mult_models",
+          "address": "models.mult_models",
+          "ipars": [
+            "ifunc_a",
+            "ifunc_b"
+          ],
+          "itypes": [
+            "IFunc",
+            "IFunc"
+          ],
+          "otypes": [
+            "IFunc"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "mult_models",
+          "label": "mult_models",
+          "data": {},
+          "docstring": "Outputs the multiplication of two IFunc model objects"
+        },
+        "branch": {}
+      },
+      "separate": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "separate",
+          "address": "models.separate",
+          "ipars": [
+            "fitfunc",
+            "typefunc"
+          ],
+          "itypes": [
+            "IFunc",
+            "IFunc"
+          ],
+          "otypes": [
+            "IFunc"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "separate",
+          "label": "separate",
+          "data": {
+            "pidx": -1
+          },
+          "docstring": "Extracts parameter values and axis information from fitfunc given the parameters in typefunc. Returns a new IFunc object with that parameter configuration."
+        },
+        "branch": {}
+      }
+    }
+  },
+  "transforms": {
+    "leaf": null,
+    "branch": {
+      "add": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "add",
+          "address": "transforms.add",
+          "ipars": [
+            "dataset"
+          ],
+          "itypes": [
+            "IData"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "add",
+          "label": "add",
+          "data": {
+            "axis": 0,
+            "scalar": 0
+          },
+          "docstring": "Add real number to dataset."
+        },
+        "branch": {}
+      },
+      "from_model": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "from_model",
+          "address": "transforms.from_model",
+          "ipars": [
+            "data",
+            "model"
+          ],
+          "itypes": [
+            "IData",
+            "IFunc"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "from_model",
+          "label": "from_model",
+          "data": {},
+          "docstring": "Defines a dataset operator from an iFunc model."
+        },
+        "branch": {}
+      },
+      "log": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "log",
+          "address": "transforms.log",
+          "ipars": [
+            "data"
+          ],
+          "itypes": [
+            "IData"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "log",
+          "label": "log",
+          "data": {
+            "axis": 0
+          },
+          "docstring": "A log dataset operator. \"axis\": 0 is signal, 1 first axis, etc."
+        },
+        "branch": {}
+      },
+      "power": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "power",
+          "address": "transforms.power",
+          "ipars": [
+            "data"
+          ],
+          "itypes": [
+            "IData"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "power",
+          "label": "power",
+          "data": {
+            "axis": 0,
+            "power": 2
+          },
+          "docstring": "A power dataset operator (square, cube, ...). \"axis\": 0 is signal, 1 first axis, etc."
+        },
+        "branch": {}
+      },
+      "scale": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "scale",
+          "address": "transforms.scale",
+          "ipars": [
+            "dataset"
+          ],
+          "itypes": [
+            "IData"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "scale",
+          "label": "scale",
+          "data": {
+            "axis": 0,
+            "scale": 1.0
+          },
+          "docstring": "Scale dataset by real number."
+        },
+        "branch": {}
+      },
+      "transpose": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "transpose",
+          "address": "transforms.transpose",
+          "ipars": [
+            "data"
+          ],
+          "itypes": [
+            "IData"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "transpose",
+          "label": "transpose",
+          "data": {},
+          "docstring": "Transpose dataset."
+        },
+        "branch": {}
+      }
+    }
+  },
+  "operators": {
+    "leaf": null,
+    "branch": {
+      "add_data": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "add_data",
+          "address": "operators.add_data",
+          "ipars": [
+            "sample",
+            "background"
+          ],
+          "itypes": [
+            "IData",
+            "IData"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "add_data",
+          "label": "add_data",
+          "data": {},
+          "docstring": "Add datasets."
+        },
+        "branch": {}
+      },
+      "catenate": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "catenate",
+          "address": "operators.catenate",
+          "ipars": [
+            "data"
+          ],
+          "itypes": [
+            "IData"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "catenate",
+          "label": "catenate",
+          "data": {},
+          "docstring": "Concatenate dataset (k x R^n -> R^n+1)."
+        },
+        "branch": {}
+      },
+      "divide_data": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "divide_data",
+          "address": "operators.divide_data",
+          "ipars": [
+            "sample",
+            "background"
+          ],
+          "itypes": [
+            "IData",
+            "IData"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "divide_data",
+          "label": "divide_data",
+          "data": {},
+          "docstring": "Divide a calibration set, e.g. for normalization."
+        },
+        "branch": {}
+      },
+      "multiply_data": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "multiply_data",
+          "address": "operators.multiply_data",
+          "ipars": [
+            "sample",
+            "background"
+          ],
+          "itypes": [
+            "IData",
+            "IData"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "multiply_data",
+          "label": "multiply_data",
+          "data": {},
+          "docstring": "Multiply datasets"
+        },
+        "branch": {}
+      },
+      "subtract_data": {
+        "leaf": {
+          "basetype": "function_named",
+          "type": "subtract_data",
+          "address": "operators.subtract_data",
+          "ipars": [
+            "sample",
+            "background"
+          ],
+          "itypes": [
+            "IData",
+            "IData"
+          ],
+          "otypes": [
+            "IData"
+          ],
+          "static": "true",
+          "executable": "false",
+          "edit": "true",
+          "name": "subtract_data",
+          "label": "subtract_data",
+          "data": {},
+          "docstring": "Subtract a calibration set, e.g. background from data."
+        },
+        "branch": {}
+      }
+    }
+  }
+};
+
@@ -74,11 +74,14 @@ class Plot1D {
   fireMouseRClickPlot(...args) { _pltfc_fireEvents(this._mouseRClickPlotListeners, "mouseRClickPlot", ...args); }
   rgstrMouseCtrlClickPlot(f) { this._mouseCtrlClickPlotListeners.push(f); }
   fireMouseCtrlClickPlot(...args) { _pltfc_fireEvents(this._mouseCtrlClickPlotListeners, "mouseCtrlClickPlot", ...args); }
+  rgstrZoomEnd(f) { this._zoomEndListeners.push(f); } // supports xmin,xmax args
+  fireZoomEnd(...args) { _pltfc_fireEvents(this._zoomEndListeners, "zoomEnd", ...args); }
 
   constructor(params, svg_branch, logscale=false, wname = null) {
     this._mouseClickPlotListeners = [];
     this._mouseRClickPlotListeners = [];
     this._mouseCtrlClickPlotListeners = [];
+    this._zoomEndListeners = [];
 
     let p = params;
     this.params_lst = [params];
@@ -126,6 +129,12 @@ class Plot1D {
     this.rePlotMany(this.params_lst);
     // TODO: do something about his so we don't have to replot everything every time...
   }
+  replacePlot(j, params) {
+    // replaces data set j, e.g. by a higher resolution version of the zoomed-in range, keeping the current zoom
+    if (params.colour == null) params.colour = this.params_lst[j].colour;
+    this.params_lst[j] = params;
+    this.rePlotMany(this.params_lst);
+  }
   _drawPoints(xScl, yScl, data_line_style=false) {
     this.pointGroups.selectAll("*").remove();
 
@@ -204,6 +213,7 @@ class Plot1D {
     let y1 = 0;
 
     // zoom
+    var zoomed = [xmin, xmax];
     var zoom = d3.zoom()
       .on("zoom", () => {
       var new_xScale = d3.event.transform.rescaleX(xScale);
@@ -214,6 +224,13 @@ class Plot1D {
       this._drawPoints(new_xScale, new_yScale);
       this.last_xScale = new_xScale;
       this.last_yScale = new_yScale;
+    })
+    .on("end", () => {
+      // clicks also start and end a zoom gesture
+      let domain = this.last_xScale.domain();
+      if (zoomed != null && zoomed[0] == domain[0] && zoomed[1] == domain[1]) return;
+      zoomed = domain;
+      this.fireZoomEnd(domain[0], domain[1]);
     });
     var view = axisGroup.append("rect")
       .attr("width", w)
@@ -5,9 +5,11 @@
 
 class IdxEditWindow {
   // This class is a multi-purpose window containing a plotter, a browser, and an index editor all in one.
-  constructor(node_dataCB, mouseUpCB, dragWindowCB, closeOuterCB, clickPlotCB, wname, xpos, ypos, titleadd=null) {
+  constructor(node_dataCB, mouseUpCB, dragWindowCB, closeOuterCB, clickPlotCB, wname, xpos, ypos, titleadd=null, plotWindowCB=null) {
     // PlotWindow
     this.clickPlotCB = clickPlotCB;
+    this.plotWindowCB = plotWindowCB; // (id, window, success_cb) fetches plotdata of a zoomed-in window
+    this._plotted = []; // [node id, plotdata] of each data set of this.plot
     this.logscaleCB = this._logscaleCB.bind(this);
     this.sizeCB = this._toggleSizeCB.bind(this);
 
@@ -118,9 +120,11 @@ class IdxEditWindow {
     this.plotbranch = d3.select('#'+this.body_container[0])
       .insert("svg", "#"+this.wname+"_edtcontainer");
     this.plot = null;
+    this._plotted = [];
 
     // get
     let lst = this.model.get_plots();
+    let ids = this.model.get_plt_node_ids();
     let ndims = this.model.get_ndims();
     for (let i=0;i<lst.length;i++) {
       let plotdata = lst[i];
@@ -134,10 +138,12 @@ class IdxEditWindow {
       plotdata.w = this.w;
       plotdata.h = this.h;
 
+      if (ndims == 1) this._plotted.push([ids[i], plotdata]);
       if (this.plot == null) {
         if (ndims == 1) {
           this.plot = new Plot1D(plotdata, this.plotbranch, this.logscale, this.wname);
           this.plot.rgstrMouseClickPlot(this.clickPlotCB);
+          this.plot.rgstrZoomEnd(this._zoomEndCB.bind(this));
         }
         if (ndims == 2) {
           this.plot = new Plot2D(plotdata, this.plotbranch, this.logscale);
@@ -149,7 +155,6 @@ class IdxEditWindow {
     }
 
     // update window title
-    let ids = this.model.get_plt_node_ids();
     let title = ids[0];
     for (let i=0;i<ids.length-1;i++) {
       title = title + ", " + ids[i+1];
@@ -158,6 +163,25 @@ class IdxEditWindow {
     setSubWindowTitle(this.wname, title);
   }
 
+  _zoomEndCB(xmin, xmax) {
+    // decimated data sets are fetched again at the resolution of the zoomed-in range, not supported for arrays of data sets
+    if (this.plotWindowCB == null || this.model.shape != null) return;
+    let plot = this.plot;
+    for (let j=0;j<this._plotted.length;j++) {
+      let id = this._plotted[j][0];
+      let plotdata = this._plotted[j][1];
+      if (!plotdata.lod) continue;
+      let win = { "w" : this.w, "h" : this.h, "xmin" : xmin, "xmax" : xmax };
+      this.plotWindowCB(id, win, function(pd) {
+        if (pd == null || this.plot !== plot) return;
+        pd.title = '';
+        pd.w = this.w;
+        pd.h = this.h;
+        plot.replacePlot(j, pd);
+      }.bind(this));
+    }
+  }
+
   // IdxEdtWindow section
   _push_tarea_value() {
     // push current value to text area
@@ -774,7 +798,7 @@ class SubWindowHandler {
         wname, xpos, ypos));
     }
   }
-  newIdxEdtWindow(xpos, ypos, node_dataCB, clickPlotCB, node=null) {
+  newIdxEdtWindow(xpos, ypos, node_dataCB, clickPlotCB, node=null, plotWindowCB=null) {
     let wname = "window_" + String(this.idx++);
 
     let w = new IdxEditWindow(
@@ -783,7 +807,7 @@ class SubWindowHandler {
       this._pwDragCB.bind(this),
       this._closePltWindowCleanup.bind(this),
       clickPlotCB,
-      wname, xpos, ypos);
+      wname, xpos, ypos, null, plotWindowCB);
     this.plotWindows.push(w)
 
     if (node != null) {
@@ -30,10 +30,12 @@ urlpatterns = [
 
     url('^ajax_run_node/?$', views.ajax_run_node),
     url('^ajax_clear_data/?$', views.ajax_clear_data),
+    url('^ajax_plotwindow/?$', views.ajax_plotwindow),
     url('^ajax_update/?$', views.ajax_update),
     url('^ajax_save_session/?$', views.ajax_save_session),
     url('^ajax_load_session/?$', views.ajax_load_session),
     url('^ajax_revert_session/?$', views.ajax_revert_session),
+    url('^ajax_events/?$', views.ajax_events),
 
     url('^ajax_get_notes/?$', views.ajax_get_notes),
     url('^ajax_edt_notes/?$', views.ajax_edt_notes),
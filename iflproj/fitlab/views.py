@@ -6,15 +6,16 @@ import re
 
 from django.shortcuts import render, redirect
 from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
 from django.contrib.auth import authenticate, logout
 from django.contrib.auth import login as login_native
 from django.contrib.auth.decorators import login_required
-from django.utils import timezone
 from django.contrib.auth.models import User
 
 import enginterface
-from .models import GraphSession, GraphUiRequest, GraphReply, TabId
-from iflproj.settings import UI_COORDS_UPDATE_INTERVAL_MS, AJAX_REQ_TIMEOUT_S
+from .models import GraphSession, GraphSessionBlobs, GraphUiRequest, TabId
+from . import broker
+from iflproj.settings import UI_COORDS_UPDATE_INTERVAL_MS, AJAX_REQ_TIMEOUT_S, WRK_BROKER_SOCKET, EVENT_POLL_TIMEOUT_S
 
 
 def index(req):
@@ -178,7 +179,7 @@ def extractlogfrom_session(req, gs_id):
 
     _command(req, "extract_log", validate=False, gs_id=gs_id)
     obj = GraphSession.objects.filter(id=gs_id)[0]
-    return HttpResponse("<pre>%s%s</pre>" % (obj.logheader, obj.loglines))
+    return HttpResponse("<pre>%s%s</pre>" % (obj.logheader, GraphSessionBlobs.load(gs_id, 'loglines')))
 
 def sysmon(req):
     for (_, _, sysmonfiles) in os.walk("logs/sysmon/"):
@@ -226,28 +227,28 @@ def ajax_dashboard_edt_excomment(req):
 #    Utility / Privates    #
 ############################
 
-def _tabvalidation(req):
-    gs_id = req.POST.get("gs_id")
-    tab_id = req.POST.get("tab_id")
+def _tabvalidation(req, params=None):
+    if params == None:
+        params = req.POST
+    gs_id = params.get("gs_id")
+    tab_id = params.get("tab_id")
     print("tab validate: %s, %s" % (gs_id, tab_id))
-    # check for existence
-    tablst = TabId.objects.filter(gs_id=gs_id, id=tab_id)
-    if len(tablst) == 0:
-        return False
-    tab = tablst[0]
-    # check for newer
-    for other in TabId.objects.filter(gs_id=gs_id).exclude(id=tab_id):
-        if other.created > tab.created:
-            print("deleting tab, gs_id: %s, tab_id: %s" % (gs_id, tab.id))
-            tab.delete()
-            return False
-    # positive match
-    return True
+    # the worker broker caches tab ownership, TabId is only queried for tabs it does not know,
+    # e.g. after a worker restart, or if the worker is unavailable
+    valid, touch = broker.tab_validate(WRK_BROKER_SOCKET, gs_id, tab_id)
+    if valid == None:
+        valid = TabId.is_owner(gs_id, tab_id)
+        if valid:
+            broker.tab_add(WRK_BROKER_SOCKET, gs_id, tab_id)
+            touch = True
+    if touch:
+        TabId.touch(tab_id)
+    return valid
 
 def _tabcreate(gs_id):
-    ntab = TabId()
-    ntab.gs_id = gs_id
-    ntab.save()
+    TabId.purge(broker.TAB_TTL_S)
+    ntab = TabId.objects.create(gs_id=gs_id)
+    broker.tab_add(WRK_BROKER_SOCKET, gs_id, ntab.id)
     print("tab create: %s, %s" % (gs_id, ntab.id))
     return ntab.id
 
@@ -255,12 +256,11 @@ def _tabtakeover(req):
     gs_id = req.POST.get("gs_id")
     tab_id = req.POST.get("tab_id")
     print("tab id takeover")
-    # delete all tabs of this session
-    for sometab in TabId.objects.filter(gs_id=gs_id).exclude(id=tab_id):
-        print("takeover deleting tab, gs_id: %s, tab_id: %s" % (sometab.gs_id, sometab.id))
-        sometab.delete()
+    # drop all other tabs of this session
+    TabId.takeover(gs_id, tab_id)
+    broker.tab_takeover(WRK_BROKER_SOCKET, gs_id, tab_id)
 
-def _command(req, cmd, nowait=False, validate=True, gs_id="", username=""):
+def _command(req, cmd, nowait=False, validate=True, gs_id="", username="", gzip_ok=False):
     '''
     Ajax command funnel, blocking with timeout.
 
@@ -276,31 +276,39 @@ def _command(req, cmd, nowait=False, validate=True, gs_id="", username=""):
     gs_id = req.POST.get("gs_id", gs_id)
     tab_id = req.POST.get("tab_id", "")
     syncset = req.POST.get("data_str", None)
+    idem_key = req.POST.get("idem_key", "")[:64]
 
     print('ajax "%s" for user: %s, gs_id: %s, tab_id: %s' % (cmd, username, gs_id, tab_id))    
 
     # file the request
-    uireq = GraphUiRequest(username=username, gs_id=gs_id, cmd=cmd, syncset=syncset)
+    uireq = GraphUiRequest(username=username, gs_id=gs_id, cmd=cmd, syncset=syncset, idem_key=idem_key)
     uireq.save()
 
     if nowait:
         print("command nowait")
         return None, None
 
-    # poll db
+    # take the reply from the worker's in-memory store as soon as it is there
     t = time.time()
+    reachable = False
     while True:
-        lst = GraphReply.objects.filter(reqid=uireq.id)
-        if len(lst) == 1:
-            answer = lst[0].reply_json
-            error = lst[0].reply_error
-            lst[0].delete()
+        remaining = AJAX_REQ_TIMEOUT_S - (time.time() - t) if AJAX_REQ_TIMEOUT_S > 0 else 60
+        reply = broker.take_reply(WRK_BROKER_SOCKET, uireq.id, max(remaining, 0))
+        if reply:
+            reply_json, reply_gz = reply
+            # compressed replies are passed on as is if the caller can forward them
+            if gzip_ok and reply_gz is not None:
+                answer = reply_gz
+            else:
+                answer = broker.reply_text(reply_json, reply_gz)
             # success
             print("command success")
-            return answer, error
-        if len(lst) > 1:
-            raise Exception("more than one reply for single request")
-        time.sleep(0.1)
+            return answer, None
+        if reply is None:
+            # broker unreachable, the worker is not (yet) running
+            time.sleep(0.5)
+        else:
+            reachable = True
         elapsed = time.time() - t
 
         # timeout
@@ -309,12 +317,27 @@ def _command(req, cmd, nowait=False, validate=True, gs_id="", username=""):
             lst = GraphUiRequest.objects.filter(id=uireq.id)
             if len(lst)==1:
                 lst[0].delete()
+            if not reachable:
+                print("command timeout, worker unavailable")
+                return None, '{"timeout" : "worker unavailable, please try again later" }'
             print("command timeout")
             return None, '{"timeout" : "session request timed out" }'
 
+_re_accepts_gzip = re.compile(r'\bgzip\b')
+
+def _accepts_gzip(req):
+    return bool(_re_accepts_gzip.search(req.META.get('HTTP_ACCEPT_ENCODING', '')))
+
 def _reply(reply_json_str, error_json_str):
+    ''' reply_json_str may be the gzip compressed bytes of a reply, obtained via _command(gzip_ok=True) '''
     if error_json_str:
         return HttpResponse(error_json_str)
+    if isinstance(reply_json_str, bytes):
+        response = HttpResponse(reply_json_str)
+        response['Content-Encoding'] = 'gzip'
+        response['Content-Length'] = str(len(reply_json_str))
+        patch_vary_headers(response, ('Accept-Encoding', ))
+        return response
     return HttpResponse(reply_json_str)
 
 ###############################
@@ -323,7 +346,7 @@ def _reply(reply_json_str, error_json_str):
 
 @login_required
 def ajax_load_session(req):
-    rep, err = _command(req, "load")
+    rep, err = _command(req, "load", gzip_ok=_accepts_gzip(req))
     # transfer validation to this tab, if load call was successful
     if rep != None:
         _tabtakeover(req)
@@ -331,17 +354,22 @@ def ajax_load_session(req):
 
 @login_required
 def ajax_save_session(req):
-    rep, err = _command(req, "save")
+    rep, err = _command(req, "save", gzip_ok=_accepts_gzip(req))
     return _reply(rep, err)
 
 @login_required
 def ajax_run_node(req):
-    rep, err = _command(req, "update_run")
+    rep, err = _command(req, "update_run", gzip_ok=_accepts_gzip(req))
     return _reply(rep, err)
 
 @login_required
 def ajax_clear_data(req):
-    rep, err = _command(req, "clear_data")
+    rep, err = _command(req, "clear_data", gzip_ok=_accepts_gzip(req))
+    return _reply(rep, err)
+
+@login_required
+def ajax_plotwindow(req):
+    rep, err = _command(req, "plotwindow", gzip_ok=_accepts_gzip(req))
     return _reply(rep, err)
 
 @login_required
@@ -359,9 +387,33 @@ def ajax_update(req):
 
 @login_required
 def ajax_revert_session(req):
-    rep, err = _command(req, "revert")
+    rep, err = _command(req, "revert", gzip_ok=_accepts_gzip(req))
     return _reply(rep, err)
 
+@login_required
+def ajax_events(req):
+    '''
+    Short long-poll of the "started", "finished" and intermediate "dataupdate" events of a run, identified by its idem_key, of a
+    gs_id/tab_id. Returns on the first events after sequence number "after", or after EVENT_POLL_TIMEOUT_S,
+    so that a web process is never held for long. Clients poll again, from "last", while the run is in flight.
+    '''
+    if not _tabvalidation(req):
+        return HttpResponse('{"fatalerror" : "Session ownership was taken over by another window."}')
+    gs_id = req.POST["gs_id"]
+    try:
+        obj = json.loads(req.POST.get("data_str", "{}"))
+        run = str(obj["run"])[:64]
+        after = int(obj.get("after", 0))
+    except (ValueError, KeyError, TypeError):
+        return HttpResponse('{"message" : "invalid event poll"}', status=400)
+
+    ans = broker.get_events(WRK_BROKER_SOCKET, gs_id, run, after, EVENT_POLL_TIMEOUT_S)
+    if ans == None:
+        # worker is down, the run reply will report it
+        ans = [], after
+    events, last = ans
+    return HttpResponse(json.dumps({ "events" : events, "last" : last }))
+
 @login_required
 def ajax_get_notes(req):
     dbobj = None
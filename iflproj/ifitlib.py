@@ -23,9 +23,11 @@ from importlib.abc import _register
 __author__ = "Jakob Garde"
 
 import enginterface
-from iflproj.settings import IFIT_DIR
+import metrics
+import cmdjournal
+from iflproj.settings import IFIT_DIR, MATLAB_NUM_ENGINES, MATLAB_FIT_PARFOR
 
-import scipy.misc
+from PIL import Image
 import io
 import base64
 import matlab.engine
@@ -39,36 +41,321 @@ import collections
 import uuid
 import datetime
 import threading
+import warnings
+import time
+from contextlib import contextmanager
+
+_m_evals = metrics.registry.counter('ifl_matlab_evals_total', 'MATLAB engine eval calls.', ('status', ))
+_m_eval_seconds = metrics.registry.histogram('ifl_matlab_eval_seconds', 'MATLAB engine eval duration.')
+_m_buffered = metrics.registry.counter('ifl_matlab_buffered_statements_total', 'No-output statements evaluated as part of a command buffer flush.')
+
+_cmdjournal = None
+
+class _EngineSlot:
+    ''' one matlab engine, started on first use, and the state scoped to its workspace '''
+    def __init__(self, idx):
+        self.idx = idx
+        self.eng = None
+        self.lock = threading.Lock() # serializes evals on this engine
+        self.exe_lock = threading.Lock() # see _VarnameMiddleware.execute_through_proxy
+        self.tmp_symbols = set() # see _register_tmp_symb
+        self.symbols = _SymbolTable()
+        self.bound = 0 # number of sessions bound to this engine
+
+# clears of released symbols are queued and evaluated as one statement, see _flush_clears
+CLEAR_BATCH_SIZE = 64
+
+class _SymbolTable:
+    ''' the live symbols of an engine workspace, and those released but not yet cleared '''
+    def __init__(self):
+        self.live = set()
+        self.pending = collections.OrderedDict() # symbol -> dontlog
+        self.lock = threading.RLock() # __del__ may release symbols at any point, also on a thread already holding the lock
+    def add(self, symb):
+        with self.lock:
+            self.live.add(symb)
+            self.pending.pop(symb, None)
+    def release(self, symb, dontlog=False):
+        ''' queues the clear of symb if it is live, returns the number of queued clears '''
+        with self.lock:
+            if symb in self.live:
+                self.live.remove(symb)
+                self.pending[symb] = dontlog
+            return len(self.pending)
+    def take(self):
+        with self.lock:
+            pending = self.pending
+            self.pending = collections.OrderedDict()
+            return pending
+
+class _EnginePool:
+    ''' a fixed number of engines, sessions are bound to the least used one for their lifetime '''
+    def __init__(self, size):
+        self.slots = [_EngineSlot(i) for i in range(max(1, size))]
+        self.lock = threading.Lock()
+    def slot(self, idx):
+        return self.slots[idx % len(self.slots)]
+    def bind(self, idx=None):
+        ''' binds a session to engine idx, or the least used engine, returns its index '''
+        with self.lock:
+            if idx is None:
+                slot = min(self.slots, key=lambda s: s.bound)
+            else:
+                slot = self.slot(idx)
+            slot.bound += 1
+            return slot.idx
+    def unbind(self, idx):
+        with self.lock:
+            slot = self.slot(idx)
+            slot.bound = max(0, slot.bound - 1)
+    def started(self):
+        return [s for s in self.slots if s.eng]
+
+_pool = _EnginePool(MATLAB_NUM_ENGINES)
+
+# the engine used by _eval on this thread, engine 0 unless selected using _using_engine
+_engine_ctx = threading.local()
+
+def _current_engine():
+    return getattr(_engine_ctx, 'idx', 0)
+
+@contextmanager
+def _using_engine(idx):
+    ''' selects engine idx for _eval calls on this thread, statements buffered for the previous engine are flushed first '''
+    prev = _current_engine()
+    if prev != idx:
+        _flush_cmdbuffer()
+    _engine_ctx.idx = idx
+    try:
+        yield
+    finally:
+        if prev != idx:
+            _flush_cmdbuffer()
+        _engine_ctx.idx = prev
 
-_eng = None
-_cmdlog = None
-def _eval(cmd, nargout=1, dontlog=False):
-    global _loglock
-    global _eng
-    global _cmdlog
-    with _loglock:
-        if not _cmdlog:
-            _cmdlog = logging.getLogger('cmds')
-            hdlr = logging.FileHandler('logs/cmds.log')
-            hdlr.level = logging.INFO
-            hdlr.setFormatter(logging.Formatter('%(message)s'))
-            _cmdlog.addHandler(hdlr) 
-
-            _cmdlog.info("")
-            _cmdlog.info("")
-            _cmdlog.info("%%  starting ifit cmd log session at %s  %%" % '{0:%Y%m%d_%H%M%S}'.format(datetime.datetime.now()))
-        if not _eng:
-            _eng = matlab.engine.start_matlab(' -nodesktop -nosplash')
-            _eng.eval("addpath(genpath('%s'))" % IFIT_DIR)
-        if not dontlog:
-            _cmdlog.info(cmd)
-        return _eng.eval(cmd, nargout=nargout)
+def _eval(cmd, nargout=1, dontlog=False, immediate=False, cleanup=False):
+    '''
+    evaluates cmd, no-output statements are deferred while a command buffer is open on this thread, see _cmdbuffer
+    immediate: evaluate a no-output statement now, e.g. because its exception is expected
+    cleanup: a buffered statement which is evaluated even if an earlier statement of its buffer fails, e.g. a tmp clear
+    '''
+    if getattr(_cmdtrace, 'stmts', None) is not None:
+        if nargout != 0 or immediate:
+            raise _NotTraceable()
+        _cmdtrace.stmts.append(cmd)
+        return None
+    if nargout == 0 and not immediate and getattr(_cmdbuf, 'depth', 0) > 0:
+        _cmdbuf.stmts.append((cmd, dontlog, cleanup))
+        return None
+    _flush_cmdbuffer()
+    return _eval_engine(cmd, nargout, dontlog)
+
+def _log_cmd(cmd, dontlog, loglines=None):
+    ''' loglines: log these lines instead of cmd '''
+    if loglines is None:
+        loglines = [] if dontlog else [cmd]
+    if len(loglines) > 0:
+        _get_cmdjournal().append(loglines)
+
+def _start_engine(slot):
+    ''' starts the engine of slot on first use, the caller holds slot.lock '''
+    if not slot.eng:
+        slot.eng = matlab.engine.start_matlab(' -nodesktop -nosplash')
+        slot.eng.eval("addpath(genpath('%s'))" % IFIT_DIR)
+
+def _eval_engine(cmd, nargout, dontlog, loglines=None):
+    ''' loglines: log these lines instead of cmd '''
+    _log_cmd(cmd, dontlog, loglines)
+    slot = _pool.slot(_current_engine())
+    with slot.lock:
+        _start_engine(slot)
+        status = "error"
+        try:
+            with _m_eval_seconds.time():
+                ans = slot.eng.eval(cmd, nargout=nargout)
+            status = "ok"
+            return ans
+        finally:
+            _m_evals.inc(status=status)
+
+# asynchronous evaluation, the engine runs the statements of one engine in the order they were submitted
+EVAL_PIPELINE_DEPTH = 8
+
+class _EvalFuture:
+    ''' an _eval_async in flight, result() blocks until it is done and raises its exception, if any '''
+    def __init__(self, future, t):
+        self.future = future
+        self.t = t
+        self.collected = False
+    def done(self):
+        return self.future.done()
+    def result(self):
+        status = "error"
+        try:
+            ans = self.future.result()
+            status = "ok"
+            return ans
+        finally:
+            if not self.collected:
+                self.collected = True
+                _m_eval_seconds.observe(time.time() - self.t)
+                _m_evals.inc(status=status)
+
+def _eval_async(cmd, nargout=1, dontlog=False):
+    '''
+    submits cmd to the engine of this thread without waiting for it, returns an _EvalFuture. Buffered
+    statements are flushed first, so that statements are evaluated in the order they were issued.
+    '''
+    if getattr(_cmdtrace, 'stmts', None) is not None:
+        raise _NotTraceable()
+    _flush_cmdbuffer()
+    _log_cmd(cmd, dontlog)
+    slot = _pool.slot(_current_engine())
+    with slot.lock:
+        _start_engine(slot)
+        t = time.time()
+        try:
+            return _EvalFuture(slot.eng.eval(cmd, nargout=nargout, background=True), t)
+        except:
+            _m_evals.inc(status="error")
+            raise
+
+def _pipelined(items, submit, collect, depth=EVAL_PIPELINE_DEPTH):
+    '''
+    calls submit(item), which issues _eval_async calls, up to depth items ahead of collect(item, submitted),
+    which waits for them, so that python-side work on one item overlaps the evaluation of the next ones.
+    Returns the collect return values, in the order of items.
+    '''
+    inflight = collections.deque()
+    ans = []
+    for item in items:
+        inflight.append((item, submit(item)))
+        if len(inflight) >= depth:
+            ans.append(collect(*inflight.popleft()))
+    while inflight:
+        ans.append(collect(*inflight.popleft()))
+    return ans
+
+# command buffer, accumulating no-output statements to be evaluated as one
+_cmdbuf = threading.local()
+_re_batch_error = re.compile(r"ifl_batch_stmt (\d+): (.*)", re.DOTALL)
+
+class _BufferedEvalError(Exception):
+    ''' a statement of a flushed command buffer failed, the statements after it were not evaluated '''
+    def __init__(self, statement, message):
+        super().__init__("%s (statement: %s)" % (message, statement))
+        self.statement = statement
+
+@contextmanager
+def _cmdbuffer():
+    '''
+    Opens a command buffer on this thread. Until it is closed, _eval(nargout=0) statements are
+    accumulated rather than evaluated, and flushed as a single engine eval when an output is needed
+    or the outermost buffer closes. Errors are raised at flush time, so code which relies on an
+    immediate exception from a no-output statement must not run inside a buffer.
+    '''
+    if getattr(_cmdbuf, 'depth', 0) == 0:
+        _cmdbuf.depth = 0
+        _cmdbuf.stmts = []
+    _cmdbuf.depth += 1
+    try:
+        yield
+    finally:
+        _cmdbuf.depth -= 1
+        if _cmdbuf.depth == 0:
+            _flush_cmdbuffer()
+
+def _flush_cmdbuffer():
+    ''' evaluates the statements buffered on this thread as one eval, a failing statement is identified by its _BufferedEvalError '''
+    stmts = getattr(_cmdbuf, 'stmts', None)
+    if not stmts:
+        return
+    _cmdbuf.stmts = []
+    if len(stmts) == 1:
+        cmd, dontlog, cleanup = stmts[0]
+        _eval_engine(cmd, 0, dontlog)
+        return
+
+    # each statement reports its index on failure, which stops the batch
+    lines = []
+    for i in range(len(stmts)):
+        cmd = stmts[i][0].strip()
+        if not cmd.endswith((';', ',')):
+            cmd = cmd + ';'
+        lines.append("try, %s catch, error('ifl:batch', 'ifl_batch_stmt %d: %%s', lasterr), end" % (cmd, i))
+    loglines = [cmd for (cmd, dontlog, cleanup) in stmts if not dontlog]
+    _m_buffered.inc(len(stmts))
+    try:
+        _eval_engine("\n".join(lines), 0, True, loglines=loglines)
+    except Exception as e:
+        m = _re_batch_error.search(str(e))
+        if not m:
+            raise
+        failed = int(m.group(1))
+        # the cleanups skipped by the failure are run anyway, their own errors are secondary
+        cleanups = [cmd.strip().rstrip(';,') + ';' for (cmd, dontlog, cleanup) in stmts[failed+1:] if cleanup]
+        if len(cleanups) > 0:
+            try:
+                _eval_engine(" ".join(["try, %s catch, end" % cmd for cmd in cleanups]), 0, True)
+            except Exception as ce:
+                logging.error("buffered cleanup failed: %s" % str(ce))
+        raise _BufferedEvalError(stmts[failed][0], m.group(2).strip())
+
+# statement tracing, used to turn an atomic function into a matlab-side loop body
+_cmdtrace = threading.local()
+
+class _NotTraceable(Exception):
+    ''' the traced function needs an output or an immediate evaluation '''
+    pass
+
+class _TracedNumber(str):
+    ''' the matlab expression, e.g. a(k), standing in for a per-element number while tracing '''
+    pass
+
+def _num(value, fmt="%g"):
+    ''' formats number value for a matlab statement, raises on non-numbers, traced numbers are passed through '''
+    if isinstance(value, _TracedNumber):
+        return value
+    return fmt % float(value)
+
+def _trace_statements(func, *args):
+    ''' calls func, recording its no-output statements instead of evaluating them, returns the statements or None if func is not traceable '''
+    _cmdtrace.stmts = []
+    try:
+        func(*args)
+        return _cmdtrace.stmts
+    except Exception:
+        return None
+    finally:
+        _cmdtrace.stmts = None
+
+def _release_symb(symb, dontlog=False, engine_idx=None, flush=True):
+    '''
+    queues the clear of symb on engine_idx, by default the engine of this thread. The queue is flushed if it has
+    grown to CLEAR_BATCH_SIZE, unless flush is False, which __del__ methods must use since they can not evaluate.
+    '''
+    if engine_idx is None:
+        engine_idx = _current_engine()
+    if _pool.slot(engine_idx).symbols.release(symb, dontlog) >= CLEAR_BATCH_SIZE and flush:
+        with _using_engine(engine_idx):
+            _flush_clears()
+
+def _flush_clears():
+    ''' clears the released symbols of the engine of this thread as one statement, logged as one clear per symbol '''
+    if getattr(_cmdtrace, 'stmts', None) is not None:
+        return
+    pending = _pool.slot(_current_engine()).symbols.take()
+    if not pending:
+        return
+    _flush_cmdbuffer()
+    loglines = ["clear %s;" % vn for vn in pending if not pending[vn]]
+    _eval_engine("clear %s;" % " ".join(pending), 0, True, loglines=loglines)
 
 # since all ML variables should be created using these proxy methods, we can register all ML symbols easily
-_all_exe_lock_symbols = set();
 def _register_tmp_symb(symb):
-    global _all_exe_lock_symbols
-    _all_exe_lock_symbols.add(symb)
+    slot = _pool.slot(_current_engine())
+    slot.tmp_symbols.add(symb)
+    slot.symbols.add(symb)
     return symb
 def _get_ifunc_uuid():
     return _register_tmp_symb('ifunc_%s' % uuid.uuid4().hex)
@@ -77,41 +364,41 @@ def _get_idata_uuid():
 def _get_anonymous_uuid():
     return _register_tmp_symb('_%s' % uuid.uuid4().hex)
 
-# log lines are registered on-demand
+# log lines are journaled by varname, and extracted on-demand
 _loglock = threading.Lock()
-def _extract_loglines(varnames):
-    ''' extracts lines with any string in varnames from logs/cmds.log, deleting these lines in the source '''
-    source = 'logs/cmds.log'
+def _get_cmdjournal():
+    global _cmdjournal
     with _loglock:
-        # work through the log, extracting lines appropriate for [varnames] to return, hereby reducing its size
-        with open(source, 'r') as srcfile:
-            regex_lst = [re.compile(vn) for vn in varnames] # compile the regex's of each varname, these are used for every line
-            cmds_left = []
-            cmds_right = []
-            for line in srcfile:
-                if True in [r.search(line)!=None for r in regex_lst]:
-                    cmds_right.append(line)
-                else:
-                    cmds_left.append(line)
-
-        # replace source with filtered "left" lines (without ruining the file pointer used by logging)
-        with open(source, 'w') as srcfile:
-            srcfile.write("".join(cmds_left))
-            srcfile.close()
-
-        # return the "right" lines
-        return cmds_right
-
-# middlware keeps session-management out of this module, although locks must be used instead, with a modest multi-user performance hit 
-_hl_exe_lock = threading.Lock()
+        if not _cmdjournal:
+            _cmdjournal = cmdjournal.Journal('logs/cmds.sqlite3')
+        return _cmdjournal
+
+def _extract_loglines(varnames):
+    ''' extracts the lines mentioning any of varnames from the command journal, deleting them there, evaluation is not blocked '''
+    return _get_cmdjournal().extract(varnames)
+
+# middlware keeps session-management out of this module, each instance is bound to one engine of the pool, whose workspace holds its variables
 class _VarnameMiddleware(enginterface.MiddleWare):
     ''' implements registration and deregistration of varnames, clears matlab variables on deregister and exit '''
     def __init__(self):
         self.varnames = set()
         self.varnames_tmp = set()
+        self.engine_idx = _pool.bind()
+        self.unbound = False
+    def __setstate__(self, state):
+        ''' unpickled sessions keep their engine, since their saved variables are loaded into it '''
+        self.__dict__.update(state)
+        self.engine_idx = _pool.bind(state.get('engine_idx', 0))
+        self.unbound = False
+    def scope(self):
+        return _using_engine(self.engine_idx)
     def totalwho(self):
-        ''' returns all variables in the (global) matlab session '''
-        return _eval("who;", nargout=1, dontlog=True)
+        ''' returns all variables in the matlab sessions of all started engines '''
+        who = []
+        for slot in _pool.started():
+            with _using_engine(slot.idx):
+                who = who + list(_eval("who;", nargout=1, dontlog=True))
+        return who
     def register(self, obj):
         ''' remembers the varname for logging and session shutdown purposes '''
         if type(obj) in (IData, IFunc, ):
@@ -121,49 +408,80 @@ class _VarnameMiddleware(enginterface.MiddleWare):
         if type(obj) in (IData, IFunc, ) and obj.varname in self.varnames:
             self.varnames.remove(obj.varname)
             self.varnames_tmp.add(obj.varname)
-            _eval("clear %s;" % obj.varname, nargout=0) # we need to log this clear, which represents a permanent departure for this object
+            # we need to log this clear, which represents a permanent departure for this object
+            _release_symb(obj.varname, engine_idx=self.engine_idx)
     def load(self, filepath):
-        _eval("load('%s');" % filepath, nargout=0, dontlog=True)
+        with _using_engine(self.engine_idx):
+            _eval("load('%s');" % filepath, nargout=0, dontlog=True)
+            symbols = _pool.slot(self.engine_idx).symbols
+            for vn in self.varnames:
+                symbols.add(vn)
     def save(self, filepath):
-        # filter possibly outdated varnames using who
-        allvars = _eval("who;", nargout=1, dontlog=True)
-        # ensure only currently loaded vars are registered
-        self.varnames = set([v for v in allvars if v in self.varnames])
-        save_str = "'" + "', '".join(self.varnames) + "'"
-        _eval("save('%s', %s);" % (filepath, save_str), nargout=0, dontlog=True)
-    def clear(self):
-        for vn in self.varnames:
-            # some varnames may have been cleared previously, for ex. if their anchor was not on the graph
+        with _using_engine(self.engine_idx):
+            # filter possibly outdated varnames using who
+            allvars = _eval("who;", nargout=1, dontlog=True)
+            # ensure only currently loaded vars are registered
+            self.varnames = set([v for v in allvars if v in self.varnames])
+            save_str = "'" + "', '".join(self.varnames) + "'"
+            _eval("save('%s', %s);" % (filepath, save_str), nargout=0, dontlog=True)
+    def save_deferred(self, filepath):
+        ''' snapshots the registered varnames into a (copy-on-write) struct, returns a function which saves and clears that snapshot '''
+        engine_idx = self.engine_idx
+        with _using_engine(engine_idx):
+            allvars = _eval("who;", nargout=1, dontlog=True)
+            self.varnames = set([v for v in allvars if v in self.varnames])
+            snap = 'snap_%s' % uuid.uuid4().hex
+            fields = ", ".join(["'%s', {%s}" % (vn, vn) for vn in self.varnames])
+            _eval("%s = struct(%s);" % (snap, fields), nargout=0, dontlog=True)
+        def save_snapshot():
+            with _using_engine(engine_idx):
+                try:
+                    _eval("save('%s', '-struct', '%s');" % (filepath, snap), nargout=0, dontlog=True)
+                finally:
+                    _eval("clear %s;" % snap, nargout=0, dontlog=True)
+        return save_snapshot
+    def get_footprint(self):
+        ''' returns the summed matlab byte count of all registered varnames, using whos '''
+        if len(self.varnames) == 0:
+            return 0
+        vn = 'whos_%s' % uuid.uuid4().hex
+        with _using_engine(self.engine_idx):
             try:
-                # do not log varname clears, since symbols can be used again after a session load
+                _eval("%s = whos(%s);" % (vn, "'" + "', '".join(self.varnames) + "'"), nargout=0, dontlog=True)
+                return int(_eval("sum([%s.bytes]);" % vn, nargout=1, dontlog=True))
+            finally:
                 _eval("clear %s;" % vn, nargout=0, dontlog=True)
-            except:
-                pass
+    def clear(self):
+        with _using_engine(self.engine_idx):
+            for vn in self.varnames:
+                # do not log varname clears, since symbols can be used again after a session load
+                _release_symb(vn, dontlog=True, flush=False)
+            _flush_clears()
         self.varnames = set()
     def finalise(self):
         self.clear()
+        if not self.unbound:
+            _pool.unbind(self.engine_idx)
+            self.unbound = True
     def extract_loglines(self):
         return _extract_loglines(self.varnames | self.varnames_tmp)
     def get_logheader(self):
         text = "%%\n" + '%%  log generated on {0:%Y%m%d_%H%M%S}'.format(datetime.datetime.now()) + "\n%%\n%%  required:\n%%    addpath(genpath(YOUR_IFIT_LOCATION))\n%%\n%%  varnames:\n%%    " + "\n%%    ".join(self.varnames) + "\n%%\n"
         return text
     def execute_through_proxy(self, func):
-        ''' executing in this way allows for limiting the use of the "high level execution lock" to this method only '''
-        with _hl_exe_lock:
+        ''' executing in this way allows for limiting the use of the per-engine "high level execution lock" to this method only '''
+        slot = _pool.slot(self.engine_idx)
+        with slot.exe_lock, _using_engine(self.engine_idx):
             ans = func()
             self.register(ans)
 
             # house cleaning
-            global _all_exe_lock_symbols
-            to_be_cleared = _all_exe_lock_symbols - self.varnames # set between used and known symbols
+            to_be_cleared = slot.tmp_symbols - self.varnames # set between used and known symbols
             self.varnames_tmp = self.varnames_tmp | to_be_cleared # remember what was cleared for log extraction later on
             for vn in to_be_cleared:
-                # some tmp varnames may have already been cleared locally
-                try:
-                    _eval("clear %s;" % vn, nargout=0)
-                except:
-                    pass
-            _all_exe_lock_symbols = set()
+                _release_symb(vn, flush=False)
+            slot.tmp_symbols = set()
+            _flush_clears()
             return ans
 
 def _load_middleware():
@@ -214,7 +532,9 @@ class IData(enginterface.ObjReprJson):
     ''' Creates an IData object using data file located at url. '''
     def __init__(self, url, datashape=None):
         logging.debug("IData.__init__('%s')" % url)
+        self._engine_idx = _current_engine()
         self.varname = _get_idata_uuid()
+        self._datashape = None
 
         if url==None:
             '''
@@ -235,6 +555,9 @@ class IData(enginterface.ObjReprJson):
         
         def create_idata(vn, url):
             _eval("%s = iData('%s');" % (vn, url), nargout=0)
+            collapse_channels(vn, url)
+
+        def collapse_channels(vn, url):
             if os.path.splitext(url)[1] in ('.png', '.jpg'):
                 # Check if this is a color or monochrome image
                 ndims = int(_eval('ndims(%s);' % vn))
@@ -252,23 +575,38 @@ class IData(enginterface.ObjReprJson):
             url = np.array(url)
             self.url = url
             create_idata_array(self.varname, datashape)
-            vnargs = (self.varname, )
-            args = ()
-            ndaargs = (url, )
-            _vectorized(datashape, create_idata, vnargs, args, ndaargs)
+
+            # files are loaded independently, so the loads are pipelined
+            def submit(ndindex):
+                return _eval_async("%s%s = iData('%s');" % (self.varname, _ml_index(ndindex), url[ndindex]), nargout=0)
+            def collect(ndindex, loaded):
+                loaded.result()
+                collapse_channels(self.varname + _ml_index(ndindex), url[ndindex])
+            _pipelined(list(np.ndindex(datashape)), submit, collect)
         else:
             create_idata(self.varname, url)
+        self._set_datashape(datashape)
 
     def __del__(self):
-        _eval("clear %s;" % self.varname, nargout=0)
+        _release_symb(self.varname, engine_idx=getattr(self, '_engine_idx', 0), flush=False)
+
+    def _set_datashape(self, datashape):
+        ''' caches the datashape, which operations on this handle leave unchanged, None means unknown '''
+        self._datashape = datashape if datashape is None else _npify_shape(datashape)
 
     def _get_datashape(self):
+        ''' returns the cached datashape, which is probed from matlab once, after this handle has been assigned '''
+        datashape = getattr(self, '_datashape', None)
+        if datashape is not None:
+            return datashape
         try:
-            _eval("%s.Signal;" % self.varname, nargout=0)
+            _eval("%s.Signal;" % self.varname, nargout=0, immediate=True)
+            datashape = tuple()
         except:
             s = np.array(_eval("size(%s);" % self.varname, nargout=1)[0]).astype(int).tolist() # NOTE: tolist() converts to native python int from np.int64
-            return _npify_shape(s)
-        return tuple()
+            datashape = _npify_shape(s)
+        self._datashape = datashape
+        return datashape
 
     def get_repr(self):
         retdct = self._get_full_repr_dict()
@@ -280,24 +618,17 @@ class IData(enginterface.ObjReprJson):
             pltdct, infdct = _get_iData_repr(self.varname)
             outdct = None
         else:
-            def get_repr_atomic(symb):
-                pltdct, infdct = _get_iData_repr(symb)
-                return pltdct, infdct
-            def get_element(idx, e):
-                return e[idx]
-
-            vnargs = (self.varname, )
-            args = ()
-            ndaargs = ()
-            ndout = np.empty(datashape, object)
-            _vectcollect(datashape, get_repr_atomic, vnargs, args, ndaargs, ndout)
-
-            # this will extract the first element (of the ndout ndarray elements) into a similarly shaped ndarray
-            vnargs = ()
-            args = (0, )
-            ndaargs = (ndout, )
+            # element data is fetched ahead of the python-side plot processing of previous elements
+            def submit(ndindex):
+                return _get_iData_reprdata_async(self.varname + _ml_index(ndindex))
+            def collect(ndindex, fetched):
+                symb = self.varname + _ml_index(ndindex)
+                return _get_iData_repr(symb, reprdata=_collect_iData_reprdata(symb, fetched))[0]
+
+            ndindices = list(np.ndindex(datashape))
             plts = np.empty(datashape, object)
-            _vectcollect(datashape, get_element, vnargs, args, ndaargs, plts)
+            for ndindex, plt in zip(ndindices, _pipelined(ndindices, submit, collect)):
+                plts[ndindex] = plt
 
             pltdct = plts.tolist()
             outdct = None
@@ -309,18 +640,25 @@ class IData(enginterface.ObjReprJson):
 
         return retdct
 
+    def get_plotwindow_repr(self, window):
+        ''' plotdata of the given window, see _get_iData_repr, arrays of datasets are represented by get_repr only '''
+        if self._get_datashape() not in (None, tuple(),):
+            return None
+        return _get_iData_repr(self.varname, window)[0]
+
     def keep(self, low: float, high: float, axis: int=0):
         ''' Keeps data only within specified interval on given axis. (Signal=0, x=1, y=2).'''
         logging.debug("IData.keep")
 
         def keep_atomic(vn, axis, low, high):
             if axis==0:
-                _eval("%s(%s<%g)=%g;" % (vn, vn, low, low), nargout=0)
-                _eval("%s(%s>%g)=%g;" % (vn, vn, high, high), nargout=0)
+                low, high = _num(low), _num(high)
+                _eval("%s(%s<%s)=%s;" % (vn, vn, low, low), nargout=0)
+                _eval("%s(%s>%s)=%s;" % (vn, vn, high, high), nargout=0)
             elif axis==1:
-                _eval("%s = xlim(%s, [%g %g], 'include');" % (vn, vn, low, high), nargout=0)
+                _eval("%s = xlim(%s, [%s %s], 'include');" % (vn, vn, _num(low), _num(high)), nargout=0)
             elif axis==2:
-                _eval("%s = ylim(%s, [%g %g], 'include');" % (vn, vn, low, high), nargout=0)
+                _eval("%s = ylim(%s, [%s %s], 'include');" % (vn, vn, _num(low), _num(high)), nargout=0)
             else:
                 raise Exception("Keep only supported on axes 0,1,2")
 
@@ -331,13 +669,14 @@ class IData(enginterface.ObjReprJson):
         if np.shape(low) != shape or np.shape(high) != shape:
             raise Exception("shape mismatch, shape of min and max must match %s" % str(shape))
 
-        if len(shape) > 0:
-            vnargs = (self.varname, )
-            args = (axis,)
-            ndaargs = (low, high, )
-            _vectorized(shape, keep_atomic, vnargs, args, ndaargs)
-        else:
-            keep_atomic(self.varname, axis, low, high)
+        with _cmdbuffer():
+            if len(shape) > 0:
+                vnargs = (self.varname, )
+                args = (axis,)
+                ndaargs = (low, high, )
+                _vectorized(shape, keep_atomic, vnargs, args, ndaargs)
+            else:
+                keep_atomic(self.varname, axis, low, high)
 
     
     def mask(self, min: float, max: float):
@@ -348,7 +687,7 @@ class IData(enginterface.ObjReprJson):
         depth parameter (same as combine).
         '''
         def rmint_atomic(vn, start, end):
-            _eval("%s = xlim(%s, [%g %g], 'exclude');" % (vn, vn, start, end), nargout=0)
+            _eval("%s = xlim(%s, [%s %s], 'exclude');" % (vn, vn, _num(start), _num(end)), nargout=0)
 
         min = _ifregular_squeeze_cast(min)
         max = _ifregular_squeeze_cast(max)
@@ -357,13 +696,14 @@ class IData(enginterface.ObjReprJson):
         if np.shape(min) != shape or np.shape(max) != shape:
             raise Exception("shape mismatch, shape of min and max must match %s" % str(shape))
 
-        if len(shape) > 0:
-            vnargs = (self.varname, )
-            args = ()
-            ndaargs = (min, max, )
-            _vectorized(shape, rmint_atomic, vnargs, args, ndaargs)
-        else:
-            rmint_atomic(self.varname, min, max)
+        with _cmdbuffer():
+            if len(shape) > 0:
+                vnargs = (self.varname, )
+                args = ()
+                ndaargs = (min, max, )
+                _vectorized(shape, rmint_atomic, vnargs, args, ndaargs)
+            else:
+                rmint_atomic(self.varname, min, max)
 
     def rebin(self, nbins: int, axis: int=1):
         ''' Rebins using interpolate. '''
@@ -372,7 +712,7 @@ class IData(enginterface.ObjReprJson):
         def rebin_atomic(vn, ax, nb):
             
             # b = interp(a, new_axis) where new_axis=linspace(min(getaxis(a,axis)),max(getaxis(a,axis)),newbins) for axis=1, 2, ...
-            _eval("%s = interp(%s, linspace(min(getaxis(%s, %d)), max(getaxis(%s, %d)), %d));" % (vn, vn, vn, ax, vn, ax, nb), nargout=0)
+            _eval("%s = interp(%s, linspace(min(getaxis(%s, %d)), max(getaxis(%s, %d)), %s));" % (vn, vn, vn, ax, vn, ax, _num(nb, "%d")), nargout=0)
 
         nbins = _ifregular_squeeze_cast(nbins)
 
@@ -382,40 +722,128 @@ class IData(enginterface.ObjReprJson):
         if (type(axis) != int) and (axis > 0):
             raise Exception("axis must be a positive integer")
 
-        if len(shape) > 0:
-            vnargs = (self.varname, )
-            args = (axis, )
-            ndaargs = (nbins, )
-            _vectorized(shape, rebin_atomic, vnargs, args, ndaargs)
-        else:
-            rebin_atomic(self.varname, axis, nbins)
+        with _cmdbuffer():
+            if len(shape) > 0:
+                vnargs = (self.varname, )
+                args = (axis, )
+                ndaargs = (nbins, )
+                _vectorized(shape, rebin_atomic, vnargs, args, ndaargs)
+            else:
+                rebin_atomic(self.varname, axis, nbins)
 
 
-def _get_iData_repr(idata_symb):
-    
-    def trysquash(vals):
-        if len(vals)==1:
-            try:
-                vals = vals[0]
-            except:
-                pass
-        return vals
-    
-    ndims = int(_eval('ndims(%s);' % idata_symb))
-    axes_names = _eval('%s.Axes;' % idata_symb, nargout=1) # NOTE: len(axes_names) == ndims
-    if not ndims == len(axes_names):
+def _ml_ndarray(mlarr):
+    ''' converts an engine return value to a float ndarray, real matlab.double arrays are wrapped through the buffer interface, without copying '''
+    if isinstance(mlarr, matlab.double) and not getattr(mlarr, '_is_complex', False):
+        data = getattr(mlarr, '_data', None)
+        if data is not None:
+            return np.frombuffer(data, dtype=np.float64).reshape(mlarr.size, order='F')
+    return np.atleast_1d(np.asarray(mlarr, dtype=np.float64))
+
+def _reprdata_fields(idata_symb):
+    return "'ndims', ndims(%s), 'axes', {%s.Axes}, 'xlabel', xlabel(%s), 'ylabel', ylabel(%s), " % (idata_symb, idata_symb, idata_symb, idata_symb) + \
+        "'axesvals', {cellfun(@(a) %s.(a), %s.Axes, 'UniformOutput', false)}, 'signal', %s.Signal./%s.Monitor" % (idata_symb, idata_symb, idata_symb, idata_symb)
+
+def _get_iData_reprdata(idata_symb):
+    '''
+    returns a dict with everything _get_iData_repr needs, fetched as one matlab struct:
+    ndims, axes (names), xlabel, ylabel, axesvals, signal and error (both divided by the monitor, error may be None)
+    '''
+    fields = _reprdata_fields(idata_symb)
+    try:
+        st = _eval("struct(%s, 'error', %s.Error./%s.Monitor);" % (fields, idata_symb, idata_symb), nargout=1)
+    except:
+        # the error can not always be computed, see the fallback in _get_iData_repr
+        st = _eval("struct(%s, 'error', []);" % fields, nargout=1)
+    return _reprdata_from_struct(st)
+
+def _get_iData_reprdata_async(idata_symb):
+    ''' submits the fetch of _get_iData_reprdata, returns a future to be passed to _collect_iData_reprdata '''
+    return _eval_async("struct(%s, 'error', %s.Error./%s.Monitor);" % (_reprdata_fields(idata_symb), idata_symb, idata_symb), nargout=1)
+
+def _collect_iData_reprdata(idata_symb, fetched):
+    try:
+        st = fetched.result()
+    except:
+        st = _eval("struct(%s, 'error', []);" % _reprdata_fields(idata_symb), nargout=1)
+    return _reprdata_from_struct(st)
+
+def _reprdata_from_struct(st):
+    axes = st['axes']
+    if type(axes) == str:
+        axes = [axes]
+    axesvals = st['axesvals']
+    if not isinstance(axesvals, list):
+        axesvals = [axesvals]
+    error = _ml_ndarray(st['error'])
+    return {
+        'ndims' : int(st['ndims']),
+        'axes' : list(axes),
+        'xlabel' : st['xlabel'],
+        'ylabel' : st['ylabel'],
+        'axesvals' : [_ml_ndarray(v) for v in axesvals],
+        'signal' : _ml_ndarray(st['signal']),
+        'error' : error if error.size > 0 else None,
+    }
+
+# level of detail, plot payloads are decimated to the size of the largest plot window
+PLOT_LOD_WIDTH_PX = 900
+PLOT_LOD_HEIGHT_PX = 600
+
+def _lod_1d(x, y, yerr, width):
+    '''
+    min/max preserving bucket decimation to at most about 2*width points, keeping the first and last points,
+    returns x, y, yerr and whether decimation took place
+    '''
+    n = len(y)
+    width = max(int(width), 1)
+    if n <= 2*width:
+        return x, y, yerr, False
+    k = n // width
+    m = width*k
+    yb = y[:m].reshape((width, k))
+    base = np.arange(width)*k
+    keep = [base + np.argmin(yb, axis=1), base + np.argmax(yb, axis=1), [0, n-1]]
+    if m < n:
+        keep.append([m + np.argmin(y[m:]), m + np.argmax(y[m:])])
+    idx = np.unique(np.concatenate(keep))
+    return x[idx], y[idx], yerr[idx], True
+
+def _lod_2d(signal, width, height):
+    ''' area-averaged downsampling of signal by integer factors until it fits width x height, returns signal and whether it was downsampled '''
+    rows, cols = signal.shape
+    fy = max(int(math.ceil(rows/max(int(height), 1))), 1)
+    fx = max(int(math.ceil(cols/max(int(width), 1))), 1)
+    if fy == 1 and fx == 1:
+        return signal, False
+    padded = np.full((int(math.ceil(rows/fy))*fy, int(math.ceil(cols/fx))*fx), np.nan)
+    padded[:rows, :cols] = signal
+    blocks = padded.reshape((padded.shape[0]//fy, fy, padded.shape[1]//fx, fx))
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning) # all-nan blocks average to nan
+        return np.nanmean(blocks, axis=(1, 3)), True
+
+def _get_iData_repr(idata_symb, window=None, reprdata=None):
+    '''
+    window: optional dict describing the plot area, "w" and "h" in pixels and for 1d data the range "xmin" to "xmax",
+    plot payloads are decimated to the plot area, which by default is the full range in the largest plot window
+    reprdata: the result of _get_iData_reprdata, if it has already been fetched
+    '''
+    window = window or {}
+    width = window.get('w', PLOT_LOD_WIDTH_PX)
+    height = window.get('h', PLOT_LOD_HEIGHT_PX)
+    rd = reprdata or _get_iData_reprdata(idata_symb)
+    ndims = rd['ndims']
+    if not ndims == len(rd['axes']):
         # handles the case of non-existing axis names, i.e. from loading an image file
         for i in range(ndims):
             _eval("%s = %s.setaxis(%d,reshape(%s{%d},1,[]));" % (idata_symb,idata_symb,i+1,idata_symb,i+1), nargout=0)
-        axes_names = _eval('%s.Axes;' % idata_symb, nargout=1) # Ensure we use the auto-generated axis names
-    axesvals = []
+        rd = _get_iData_reprdata(idata_symb) # Ensure we use the auto-generated axis names
     pltdct = {}
 
-    # Get axis labels
-    xlabel = _eval('xlabel(%s);' % idata_symb, nargout=1)
-    ylabel = _eval('ylabel(%s);' % idata_symb, nargout=1)
-    
     # fallback labels
+    xlabel = rd['xlabel']
+    ylabel = rd['ylabel']
     if xlabel == "":
         xlabel = "x"
     if ylabel == "":
@@ -428,64 +856,32 @@ def _get_iData_repr(idata_symb):
         ' the trivial case, no data is present '
         pltdct = None
     elif ndims == 1:
-
-        xvals = _eval('%s.%s;' % (idata_symb, axes_names[0]))
-        xvals = trysquash(xvals)
-        xvals = np.reshape(xvals, (1, len(xvals)))[0]
-
-        signal = np.array(_eval('%s.Signal./%s.Monitor;' % (idata_symb, idata_symb), nargout=1)).astype(np.float)
-        signal = trysquash(signal)
-        signal = np.reshape(signal, (1, len(signal)))[0]
-
-        try:
-            error = np.array(_eval('%s.Error./%s.Monitor;' % (idata_symb, idata_symb), nargout=1)).astype(np.float)
-            error = trysquash(error)
-            error = np.reshape(error, (1, len(error)))[0]
-        except:
+        xvals = rd['axesvals'][0].ravel()
+        signal = rd['signal'].ravel()
+        error = rd['error']
+        if error is None:
             error = np.sqrt(signal)
+        error = error.ravel()
 
         # remove all NaN, Inf and -Inf entries
         include_set = np.logical_not(np.isnan(np.subtract(signal, error)))
-        signal = signal[include_set].tolist()
-        xvals = xvals[include_set].tolist()
-        error = error[include_set].tolist()
-
-        # get rid of nan
-        cnt = 0
-        while len(signal) > cnt:
-            if math.isnan(signal[cnt]):
-                try:
-                    del xvals[cnt]
-                    del signal[cnt]
-                    del error[cnt]
-                except Exception as e:
-                    print(2)
-            else:
-                cnt = cnt + 1
+        if window.get('xmin', None) is not None and window.get('xmax', None) is not None:
+            include_set = include_set & (xvals >= window['xmin']) & (xvals <= window['xmax'])
+        xvals, signal, error, lod = _lod_1d(xvals[include_set], signal[include_set], error[include_set], width)
         
-        pltdct = _get_plot_1D(xvals, signal, error, xlabel=xlabel, ylabel=ylabel, title=idata_symb, style_as_data=True)
+        pltdct = _get_plot_1D(xvals.tolist(), signal.tolist(), error.tolist(), xlabel=xlabel, ylabel=ylabel, title=idata_symb, style_as_data=True, lod=lod)
     elif ndims == 2:
-        xvals = list(_eval('%s.%s;' % (idata_symb, axes_names[0]) )[0])
-        yvals = list(_eval('%s.%s;' % (idata_symb, axes_names[1]) )[0])
-        axesvals.append(xvals)
-        axesvals.append(yvals)
-
-        signal = np.array(_eval('%s.Signal./%s.Monitor;' % (idata_symb, idata_symb), nargout=1)).astype(np.float).tolist()
-        error = np.array(_eval('%s.Error./%s.Monitor;' % (idata_symb, idata_symb), nargout=1)).astype(np.float).tolist()
+        # first rows of the axes, as they are defined along the matrix dimensions
+        axesvals = [np.atleast_2d(v)[0].tolist() for v in rd['axesvals'][:2]]
+        signal, lod = _lod_2d(rd['signal'], width, height)
         
-        pltdct = _get_plot_2D(axesvals, signal, error, xlabel=xlabel, ylabel=ylabel, title=idata_symb)
-    else:
-        for i in range(ndims):
-            ivals = list(_eval('%s.%s;' % (idata_symb, axes_names[i]) )[0])
-            axesvals.append(ivals)
-        signal = list(_eval('%s.Signal;' % idata_symb)[0])
-        error = list(_eval('%s.Error;' % idata_symb)[0])
+        pltdct = _get_plot_2D(axesvals, signal, None, xlabel=xlabel, ylabel=ylabel, title=idata_symb, lod=lod)
     
     infdct = {'datashape' : None}
     infdct['ndims'] = "%d" % ndims
     return pltdct, infdct
 
-def _get_plot_1D(axisvals, signal, yerr, xlabel, ylabel, title, style_as_data=False):
+def _get_plot_1D(axisvals, signal, yerr, xlabel, ylabel, title, style_as_data=False, lod=False):
     ''' returns the dict required by the svg 1d plotting function '''
     params = {}
     p = params
@@ -499,90 +895,69 @@ def _get_plot_1D(axisvals, signal, yerr, xlabel, ylabel, title, style_as_data=Fa
     p['title'] = title
     p['ndims'] = 1
     p['style_as_data'] = style_as_data # should the style "data" (as opposed to "model") be used when plotting?
+    p['lod'] = lod # was the data decimated, i.e. can a zoomed-in window be fetched at a higher resolution?
     return params
 
-def _get_plot_2D(axisvals, signal, yerr, xlabel, ylabel, title):
+# the colour maps
+# Default, as in McStas
+_cm = np.array([[  0,   0, 143, 255], [  0,   0, 159, 255], [  0,   0, 175, 255], [  0,   0, 191, 255], [  0,   0, 207, 255], [  0,   0, 223, 255], [  0,   0, 239, 255], [  0,   0, 255, 255], [  0,  16, 255, 255], [  0,  32, 255, 255], [  0,  48, 255, 255], [  0,  64, 255, 255], [  0,  80, 255, 255], [  0,  96, 255, 255], [  0, 112, 255, 255], [  0, 128, 255, 255], [  0, 143, 255, 255], [  0, 159, 255, 255], [  0, 175, 255, 255], [  0, 191, 255, 255], [  0, 207, 255, 255], [  0, 223, 255, 255], [  0, 239, 255, 255], [  0, 255, 255, 255], [ 16, 255, 239, 255], [ 32, 255, 223, 255], [ 48, 255, 207, 255], [ 64, 255, 191, 255], [ 80, 255, 175, 255], [ 96, 255, 159, 255], [112, 255, 143, 255], [128, 255, 128, 255], [143, 255, 112, 255], [159, 255,  96, 255], [175, 255,  80, 255], [191, 255,  64, 255], [207, 255,  48, 255], [223, 255,  32, 255], [239, 255,  16, 255], [255, 255,   0, 255], [255, 239,   0, 255], [255, 223,   0, 255], [255, 207,   0, 255], [255, 191,   0, 255], [255, 175,   0, 255], [255, 159,   0, 255], [255, 143,   0, 255], [255, 128,   0, 255], [255, 112,   0, 255], [255,  96,   0, 255], [255,  80,   0, 255], [255,  64,   0, 255], [255,  48,   0, 255], [255,  32,   0, 255], [255,  16,   0, 255], [255,   0,   0, 255], [239,   0,   0, 255], [223,   0,   0, 255], [207,   0,   0, 255], [191,   0,   0, 255], [175,   0,   0, 255], [159,   0,   0, 255], [143,   0,   0, 255], [128,   0,   0, 255]], dtype=np.ubyte)
+# Default, converted from recent Matlab default colormap
+#_cm = np.array([[62, 38, 168, 255], [64, 42, 180, 255], [66, 46, 192, 255], [68, 50, 203, 255], [69, 55, 213, 255], [70, 60, 222, 255], [71, 65, 229, 255], [71, 71, 235, 255], [72, 77, 240, 255], [72, 82, 244, 255], [71, 88, 248, 255], [70, 94, 251, 255], [69, 99, 253, 255], [66, 105, 254, 255], [62, 111, 255, 255], [56, 117, 254, 255], [50, 124, 252, 255], [47, 129, 250, 255], [46, 135, 247, 255], [45, 140, 243, 255], [43, 145, 239, 255], [39, 151, 235, 255], [37, 155, 232, 255], [35, 160, 229, 255], [32, 165, 227, 255], [28, 169, 223, 255], [24, 173, 219, 255], [18, 177, 214, 255], [ 8, 181, 208, 255], [ 1, 184, 202, 255], [ 2, 186, 195, 255], [11, 189, 189, 255], [25, 191, 182, 255], [36, 193, 174, 255], [44, 196, 167, 255], [49, 198, 159, 255], [55, 200, 151, 255], [63, 202, 142, 255], [74, 203, 132, 255], [87, 204, 122, 255], [100, 205, 111, 255], [114, 205, 100, 255], [129, 204, 89, 255], [143, 203, 78, 255], [157, 201, 67, 255], [171, 199, 57, 255], [185, 196, 49, 255], [197, 194, 42, 255], [209, 191, 39, 255], [220, 189, 41, 255], [230, 187, 45, 255], [240, 186, 54, 255], [248, 186, 61, 255], [254, 190, 60, 255], [254, 195, 56, 255], [254, 201, 52, 255], [252, 207, 48, 255], [250, 214, 45, 255], [247, 220, 42, 255], [245, 227, 39, 255], [245, 233, 36, 255], [246, 239, 32, 255], [247, 245, 27, 255], [249, 251, 21, 255]], dtype=np.ubyte)
+# hsv-oriented colormap
+#_cm = np.array([[255, 0, 0, 255], [255,  24, 0, 255], [255,  48, 0, 255], [255,  72, 0, 255], [255,  96, 0, 255], [255, 120, 0, 255], [255, 143, 0, 255], [255, 167, 0, 255], [255, 191, 0, 255], [255, 215, 0, 255], [255, 239, 0, 255], [247, 255, 0, 255], [223, 255, 0, 255], [199, 255, 0, 255], [175, 255, 0, 255], [151, 255, 0, 255], [128, 255, 0, 255], [104, 255, 0, 255], [ 80, 255, 0, 255], [ 56, 255, 0, 255], [ 32, 255, 0, 255], [  8, 255, 0, 255], [  0, 255,  16, 255], [  0, 255,  40, 255], [  0, 255,  64, 255], [  0, 255,  88, 255], [  0, 255, 112, 255], [  0, 255, 135, 255], [  0, 255, 159, 255], [  0, 255, 183, 255], [  0, 255, 207, 255], [  0, 255, 231, 255], [  0, 255, 255, 255], [  0, 231, 255, 255], [  0, 207, 255, 255], [  0, 183, 255, 255], [  0, 159, 255, 255], [  0, 135, 255, 255], [  0, 112, 255, 255], [  0,  88, 255, 255], [  0,  64, 255, 255], [  0,  40, 255, 255], [  0,  16, 255, 255], [  8, 0, 255, 255], [ 32, 0, 255, 255], [ 56, 0, 255, 255], [ 80, 0, 255, 255], [104, 0, 255, 255], [128, 0, 255, 255], [151, 0, 255, 255], [175, 0, 255, 255], [199, 0, 255, 255], [223, 0, 255, 255], [247, 0, 255, 255], [255, 0, 239, 255], [255, 0, 215, 255], [255, 0, 191, 255], [255, 0, 167, 255], [255, 0, 143, 255], [255, 0, 120, 255], [255, 0,  96, 255], [255, 0,  72, 255], [255, 0,  48, 255], [255, 0,  24, 255]], dtype=np.ubyte)
+
+def _cm_colors(cm, vals):
+    ''' maps vals in [0, 1] to colormap rows by nearest index, non-finite values get the first colour '''
+    xp = (len(cm)-1) * np.asarray(vals, dtype=np.float64)
+    idx = np.zeros(xp.shape, dtype=np.intp)
+    finite = np.isfinite(xp)
+    idx[finite] = np.clip(np.rint(xp[finite]), 0, len(cm)-1)
+    return cm[idx]
+
+def _encode_png(img):
+    ''' returns the uint8 RGBA image as a base64 encoded png string '''
+    output = io.BytesIO()
+    Image.fromarray(np.ascontiguousarray(img), 'RGBA').save(output, format="png")
+    encoded = base64.b64encode(output.getvalue()).decode('ascii')
+    output.close()
+    return encoded
+
+_colorbar_cache = {}
+def _get_colorbar_png(cm):
+    ''' the vertical colorbar of cm, encoded once per colormap '''
+    key = cm.tobytes()
+    encoded = _colorbar_cache.get(key, None)
+    if encoded is None:
+        tmpimg = _cm_colors(cm, np.arange(255, -1, -1)/255).reshape((256, 1, 4))
+        encoded = _encode_png(tmpimg)
+        _colorbar_cache[key] = encoded
+    return encoded
+
+def _get_plot_2D(axisvals, signal, yerr, xlabel, ylabel, title, lod=False):
     ''' returns the dict required by the svg 1d plotting function '''
-    def lookup(cm, x):
-        # Real number from 0 to len(cm)-1 [0:63]
-        xp = (len(cm)-1) * x
-        # Simply round off and return
-        if np.isnan(xp):
-            #idx=np.int(len(cm)-1)
-            idx=0
-        else:
-            idx = np.int(np.round(xp))
-        return cm[idx]
-        
-    
-    dims = np.shape(signal)
-    
-    # the colour maps
-    # Default, as in McStas
-    cm = np.array([[  0,   0, 143, 255], [  0,   0, 159, 255], [  0,   0, 175, 255], [  0,   0, 191, 255], [  0,   0, 207, 255], [  0,   0, 223, 255], [  0,   0, 239, 255], [  0,   0, 255, 255], [  0,  16, 255, 255], [  0,  32, 255, 255], [  0,  48, 255, 255], [  0,  64, 255, 255], [  0,  80, 255, 255], [  0,  96, 255, 255], [  0, 112, 255, 255], [  0, 128, 255, 255], [  0, 143, 255, 255], [  0, 159, 255, 255], [  0, 175, 255, 255], [  0, 191, 255, 255], [  0, 207, 255, 255], [  0, 223, 255, 255], [  0, 239, 255, 255], [  0, 255, 255, 255], [ 16, 255, 239, 255], [ 32, 255, 223, 255], [ 48, 255, 207, 255], [ 64, 255, 191, 255], [ 80, 255, 175, 255], [ 96, 255, 159, 255], [112, 255, 143, 255], [128, 255, 128, 255], [143, 255, 112, 255], [159, 255,  96, 255], [175, 255,  80, 255], [191, 255,  64, 255], [207, 255,  48, 255], [223, 255,  32, 255], [239, 255,  16, 255], [255, 255,   0, 255], [255, 239,   0, 255], [255, 223,   0, 255], [255, 207,   0, 255], [255, 191,   0, 255], [255, 175,   0, 255], [255, 159,   0, 255], [255, 143,   0, 255], [255, 128,   0, 255], [255, 112,   0, 255], [255,  96,   0, 255], [255,  80,   0, 255], [255,  64,   0, 255], [255,  48,   0, 255], [255,  32,   0, 255], [255,  16,   0, 255], [255,   0,   0, 255], [239,   0,   0, 255], [223,   0,   0, 255], [207,   0,   0, 255], [191,   0,   0, 255], [175,   0,   0, 255], [159,   0,   0, 255], [143,   0,   0, 255], [128,   0,   0, 255]], dtype=np.ubyte)
-    # Default, converted from recent Matlab default colormap
-    #cm = np.array([[62, 38, 168, 255], [64, 42, 180, 255], [66, 46, 192, 255], [68, 50, 203, 255], [69, 55, 213, 255], [70, 60, 222, 255], [71, 65, 229, 255], [71, 71, 235, 255], [72, 77, 240, 255], [72, 82, 244, 255], [71, 88, 248, 255], [70, 94, 251, 255], [69, 99, 253, 255], [66, 105, 254, 255], [62, 111, 255, 255], [56, 117, 254, 255], [50, 124, 252, 255], [47, 129, 250, 255], [46, 135, 247, 255], [45, 140, 243, 255], [43, 145, 239, 255], [39, 151, 235, 255], [37, 155, 232, 255], [35, 160, 229, 255], [32, 165, 227, 255], [28, 169, 223, 255], [24, 173, 219, 255], [18, 177, 214, 255], [ 8, 181, 208, 255], [ 1, 184, 202, 255], [ 2, 186, 195, 255], [11, 189, 189, 255], [25, 191, 182, 255], [36, 193, 174, 255], [44, 196, 167, 255], [49, 198, 159, 255], [55, 200, 151, 255], [63, 202, 142, 255], [74, 203, 132, 255], [87, 204, 122, 255], [100, 205, 111, 255], [114, 205, 100, 255], [129, 204, 89, 255], [143, 203, 78, 255], [157, 201, 67, 255], [171, 199, 57, 255], [185, 196, 49, 255], [197, 194, 42, 255], [209, 191, 39, 255], [220, 189, 41, 255], [230, 187, 45, 255], [240, 186, 54, 255], [248, 186, 61, 255], [254, 190, 60, 255], [254, 195, 56, 255], [254, 201, 52, 255], [252, 207, 48, 255], [250, 214, 45, 255], [247, 220, 42, 255], [245, 227, 39, 255], [245, 233, 36, 255], [246, 239, 32, 255], [247, 245, 27, 255], [249, 251, 21, 255]], dtype=np.ubyte)
-    # hsv-oriented colormap
-    #cm = np.array([[255, 0, 0, 255], [255,  24, 0, 255], [255,  48, 0, 255], [255,  72, 0, 255], [255,  96, 0, 255], [255, 120, 0, 255], [255, 143, 0, 255], [255, 167, 0, 255], [255, 191, 0, 255], [255, 215, 0, 255], [255, 239, 0, 255], [247, 255, 0, 255], [223, 255, 0, 255], [199, 255, 0, 255], [175, 255, 0, 255], [151, 255, 0, 255], [128, 255, 0, 255], [104, 255, 0, 255], [ 80, 255, 0, 255], [ 56, 255, 0, 255], [ 32, 255, 0, 255], [  8, 255, 0, 255], [  0, 255,  16, 255], [  0, 255,  40, 255], [  0, 255,  64, 255], [  0, 255,  88, 255], [  0, 255, 112, 255], [  0, 255, 135, 255], [  0, 255, 159, 255], [  0, 255, 183, 255], [  0, 255, 207, 255], [  0, 255, 231, 255], [  0, 255, 255, 255], [  0, 231, 255, 255], [  0, 207, 255, 255], [  0, 183, 255, 255], [  0, 159, 255, 255], [  0, 135, 255, 255], [  0, 112, 255, 255], [  0,  88, 255, 255], [  0,  64, 255, 255], [  0,  40, 255, 255], [  0,  16, 255, 255], [  8, 0, 255, 255], [ 32, 0, 255, 255], [ 56, 0, 255, 255], [ 80, 0, 255, 255], [104, 0, 255, 255], [128, 0, 255, 255], [151, 0, 255, 255], [175, 0, 255, 255], [199, 0, 255, 255], [223, 0, 255, 255], [247, 0, 255, 255], [255, 0, 239, 255], [255, 0, 215, 255], [255, 0, 191, 255], [255, 0, 167, 255], [255, 0, 143, 255], [255, 0, 120, 255], [255, 0,  96, 255], [255, 0,  72, 255], [255, 0,  48, 255], [255, 0,  24, 255]], dtype=np.ubyte)
+    cm = _cm
+    signal = np.asarray(signal, dtype=np.float64)
     
     # create the 2d data as a png given our colormap
-    img = np.zeros((dims[0], dims[1], 4))
     maxval = np.max(signal)
     minval = np.min(signal)
-    for i in range(dims[0]):
-        for j in range(dims[1]):
-            img[i,j,:] = lookup(cm, (signal[i][j]-minval)/(maxval-minval))
-    # encode png as base64 string
-    image = scipy.misc.toimage(np.flipud(img))
-    output = io.BytesIO()
-    image.save(output, format="png")
-    encoded_2d_data = str(base64.b64encode(output.getvalue())).lstrip('b').strip("\'")
-    output.close()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        img = _cm_colors(cm, (signal - minval)/(maxval - minval))
+    encoded_2d_data = _encode_png(np.flipud(img))
     
     # create log data as another png
-    img_log = np.zeros((dims[0], dims[1], 4))
-    minval = 1e19
-    for row in signal:
-        for val in row:
-            if val > 0 and val < minval:
-                minval = val
+    positive = signal[signal > 0]
+    minval = np.min(positive) if positive.size > 0 else 1e19
     minval_log = np.log10(minval/10)
     signal_log = np.ma.log10(signal).filled(minval_log) # masked array filling in zeros (zero must be mask false...)
     maxval_log = np.max(signal_log)
-    for i in range(dims[0]):
-        for j in range(dims[1]):
-            try:
-                img_log[i,j,:] = lookup(cm, (signal_log[i][j] - minval_log)/(maxval_log - minval_log))
-            except Exception as e:
-                print(e)
-    # encode png as base64 string
-    image_log= scipy.misc.toimage(np.flipud(img_log))
-    output = io.BytesIO()
-    image_log.save(output, format="png")
-    encoded_2d_data_log = str(base64.b64encode(output.getvalue())).lstrip('b').strip("\'")
-    output.close()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        img_log = _cm_colors(cm, (signal_log - minval_log)/(maxval_log - minval_log))
+    encoded_2d_data_log = _encode_png(np.flipud(img_log))
     
-    # color bar
-    tmpimg = np.zeros((256, 1, 4))
-    for i in range(256):
-        color = lookup(cm, i/255)
-        tmpimg[255-i, 0] = color
-    cb_img = scipy.misc.toimage(tmpimg)
-    output = io.BytesIO()
-    cb_img.save(output, format='png')
-    encoded_cb = str(base64.b64encode(output.getvalue())).lstrip('b').strip("\'")
-    output.close()
-    
-    # log color bar
-    tmpimg = np.zeros((256, 1, 4))
-    for i in range(256):
-        color = lookup(cm, i/255)
-        tmpimg[255-i, 0] = color
-    cb_img_log = scipy.misc.toimage(tmpimg)
-    output = io.BytesIO()
-    cb_img_log.save(output, format='png')
-    encoded_cb_log = str(base64.b64encode(output.getvalue())).lstrip('b').strip("\'")
-    output.close()
+    # color bars, the same for linear and log data
+    encoded_cb = _get_colorbar_png(cm)
+    encoded_cb_log = encoded_cb
 
     x = axisvals[0]
     y = axisvals[1]
@@ -623,6 +998,7 @@ def _get_plot_2D(axisvals, signal, yerr, xlabel, ylabel, title):
     p['title'] = title
 
     p['ndims'] = 2
+    p['lod'] = lod
 
     return params
 
@@ -634,6 +1010,7 @@ class IFunc(enginterface.ObjReprJson):
     ''' Creates an IFunc object, a flexible fitting model. Use iFit syntax to input a model specification in the "symbol" argument. '''
     def __init__(self, datashape:list=None, symbol='iFunc'):
         logging.debug("%s.__init__" % str(type(self)))
+        self._engine_idx = _current_engine()
 
         def create_ifunc(vn, symb):
             def is_known_ifit_builtin(modelname):
@@ -674,6 +1051,10 @@ class IFunc(enginterface.ObjReprJson):
         self.varname = _get_ifunc_uuid()
         self._plotaxes = None
         self._plotdims = None
+        self._fitstats = None
+        self._lastfit = None
+        self._datashape = None
+        self._parnames = None
         self.symbol = symbol
 
         datashape = _npify_shape(datashape)
@@ -686,9 +1067,10 @@ class IFunc(enginterface.ObjReprJson):
                 _vectorized(datashape, create_ifunc, vnargs, args, ndaargs)
         else:
             create_ifunc(self.varname, symbol)
+        self._datashape = datashape
 
     def __del__(self):
-        _eval("clear %s;" % self.varname, nargout=0)
+        _release_symb(self.varname, engine_idx=getattr(self, '_engine_idx', 0), flush=False)
 
     def _clear_plotaxes(self):
         self._plotaxes = None
@@ -698,6 +1080,14 @@ class IFunc(enginterface.ObjReprJson):
         self._plotaxes = axeslims
         self._plotdims = ndims
 
+    def _set_fitstats(self, fitstats):
+        ''' fit statistics of this model, see fit, reported in the repr info '''
+        self._fitstats = fitstats
+
+    def _set_lastfit(self, datashape, pars):
+        ''' remembers the parameters of the last fit of this model, used by fit to warm-start the next '''
+        self._lastfit = (datashape, pars)
+
     def get_repr(self):
         ''' mostly delegated to the offline function _get_iFunc_repr '''
         datashape = self._get_datashape()
@@ -707,7 +1097,7 @@ class IFunc(enginterface.ObjReprJson):
         outdct = None
         
         if datashape in [None, tuple()]:
-            pltdct, infdct, usrdct = _get_iFunc_repr(self.varname, self._plotaxes, self._plotdims)
+            pltdct, infdct, usrdct = _get_iFunc_repr(self.varname, self._plotaxes, self._plotdims, pkeys=self._get_parnames())
             outdct = usrdct
         else:
             def get_repr_atomic(symb, pltax=None, pltdims=None):
@@ -739,6 +1129,10 @@ class IFunc(enginterface.ObjReprJson):
             pltdct = plts.tolist()
             infdct = {'datashape' : datashape, 'ndims' : None}
 
+        fitstats = getattr(self, '_fitstats', None)
+        if fitstats is not None:
+            infdct['fitstats'] = fitstats
+
         retdct['plotdata'] = pltdct
         retdct['info'] = infdct
         retdct['userdata'] = usrdct
@@ -755,10 +1149,21 @@ class IFunc(enginterface.ObjReprJson):
         #set_parvalues_atomic(self.varname, json_obj)
 
     def _get_datashape(self):
-        ''' returns the naiive datashape (size) of the matlab object associated with self.varname '''
-        s = np.array(_eval("size(%s);" % self.varname, nargout=1)[0]).astype(int).tolist() # NOTE: tolist() converts to native python int from np.int64
-        s = _npify_shape(s)
-        return s
+        ''' returns the naiive datashape (size) of the matlab object associated with self.varname, cached at creation '''
+        datashape = getattr(self, '_datashape', None)
+        if datashape is None:
+            s = np.array(_eval("size(%s);" % self.varname, nargout=1)[0]).astype(int).tolist() # NOTE: tolist() converts to native python int from np.int64
+            datashape = _npify_shape(s)
+            self._datashape = datashape
+        return datashape
+
+    def _get_parnames(self):
+        ''' returns the cached parameter names (.Parameters) of a non-array model, which are fixed by its symbol '''
+        pkeys = getattr(self, '_parnames', None)
+        if pkeys is None:
+            pkeys = _eval('%s.Parameters;' % self.varname, nargout=1)
+            self._parnames = pkeys
+        return pkeys
 
     def guess(self, guess: dict):
         ''' Applies values to parameters by means of dictionary keys-value pairs. All values must be set simultaneously. '''
@@ -793,19 +1198,20 @@ class IFunc(enginterface.ObjReprJson):
                 _eval('tmp_%s.ParameterValues = [%s];' % (vn_noidx, ' '.join( [str(float(v)) for v in values] )), nargout=0)
                 _eval('%s = tmp_%s;' % (vn, vn_noidx), nargout=0)
             finally:
-                _eval('clear tmp_%s;' % vn_noidx, nargout=0)
+                _eval('clear tmp_%s;' % vn_noidx, nargout=0, cleanup=True)
 
         shape = self._get_datashape()
         rank = len(shape)
 
         guess = _ifregular_squeeze_cast(guess, rank)
-        if rank == 0:
-            set_parvalues_atomic(self.varname, self.varname, guess)
-        else:
-            vnargs = (self.varname, )
-            args = (self.varname, )
-            ndaargs = (guess, )
-            _vectorized(shape, set_parvalues_atomic, vnargs, args, ndaargs)
+        with _cmdbuffer():
+            if rank == 0:
+                set_parvalues_atomic(self.varname, self.varname, guess)
+            else:
+                vnargs = (self.varname, )
+                args = (self.varname, )
+                ndaargs = (guess, )
+                _vectorized(shape, set_parvalues_atomic, vnargs, args, ndaargs)
 
     def fixpars(self, parnames: list):
         ''' Fixes parameters with the specified names. Fixed parameters will not be varied during fit optimizations. '''
@@ -827,18 +1233,20 @@ class IFunc(enginterface.ObjReprJson):
         rank = len(shape)
 
         parnames = _ifregular_squeeze_cast(parnames, rank)
-        if rank == 0:
-            fixpars_atomic(self.varname, parnames)
-        else:
-            vnargs = (self.varname, )
-            args = ()
-            ndaargs = (parnames, )
-            _vectorized(shape, fixpars_atomic, vnargs, args, ndaargs)
+        with _cmdbuffer():
+            if rank == 0:
+                fixpars_atomic(self.varname, parnames)
+            else:
+                vnargs = (self.varname, )
+                args = ()
+                ndaargs = (parnames, )
+                _vectorized(shape, fixpars_atomic, vnargs, args, ndaargs)
 
-def _get_iFunc_repr(varname, plotaxes, plotdims, datashape = None):
+def _get_iFunc_repr(varname, plotaxes, plotdims, datashape = None, pkeys = None):
     ''' returns an ifunc representation, and can even be used to extract a plot from a vactorized instance '''
-    # get parameter names and fvals
-    pkeys = _eval('%s.Parameters;' % varname, nargout=1)
+    # get parameter names (unless cached by the caller) and fvals
+    if pkeys is None:
+        pkeys = _eval('%s.Parameters;' % varname, nargout=1)
     pvals = {}
     vals = []
     for key in pkeys:
@@ -974,6 +1382,49 @@ def _is_regular_ndarray(lst, rank:int=None):
     except:
         return False
 
+def _element(a, ndindex):
+    ''' returns the element of ndarray or nested list a at ndindex '''
+    if isinstance(a, np.ndarray):
+        return a[ndindex]
+    for i in ndindex:
+        a = a[i]
+    return a
+
+def _ml_index(ndindex):
+    ''' the matlab subscript of a numpy ndindex, e.g. (0, 2) -> "(1,3)" '''
+    return "(" + ",".join([str(i+1) for i in ndindex]) + ")"
+
+def _vectorized_ml(shape, atomic_func, vnargs, args, ndaargs):
+    '''
+    Attempts to run a _vectorized operation as one matlab-side loop. The atomic function is traced
+    once using symbolic arguments, vn(k) for varnames and a(k) for ndaargs which are transferred
+    in bulk, and the recorded statements form the loop body. Returns False, having evaluated
+    nothing, if atomic_func needs outputs or ndaargs are not numeric arrays of the iteration shape.
+    '''
+    if getattr(_cmdtrace, 'stmts', None) is not None:
+        return False
+    shape = tuple(shape)
+    for a in ndaargs:
+        if np.shape(a) != shape or not np.issubdtype(np.asarray(a).dtype, np.number):
+            return False
+
+    # MATLAB linear indexing is column-major, so the ndaargs are transferred in fortran order
+    uid = uuid.uuid4().hex
+    k = "ifl_k_%s" % uid
+    ndanames = ["ifl_a%d_%s" % (i, uid) for i in range(len(ndaargs))]
+    symbols = tuple("%s(%s)" % (vn, k) for vn in vnargs)
+    elements = tuple(_TracedNumber("%s(%s)" % (an, k)) for an in ndanames)
+    body = _trace_statements(atomic_func, *symbols, *args, *elements)
+    if not body:
+        return False
+    body = [b.strip() if b.strip().endswith((';', ',')) else b.strip() + ';' for b in body]
+
+    # a single line, which keeps the command log extractable by varname
+    transfers = ["%s = [%s];" % (an, " ".join([repr(float(v)) for v in np.asarray(a).flatten(order='F')])) for an, a in zip(ndanames, ndaargs)]
+    loop = "for %s = 1:%d, %s end;" % (k, int(np.prod(shape)), " ".join(body))
+    _eval(" ".join(transfers + [loop, "clear %s;" % " ".join([k] + ndanames)]), nargout=0)
+    return True
+
 def _vectorized(shape, atomic_func, vnargs, args, ndaargs):
     '''
     Hybrid vectorize python/matlab lists combining varnames and ndim numpy arrays
@@ -991,15 +1442,16 @@ def _vectorized(shape, atomic_func, vnargs, args, ndaargs):
     matching the shapes of all ndaargs, given that these may extend "shape", and
     are free to pass extended shape in case "atomic_func" takes a lits argument 
     (if it e.g. implements reduce-like functionality).
+
+    Operations made of no-output statements are run as one matlab-side loop, see _vectorized_ml.
     '''
-    it = np.ndindex(shape)
-    for ndindex in it:
-        indices = [i+1 for i in ndindex] # convert to matlab indexing
-        indices = str(indices).replace("[","(").replace("]",")")
-        
+    if _vectorized_ml(shape, atomic_func, vnargs, args, ndaargs):
+        return
+    for ndindex in np.ndindex(shape):
+        indices = _ml_index(ndindex)
         symbols = tuple("%s%s" % (vn, indices) for vn in vnargs)
         constants = args
-        elements = tuple(eval("a%s" % str(list(ndindex))) for a in ndaargs) # this is not pretty, but it works
+        elements = tuple(_element(a, ndindex) for a in ndaargs)
         
         atomic_func(*symbols, *constants, *elements)
 
@@ -1010,17 +1462,13 @@ def _vectcollect(shape, atomic_func, vnargs, args, ndaargs, collectarg):
     collectarg. This container must be initialized correctly, using e.g.
     np.empty(datashape, object) or similar.
     '''
-    it = np.ndindex(shape)
-    for ndindex in it:
-        indices = [i+1 for i in ndindex] # convert to matlab indexing
-        indices = str(indices).replace("[","(").replace("]",")")
-        
+    for ndindex in np.ndindex(shape):
+        indices = _ml_index(ndindex)
         symbols = tuple("%s%s" % (vn, indices) for vn in vnargs)
         constants = args
-        elements = tuple(eval("a%s" % str(list(ndindex))) for a in ndaargs) # this is not pretty, but it works
+        elements = tuple(_element(a, ndindex) for a in ndaargs)
         
-        value = atomic_func(*symbols, *constants, *elements)
-        exec("collectarg%s = value" % str(list(ndindex)))
+        collectarg[ndindex] = atomic_func(*symbols, *constants, *elements)
 
 def _vectcollect_general(shape, atomic_func, vnargs, args, ndaargs, collectargs):
     '''
@@ -1028,25 +1476,20 @@ def _vectcollect_general(shape, atomic_func, vnargs, args, ndaargs, collectargs)
     dimension/args tuple.
     This can be handy for elliminating the need to unpack values later on.
     '''
-    it = np.ndindex(shape)
-    for ndindex in it:
-        indices = [i+1 for i in ndindex] # convert to matlab indexing
-        indices = str(indices).replace("[","(").replace("]",")")
-        
+    for ndindex in np.ndindex(shape):
+        indices = _ml_index(ndindex)
         symbols = tuple("%s%s" % (vn, indices) for vn in vnargs)
         constants = args
-        elements = tuple(eval("a%s" % str(list(ndindex))) for a in ndaargs) # this is not pretty, but it works
+        elements = tuple(_element(a, ndindex) for a in ndaargs)
         
         value = atomic_func(*symbols, *constants, *elements)
 
-        
         if type(value) != tuple:
-            exec("collectargs%s = value" % str(list(ndindex)))
+            collectargs[ndindex] = value
         else:
             if len(collectargs) == len(value):
                 for i in range(len(value)):
-                    val = value[i]
-                    exec("collectargs[i]%s = val" % str(list(ndindex)))
+                    collectargs[i][ndindex] = value[i]
             else:
                 raise Exception("_vectorcollect_general: Mismatching atomic_func return tuple length and collectargs length.")
 
@@ -1105,22 +1548,91 @@ def mult_models(ifunc_a: IFunc, ifunc_b: IFunc) -> IFunc:
     return retobj
 
 
-def fit(idata: IData, ifunc: IFunc, optimizer:str="fminpowell") -> IFunc:
-    ''' Outputs the fitted model of an IFunc model to an IData object. '''
-    logging.debug("fit: %s, %s" % (idata, ifunc))
+def _fit_ml(vn_data, vn_func, vn_outfunc, optim, passes, tolerance, shape, seed="default", prevpars=None):
+    '''
+    Fits vn_func to vn_data into vn_outfunc as one matlab statement, looping over the elements of arrays, using
+    parfor if MATLAB_FIT_PARFOR is set. Each pass continues from the parameters of the previous pass, until the
+    largest relative parameter change is below a nonzero tolerance. Elements which fail to fit get a copy of their model.
 
-    # TODO: alter the call to 'fits' in a way that respects the current ifunc par values as a guess
+    seed: the first pass starts from the optimizer's guess ("default"), from the ParameterValues of vn_func ("current"),
+    or from prevpars ("previous"), a list of parameter vectors in matlab element order, falling back to "current"
 
-    def fit_atomic(vn_data, vn_func, vn_outfunc, optim):
-        try:
-            _eval('[p, c, m, o_%s] = fits(%s, copyobj(%s), \'\', \'%s\');' % (vn_outfunc, vn_data, vn_func, optim), nargout=0)
-            _eval('[p, c, m, o_%s] = fits(%s, copyobj(%s), \'\', \'%s\');' % (vn_outfunc, vn_data, vn_func, optim), nargout=0)
-            _eval('[p, c, m, o_%s] = fits(%s, copyobj(%s), \'\', \'%s\');' % (vn_outfunc, vn_data, vn_func, optim), nargout=0)
-            _eval('%s = o_%s.model;' % (vn_outfunc, vn_outfunc), nargout=0)
-        except:
-            _eval('%s = copyobj(%s);' % (vn_outfunc, vn_func), nargout=0)
-        finally:
-            _eval('clear o_%s;' % vn_outfunc, nargout=0)
+    Returns (stats, pars). stats is a dict of per-element statistics, nested lists of the given shape, or scalars if
+    shape is empty: "time" in seconds, "passes" done, optimizer "iterations" and function "evaluations" summed over
+    the passes, "change" the last relative parameter change (None after one pass), "converged" and "ok". pars lists
+    the fitted parameter vectors in matlab element order, empty for failed elements.
+    '''
+    uid = uuid.uuid4().hex
+    names = ('k', 'm', 'g', 'G', 'p', 'p0', 'dp', 'c', 'mm', 'o', 't0', 'j', 'np', 'cv', 'ok', 'it', 'fc',
+             'T', 'N', 'DP', 'C', 'OK', 'IT', 'FC', 'PV')
+    v = dict([(n, 'ifl_%s_%s' % (n, uid)) for n in names])
+    v['optim'] = optim
+    v['P'] = max(int(passes), 1)
+    v['TOL'] = repr(float(tolerance))
+
+    array = shape not in (None, tuple(),)
+    n = int(np.prod(shape)) if array else 1
+    el = "(%s)" % v['k'] if array else ""
+    v['D'] = vn_data + el
+    v['F'] = vn_func + el
+    v['OUT'] = vn_outfunc + el
+
+    # the first guess
+    transfers = []
+    seeding = "%(g)s = '';"
+    if seed in ("current", "previous"):
+        seeding = "%(g)s = %(F)s.ParameterValues; if isempty(%(g)s), %(g)s = ''; end;"
+    if seed == "previous" and prevpars is not None and len(prevpars) == n:
+        transfers.append("%s = {%s};" % (v['G'], ", ".join(["[%s]" % " ".join([repr(float(x)) for x in pv]) for pv in prevpars])))
+        seeding = "%(g)s = %(G)s{%(k)s}; if isempty(%(g)s), %(g)s = %(F)s.ParameterValues; end; if isempty(%(g)s), %(g)s = ''; end;"
+    elif seed not in ("default", "current", "previous"):
+        raise Exception('unknown seed: "%s", use "default", "current" or "previous"' % seed)
+
+    body = "%(t0)s = tic; %(m)s = copyobj(%(F)s); %(np)s = 0; %(cv)s = 0; %(ok)s = 1; %(dp)s = nan; %(it)s = 0; %(fc)s = 0; %(PV)s{%(k)s} = []; " \
+        "try, " + seeding + " %(p0)s = []; " \
+        "for %(j)s = 1:%(P)d, " \
+        "[%(p)s, %(c)s, %(mm)s, %(o)s] = fits(%(D)s, copyobj(%(m)s), %(g)s, '%(optim)s'); %(m)s = %(o)s.model; %(np)s = %(j)s; %(g)s = %(p)s; " \
+        "if isfield(%(o)s, 'iterations'), %(it)s = %(it)s + %(o)s.iterations; end; " \
+        "if isfield(%(o)s, 'funcCount'), %(fc)s = %(fc)s + %(o)s.funcCount; end; " \
+        "if ~isempty(%(p0)s), %(dp)s = max(abs(%(p)s(:) - %(p0)s(:)) ./ max(abs(%(p0)s(:)), eps)); end; " \
+        "if %(TOL)s > 0 && %(dp)s < %(TOL)s, %(cv)s = 1; break; end; " \
+        "%(p0)s = %(p)s; " \
+        "end; " \
+        "%(PV)s{%(k)s} = %(p)s(:)'; " \
+        "catch, %(m)s = copyobj(%(F)s); %(ok)s = 0; end; " \
+        "%(OUT)s = %(m)s; %(T)s(%(k)s) = toc(%(t0)s); %(N)s(%(k)s) = %(np)s; %(DP)s(%(k)s) = %(dp)s; %(C)s(%(k)s) = %(cv)s; %(OK)s(%(k)s) = %(ok)s; " \
+        "%(IT)s(%(k)s) = %(it)s; %(FC)s(%(k)s) = %(fc)s;"
+    body = body % v
+    init = " ".join(["%s = zeros(1, %d);" % (v[a], n) for a in ('T', 'N', 'DP', 'C', 'OK', 'IT', 'FC')] + ["%s = cell(1, %d);" % (v['PV'], n)])
+    if array:
+        loop = "%s %s = 1:%d, %s end;" % ("parfor" if MATLAB_FIT_PARFOR else "for", v['k'], n, body)
+    else:
+        loop = "%s = 1; %s" % (v['k'], body)
+    _eval(" ".join(transfers + [init, loop]), nargout=0)
+    try:
+        st = _eval("struct('time', %(T)s, 'passes', %(N)s, 'iterations', %(IT)s, 'evaluations', %(FC)s, 'change', %(DP)s, 'converged', %(C)s, 'ok', %(OK)s, 'pars', {%(PV)s});" % v, nargout=1, dontlog=True)
+    finally:
+        _eval("clear %s;" % " ".join([v[a] for a in names]), nargout=0)
+
+    stats = {}
+    for key in ('time', 'passes', 'iterations', 'evaluations', 'change', 'converged', 'ok'):
+        vals = _ml_ndarray(st[key]).ravel()
+        if key in ('passes', 'iterations', 'evaluations', ):
+            vals = vals.astype(int)
+        elif key in ('converged', 'ok'):
+            vals = vals.astype(bool)
+        elif key in ('change', ):
+            vals = np.where(np.isnan(vals), None, vals) # json has no nan
+        stats[key] = vals.reshape(shape, order='F').tolist() if array else vals.tolist()[0]
+    pars = st['pars']
+    if not isinstance(pars, list):
+        pars = [pars]
+    pars = [_ml_ndarray(pv).ravel().tolist() for pv in pars]
+    return stats, pars
+
+def fit(idata: IData, ifunc: IFunc, optimizer:str="fminpowell", passes:int=1, tolerance:float=0.0, seed:str="default") -> IFunc:
+    ''' Outputs the fitted model of an IFunc model to an IData object. Each of up to "passes" passes refines the previous, stopping early if parameters change less than a nonzero relative "tolerance". Seed "current" starts from the model's parameter values, "previous" from the last fit of this model. '''
+    logging.debug("fit: %s, %s" % (idata, ifunc))
 
     def get_axislims_atomic(vn_data):
         ''' returns (axislims, ndims) where axislims is a tuple of (xmin, xmax) or (xmin, xmax, ymin, ymax) '''
@@ -1140,24 +1652,25 @@ def fit(idata: IData, ifunc: IFunc, optimizer:str="fminpowell") -> IFunc:
 
     shape = ds1
     retobj = IFunc(shape)
+    prevpars = None
+    lastfit = getattr(ifunc, '_lastfit', None)
+    if lastfit is not None and lastfit[0] == shape:
+        prevpars = lastfit[1]
+    fitstats, pars = _fit_ml(idata.varname, ifunc.varname, retobj.varname, optimizer, passes, tolerance, shape, seed, prevpars)
+    ifunc._set_lastfit(shape, pars)
     if shape not in (None, tuple(),):
-        vnargs = (idata.varname, ifunc.varname, retobj.varname, )
-        args = (optimizer, )
-        ndaargs = ()
-        _vectorized(shape, fit_atomic, vnargs, args, ndaargs)
-        
         axeslims = np.empty(shape, object)
         axesdims = np.empty(shape, object)
         vnargs = (idata.varname, )
         args = ()
+        ndaargs = ()
         collectargs = (axeslims, axesdims, )
         _vectcollect_general(shape, get_axislims_atomic, vnargs, args, ndaargs, collectargs)
         retobj._set_plotaxes(axeslims, axesdims)
     else:
-        fit_atomic(idata.varname, ifunc.varname, retobj.varname, optimizer)
-        
         lims, ndims = get_axislims_atomic(idata.varname)
         retobj._set_plotaxes(lims, ndims)
+    retobj._set_fitstats(fitstats)
     return retobj
 
 
@@ -1201,15 +1714,16 @@ def IData_1d(axis: list, signal: list, error: list) -> IData:
 
     shape = ds1
     retobj = None
-    if len(shape) <= 1:
-        retobj = _create_empty_idata()
-        set_x_y_atomic(retobj.varname, axis, signal, error)
-    else:
-        retobj = _create_empty_idata_array(shape)
-        vnargs = (retobj.varname, )
-        args = ()
-        ndaargs = (axis, signal, error, )
-        _vectorized(shape, set_x_y_atomic, vnargs, args, ndaargs)
+    with _cmdbuffer():
+        if len(shape) <= 1:
+            retobj = _create_empty_idata()
+            set_x_y_atomic(retobj.varname, axis, signal, error)
+        else:
+            retobj = _create_empty_idata_array(shape)
+            vnargs = (retobj.varname, )
+            args = ()
+            ndaargs = (axis, signal, error, )
+            _vectorized(shape, set_x_y_atomic, vnargs, args, ndaargs)
 
     return retobj
 
@@ -1266,6 +1780,7 @@ def _create_empty_idata():
 
 def _create_empty_idata_array(shape):
     retvar = IData(url=None)
+    retvar._set_datashape(shape)
     if len(shape) == 1:
         shape = (shape[0], 1)
     shape_str = str(list(shape)).replace("[","").replace("]","")
@@ -1317,20 +1832,21 @@ def separate(fitfunc: IFunc, typefunc: IFunc, pidx=-1) -> IFunc:
                 _eval('tmp_%s.%s = %s;' % (vn_outf, key, str(wanted[key])), nargout=0)
             _eval('%s = tmp_%s;' % (vn_outf, vn_outf), nargout=0)
         finally:
-            _eval('clear tmp_%s;' % vn_outf, nargout=0)
+            _eval('clear tmp_%s;' % vn_outf, nargout=0, cleanup=True)
 
     shape = fitfunc._get_datashape()
     if typefunc._get_datashape() not in (None, tuple(),):
         raise Exception("'typefunc' is used as a singular iFunc type indicator, and must have no shape")
 
     retobj = IFunc(shape, symbol=typefunc.symbol)
-    if shape not in (None, tuple(),):
-        vnargs = (fitfunc.varname, retobj.varname)
-        args = (typefunc, pidx)
-        ndaargs = ()
-        _vectorized(shape, separate_atomic, vnargs, args, ndaargs)
-    else:
-        separate_atomic(fitfunc.varname, retobj.varname, typefunc, pidx)
+    with _cmdbuffer():
+        if shape not in (None, tuple(),):
+            vnargs = (fitfunc.varname, retobj.varname)
+            args = (typefunc, pidx)
+            ndaargs = ()
+            _vectorized(shape, separate_atomic, vnargs, args, ndaargs)
+        else:
+            separate_atomic(fitfunc.varname, retobj.varname, typefunc, pidx)
 
     # handle IFunc axis lims inheritane
     retobj._set_plotaxes(fitfunc._plotaxes, fitfunc._plotdims)
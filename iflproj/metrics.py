@@ -0,0 +1,172 @@
+'''
+Process-local metrics: counters, gauges and latency histograms, exposed in the
+Prometheus text format from a local http endpoint.
+'''
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _fmt_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v))
+
+def _fmt_labels(pairs):
+    if len(pairs) == 0:
+        return ""
+    escaped = [(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs]
+    return "{" + ",".join(['%s="%s"' % (k, v) for k, v in escaped]) + "}"
+
+class _Metric:
+    ''' base metric, values are keyed by a tuple of label values in the order of labelnames '''
+    tpe = None
+    def __init__(self, name, doc, labelnames=()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+    def _key(self, labels):
+        if set(labels.keys()) != set(self.labelnames):
+            raise Exception("metric %s: labels must be %s" % (self.name, str(self.labelnames)))
+        return tuple(str(labels[l]) for l in self.labelnames)
+    def samples(self):
+        ''' returns a list of (suffix, label pairs, value) '''
+        with self.lock:
+            return [("", list(zip(self.labelnames, key)), value) for key, value in self.values.items()]
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.doc), "# TYPE %s %s" % (self.name, self.tpe)]
+        for suffix, pairs, value in self.samples():
+            lines.append("%s%s%s %s" % (self.name, suffix, _fmt_labels(pairs), _fmt_value(value)))
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    tpe = "counter"
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+    def total(self):
+        ''' sum over all label values '''
+        with self.lock:
+            return sum(self.values.values())
+
+class Gauge(_Metric):
+    ''' a gauge can be set explicitly, or be given a function which is evaluated on every render '''
+    tpe = "gauge"
+    def __init__(self, name, doc, labelnames=(), fct=None):
+        super().__init__(name, doc, labelnames)
+        self.fct = fct
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+    def samples(self):
+        if self.fct:
+            try:
+                return [("", [], self.fct())]
+            except Exception:
+                return []
+        return super().samples()
+
+class Histogram(_Metric):
+    tpe = "histogram"
+    def __init__(self, name, doc, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"), )
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            entry = self.values.get(key, None)
+            if not entry:
+                entry = [[0]*len(self.buckets), 0.0, 0]
+                self.values[key] = entry
+            for i in range(len(self.buckets)):
+                if value <= self.buckets[i]:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+    @contextmanager
+    def time(self, **labels):
+        ''' observes the duration of the with-block, also if it raises '''
+        t = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - t, **labels)
+    def samples(self):
+        lst = []
+        with self.lock:
+            for key, (counts, total, count) in self.values.items():
+                pairs = list(zip(self.labelnames, key))
+                acc = 0
+                for i in range(len(self.buckets)):
+                    acc += counts[i]
+                    lst.append(("_bucket", pairs + [("le", _fmt_value(self.buckets[i]))], acc))
+                lst.append(("_sum", pairs, total))
+                lst.append(("_count", pairs, count))
+        return lst
+
+class Registry:
+    ''' get-or-create access to named metrics '''
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+    def _get(self, cls, name, *args, **kwargs):
+        with self.lock:
+            m = self.metrics.get(name, None)
+            if not m:
+                m = cls(name, *args, **kwargs)
+                self.metrics[name] = m
+            elif type(m) != cls:
+                raise Exception("metric %s already registered as a %s" % (name, m.tpe))
+            return m
+    def get(self, name):
+        return self.metrics.get(name, None)
+    def counter(self, name, doc, labelnames=()):
+        return self._get(Counter, name, doc, labelnames)
+    def gauge(self, name, doc, labelnames=(), fct=None):
+        return self._get(Gauge, name, doc, labelnames, fct=fct)
+    def histogram(self, name, doc, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, doc, labelnames, buckets=buckets)
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join([m.render() for m in metrics]) + "\n"
+
+registry = Registry()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, format, *args):
+        pass
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+def start_http_server(port, addr='127.0.0.1'):
+    ''' serves the registry at http://addr:port/metrics from a daemon thread '''
+    server = _ThreadingHTTPServer((addr, port), _MetricsHandler)
+    t = threading.Thread(target=server.serve_forever)
+    t.setDaemon(True)
+    t.setName('metrics')
+    t.start()
+    return server
@@ -559,11 +559,13 @@ def del_node(node):
 '''
 Node graph engine execution.
 '''
-def execute_node(node):
+def execute_node(node, listener=None):
     '''
     Executes a node by means of directed graph subtree building and evaluation, depending on the 
     node's connectivity and its execution model.
     Returns the result of the subtree evaluation, which can be None.
+
+    listener: optional listener(event, node), called with "started" and "finished" around every node call.
     '''
     def build_subtree(root):
         '''
@@ -619,7 +621,10 @@ def execute_node(node):
                     value = argtree[i].get_object()
                     argtree[i] = value
                 i += 1
-            return f.call(*argtree)
+            if listener: listener("started", f)
+            value = f.call(*argtree)
+            if listener: listener("finished", f)
+            return value
 
         root = tree[0]
         del tree[0]
@@ -0,0 +1,1801 @@
+'''
+In-process stand-in for the matlab.engine module, used to exercise and benchmark the ifitlib bridge
+without a MATLAB installation, see install and the benchbridge command.
+
+Stub engines interpret the subset of MATLAB and iFit statements which ifitlib emits: iData and iFunc
+creation, arithmetic, axis operations, fits, feval, who, whos, save, load and clear, as well as the
+for, parfor, if and try blocks of batched and vectorized statements. Statements are translated to
+python, and evaluated on NumPy backed iData and iFunc stand-ins. fits uses scipy.optimize.
+'''
+import os
+import re
+import sys
+import copy
+import time
+import array
+import pickle
+import types
+import threading
+
+import numpy as np
+
+class MatlabExecutionError(Exception):
+    ''' raised by eval for errors in the evaluated statements, as by the MATLAB engine '''
+    pass
+
+class EngineError(Exception):
+    pass
+
+class double:
+    ''' matlab.double, a column-major array of doubles, as returned by the engine '''
+    def __init__(self, initializer=None, size=None):
+        a = np.asarray(initializer if initializer is not None else [], dtype=np.float64)
+        if size is not None:
+            a = a.reshape(size, order='F')
+        a = np.atleast_2d(a)
+        self.size = a.shape
+        self._data = array.array('d', a.ravel(order='F').tolist())
+        self._is_complex = False
+    def _ndarray(self):
+        if len(self._data) == 0:
+            return np.zeros(self.size)
+        return np.frombuffer(self._data, dtype=np.float64).reshape(self.size, order='F')
+    def __len__(self):
+        return self.size[0]
+    def __getitem__(self, i):
+        return self._ndarray()[i].tolist()
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+    def __repr__(self):
+        return repr(self._ndarray().tolist())
+
+class FutureResult:
+    ''' the result of an eval(..., background=True), available once the round trip latency has passed '''
+    def __init__(self, value, error, deadline):
+        self.value = value
+        self.error = error
+        self.deadline = deadline
+    def done(self):
+        return time.time() >= self.deadline
+    def cancel(self):
+        return False
+    def result(self, timeout=None):
+        wait = self.deadline - time.time()
+        if wait > 0:
+            time.sleep(wait if timeout is None else min(wait, timeout))
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+class StubEngine:
+    '''
+    Stands in for a MatlabEngine, evaluating statements as they are submitted. Every eval takes at least
+    latency seconds from submission to result, background evals overlap their latency. calls counts evals,
+    busy sums the seconds spent evaluating statements.
+    '''
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.busy = 0.0
+        self.workspace = _Workspace()
+        self.lock = threading.Lock()
+
+    def eval(self, cmd, nargout=1, background=False, **kwargs):
+        deadline = time.time() + self.latency
+        value = None
+        error = None
+        with self.lock:
+            self.calls += 1
+            t = time.time()
+            try:
+                value = self.workspace.run(cmd, nargout)
+            except MatlabExecutionError as e:
+                error = e
+            finally:
+                self.busy += time.time() - t
+        future = FutureResult(value, error, deadline)
+        if background:
+            return future
+        return future.result()
+
+    def quit(self):
+        self.workspace = _Workspace()
+
+_latency = 0.0
+
+def start_matlab(option='', background=False):
+    eng = StubEngine(_latency)
+    if background:
+        return FutureResult(eng, None, time.time())
+    return eng
+
+def install(latency=0.0):
+    '''
+    registers this module as the matlab and matlab.engine modules, so that start_matlab starts StubEngines
+    with the given round trip latency in seconds, returns the matlab module
+    '''
+    global _latency
+    _latency = latency
+    matlab = types.ModuleType('matlab')
+    matlab.double = double
+    matlab.engine = types.ModuleType('matlab.engine')
+    for name in ('start_matlab', 'StubEngine', 'FutureResult', 'MatlabExecutionError', 'EngineError'):
+        setattr(matlab.engine, name, globals()[name])
+    matlab.engine.MatlabEngine = StubEngine
+    sys.modules['matlab'] = matlab
+    sys.modules['matlab.engine'] = matlab.engine
+    return matlab
+
+'''
+Translation of statements to python.
+'''
+
+_re_token = re.compile(r"(?P<sp>[ \t]+)|(?P<nl>[\r\n]+)|(?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|(?P<id>[A-Za-z_]\w*)|"
+                       r"(?P<op>\.\*|\./|\.\^|\.'|==|~=|<=|>=|&&|\|\||[-+*/\\^<>&|~=()\[\]{},;:.@'])")
+_KEYWORDS = ('for', 'parfor', 'if', 'elseif', 'else', 'end', 'try', 'catch', 'break', 'continue')
+_COMMANDS = ('clear', )
+_INPLACE = ('setaxis', 'xlabel', 'ylabel', 'fix', 'munlock', 'mlock') # called without output, these assign to their first argument
+
+def _tokenize(text):
+    ''' returns a list of (kind, value, preceded by whitespace) with kinds num, id, str, op and sep '''
+    toks = []
+    pos = 0
+    space = False
+    while pos < len(text):
+        c = text[pos]
+        if c == "'" and not (toks and not space and (toks[-1][0] in ('num', 'id') or toks[-1][1] in (')', ']', '}', "'", ".'"))):
+            j = pos + 1
+            chars = []
+            while True:
+                if j >= len(text):
+                    raise MatlabExecutionError("Parse error: unterminated string")
+                if text[j] == "'":
+                    if text[j+1:j+2] == "'":
+                        chars.append("'")
+                        j += 2
+                        continue
+                    break
+                chars.append(text[j])
+                j += 1
+            toks.append(('str', ''.join(chars), space))
+            pos = j + 1
+            space = False
+            continue
+        if c == '%':
+            while pos < len(text) and text[pos] not in '\r\n':
+                pos += 1
+            continue
+        m = _re_token.match(text, pos)
+        if not m:
+            raise MatlabExecutionError("Parse error at '%s'" % text[pos:pos+20])
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == 'sp':
+            space = True
+            continue
+        if kind == 'nl':
+            toks.append(('sep', '\n', space))
+        elif kind == 'op' and m.group() in (',', ';'):
+            toks.append(('sep', m.group(), space))
+        else:
+            toks.append((kind, m.group(), space))
+        space = False
+    return toks
+
+class _Translator:
+    ''' recursive descent translation of a statement list to python source, evaluated against the workspace R '''
+    def __init__(self, text):
+        self.toks = _tokenize(text)
+        self.pos = 0
+        self.lines = []
+        self.nvars = 0
+        self.locals = set() # parameters of anonymous functions
+        self.inmatrix = [False] # whitespace separates elements directly inside [] and {}
+
+    def error(self, msg):
+        raise MatlabExecutionError("Parse error: %s" % msg)
+    def peek(self, k=0):
+        if self.pos + k < len(self.toks):
+            return self.toks[self.pos + k]
+        return ('eof', '', False)
+    def next(self):
+        tok = self.peek()
+        self.pos += 1
+        return tok
+    def isop(self, value, k=0):
+        tok = self.peek(k)
+        return tok[0] == 'op' and tok[1] == value
+    def expect(self, value):
+        tok = self.next()
+        if tok[1] != value or tok[0] not in ('op', 'id'):
+            self.error("expected '%s', got '%s'" % (value, tok[1]))
+    def emit(self, indent, line):
+        self.lines.append("    "*indent + line)
+    def tmp(self):
+        self.nvars += 1
+        return "_t%d" % self.nvars
+
+    def translate(self):
+        self.block(0, ())
+        if self.peek()[0] != 'eof':
+            self.error("unexpected '%s'" % self.peek()[1])
+        return "\n".join(self.lines) or "pass"
+
+    def block(self, indent, terminators):
+        ''' statements until one of the terminator keywords, which is returned but not consumed '''
+        n = len(self.lines)
+        while True:
+            while self.peek()[0] == 'sep':
+                self.next()
+            tok = self.peek()
+            if tok[0] == 'eof':
+                if terminators:
+                    self.error("missing end")
+                break
+            if tok[0] == 'id' and tok[1] in terminators:
+                break
+            self.statement(indent)
+        if len(self.lines) == n:
+            self.emit(indent, "pass")
+        return self.peek()[1]
+
+    def statement(self, indent):
+        tok = self.peek()
+        if tok[0] == 'id' and tok[1] in ('for', 'parfor'):
+            self.next()
+            var = self.next()[1]
+            self.expect('=')
+            it = self.tmp()
+            self.emit(indent, "for %s in R.iter(%s):" % (it, self.expr()))
+            self.emit(indent + 1, "R.vars[%r] = %s" % (var, it))
+            self.block(indent + 1, ('end', ))
+            self.next()
+        elif tok[0] == 'id' and tok[1] == 'if':
+            self.next()
+            self.emit(indent, "if R.true(%s):" % self.expr())
+            kw = self.block(indent + 1, ('elseif', 'else', 'end'))
+            while kw == 'elseif':
+                self.next()
+                self.emit(indent, "elif R.true(%s):" % self.expr())
+                kw = self.block(indent + 1, ('elseif', 'else', 'end'))
+            if kw == 'else':
+                self.next()
+                self.emit(indent, "else:")
+                self.block(indent + 1, ('end', ))
+            self.next()
+        elif tok[0] == 'id' and tok[1] == 'try':
+            self.next()
+            self.emit(indent, "try:")
+            kw = self.block(indent + 1, ('catch', 'end'))
+            err = self.tmp()
+            self.emit(indent, "except Exception as %s:" % err)
+            if kw == 'catch':
+                self.next()
+                name = None
+                if self.peek()[0] == 'id' and self.peek(1)[0] in ('sep', 'eof'):
+                    name = self.next()[1]
+                self.emit(indent + 1, "R.caught(%s, %r)" % (err, name))
+                self.block(indent + 1, ('end', ))
+            else:
+                self.emit(indent + 1, "R.caught(%s, None)" % err)
+            self.next()
+        elif tok[0] == 'id' and tok[1] in ('break', 'continue'):
+            self.next()
+            self.emit(indent, tok[1])
+        elif tok[0] == 'id' and tok[1] in _KEYWORDS:
+            self.error("unexpected '%s'" % tok[1])
+        elif tok[0] == 'id' and tok[1] in _COMMANDS and (self.peek(1)[0] in ('sep', 'eof') or (self.peek(1)[0] == 'id' and self.peek(1)[2])):
+            self.next()
+            words = []
+            while self.peek()[0] == 'id':
+                words.append(self.next()[1])
+            self.emit(indent, "R.call_function(%r, %r)" % (tok[1], words))
+        elif tok[0] == 'op' and tok[1] == '[' and self.multiassign(indent):
+            pass
+        else:
+            start = self.pos
+            lhs = self.lvalue()
+            if lhs and self.isop('='):
+                self.next()
+                self.emit(indent, "R.assign(%r, [%s], %s)" % (lhs[0], ", ".join(lhs[1]), self.expr()))
+                return
+            self.pos = start
+            if tok[0] == 'id' and tok[1] in _INPLACE and self.isop('(', 1):
+                self.pos = start + 2
+                lhs = self.lvalue()
+                if lhs and self.peek()[1] == ',':
+                    self.pos = start
+                    self.emit(indent, "R.assign(%r, [%s], %s)" % (lhs[0], ", ".join(lhs[1]), self.expr()))
+                    return
+                self.pos = start
+            self.emit(indent, "R.result = %s" % self.expr())
+
+    def multiassign(self, indent):
+        ''' [a, b, ...] = f(...), returns False if this is not a multiple assignment '''
+        start = self.pos
+        self.next()
+        names = []
+        while self.peek()[0] == 'id':
+            names.append(self.next()[1])
+            if self.peek()[1] == ',':
+                self.next()
+        if not self.isop(']') or not self.isop('=', 1):
+            self.pos = start
+            return False
+        self.next()
+        self.next()
+        fname = self.next()
+        if fname[0] != 'id':
+            self.error("multiple assignment requires a function call")
+        args = []
+        if self.isop('('):
+            args = self.arguments('(', ')')
+        out = self.tmp()
+        self.emit(indent, "%s = R.call(%r, [%s], %d)" % (out, fname[1], ", ".join(args), len(names)))
+        for i in range(len(names)):
+            self.emit(indent, "R.assign(%r, [], %s[%d])" % (names[i], out, i))
+        return True
+
+    def lvalue(self):
+        ''' parses name followed by (), {} and . subscripts, returns (name, [python subscripts]) or None '''
+        tok = self.peek()
+        if tok[0] != 'id' or tok[1] in _KEYWORDS:
+            return None
+        self.next()
+        subs = []
+        try:
+            while True:
+                if self.isop('('):
+                    subs.append("('()', [%s])" % ", ".join(self.arguments('(', ')')))
+                elif self.isop('{'):
+                    subs.append("('{}', [%s])" % ", ".join(self.arguments('{', '}')))
+                elif self.isop('.') and self.peek(1)[0] == 'id':
+                    self.next()
+                    subs.append("('.', %r)" % self.next()[1])
+                else:
+                    break
+        except MatlabExecutionError:
+            return None
+        return (tok[1], subs)
+
+    def arguments(self, opening, closing):
+        self.expect(opening)
+        self.inmatrix.append(False)
+        args = []
+        while not self.isop(closing):
+            if self.isop(':') and (self.peek(1)[1] in (',', closing)):
+                self.next()
+                args.append("R.COLON")
+            else:
+                args.append(self.expr())
+            if self.peek()[1] == ',':
+                self.next()
+            elif not self.isop(closing):
+                self.error("expected '%s'" % closing)
+        self.next()
+        self.inmatrix.pop()
+        return args
+
+    # expressions, in order of increasing precedence
+    def expr(self):
+        return self.oror()
+    def oror(self):
+        e = self.andand()
+        while self.isop('||'):
+            self.next()
+            e = "(R.true(%s) or R.true(%s))" % (e, self.andand())
+        return e
+    def andand(self):
+        e = self.elementor()
+        while self.isop('&&'):
+            self.next()
+            e = "(R.true(%s) and R.true(%s))" % (e, self.elementor())
+        return e
+    def elementor(self):
+        e = self.elementand()
+        while self.isop('|'):
+            self.next()
+            e = "R.op('|', %s, %s)" % (e, self.elementand())
+        return e
+    def elementand(self):
+        e = self.comparison()
+        while self.isop('&'):
+            self.next()
+            e = "R.op('&', %s, %s)" % (e, self.comparison())
+        return e
+    def comparison(self):
+        e = self.colonrange()
+        while self.peek()[0] == 'op' and self.peek()[1] in ('==', '~=', '<', '<=', '>', '>='):
+            op = self.next()[1]
+            e = "R.op(%r, %s, %s)" % (op, e, self.colonrange())
+        return e
+    def colonrange(self):
+        e = self.additive()
+        if self.isop(':') and not self.inmatrix[-1] or self.isop(':') and self.inmatrix[-1] and not self.peek()[2]:
+            self.next()
+            e2 = self.additive()
+            if self.isop(':'):
+                self.next()
+                return "R.range(%s, %s, %s)" % (e, e2, self.additive())
+            return "R.range(%s, 1.0, %s)" % (e, e2)
+        return e
+    def elementstart(self):
+        ''' inside [] and {}, "a -b" is two elements while "a - b" and "a-b" are one '''
+        tok = self.peek()
+        return self.inmatrix[-1] and tok[2] and not self.peek(1)[2]
+    def additive(self):
+        e = self.multiplicative()
+        while self.peek()[0] == 'op' and self.peek()[1] in ('+', '-') and not self.elementstart():
+            op = self.next()[1]
+            e = "R.op(%r, %s, %s)" % (op, e, self.multiplicative())
+        return e
+    def multiplicative(self):
+        e = self.unary()
+        while self.peek()[0] == 'op' and self.peek()[1] in ('*', '/', '.*', './', '\\'):
+            op = self.next()[1]
+            e = "R.op(%r, %s, %s)" % (op, e, self.unary())
+        return e
+    def unary(self):
+        if self.peek()[0] == 'op' and self.peek()[1] in ('-', '+', '~'):
+            op = self.next()[1]
+            e = self.unary()
+            if op == '-':
+                return "R.op('-', 0.0, %s)" % e
+            if op == '~':
+                return "R.negate(%s)" % e
+            return e
+        return self.power()
+    def power(self):
+        e = self.postfix()
+        while self.peek()[0] == 'op' and self.peek()[1] in ('^', '.^'):
+            op = self.next()[1]
+            if self.peek()[0] == 'op' and self.peek()[1] in ('-', '+'):
+                e = "R.op(%r, %s, %s)" % (op, e, self.unary())
+            else:
+                e = "R.op(%r, %s, %s)" % (op, e, self.postfix())
+        return e
+    def postfix(self):
+        tok = self.peek()
+        if tok[0] == 'id' and tok[1] not in _KEYWORDS:
+            self.next()
+            if tok[1] in self.locals:
+                e = "_l_%s" % tok[1]
+            elif self.isop('(') and not (self.inmatrix[-1] and self.peek()[2]):
+                e = "R.call(%r, [%s])" % (tok[1], ", ".join(self.arguments('(', ')')))
+            else:
+                e = "R.ref(%r)" % tok[1]
+        else:
+            e = self.primary()
+        while True:
+            tok = self.peek()
+            if tok[0] != 'op' or (self.inmatrix[-1] and tok[2]):
+                break
+            if tok[1] == '(':
+                e = "R.index(%s, [%s])" % (e, ", ".join(self.arguments('(', ')')))
+            elif tok[1] == '{':
+                e = "R.brace(%s, [%s])" % (e, ", ".join(self.arguments('{', '}')))
+            elif tok[1] == '.' and self.peek(1)[0] == 'id':
+                self.next()
+                e = "R.field(%s, %r)" % (e, self.next()[1])
+            elif tok[1] == '.' and self.isop('(', 1):
+                self.next()
+                self.next()
+                self.inmatrix.append(False)
+                e = "R.field(%s, %s)" % (e, self.expr())
+                self.inmatrix.pop()
+                self.expect(')')
+            elif tok[1] in ("'", ".'"):
+                self.next()
+                e = "R.transpose(%s)" % e
+            else:
+                break
+        return e
+    def primary(self):
+        tok = self.next()
+        if tok[0] == 'num':
+            return repr(float(tok[1]))
+        if tok[0] == 'str':
+            return repr(tok[1])
+        if tok[0] == 'op' and tok[1] == '(':
+            self.inmatrix.append(False)
+            e = self.expr()
+            self.inmatrix.pop()
+            self.expect(')')
+            return e
+        if tok[0] == 'op' and tok[1] in ('[', '{'):
+            closing = ']' if tok[1] == '[' else '}'
+            self.inmatrix.append(True)
+            rows = [[]]
+            while True:
+                t = self.peek()
+                if t[0] == 'eof':
+                    self.error("missing '%s'" % closing)
+                if t[0] == 'op' and t[1] == closing:
+                    self.next()
+                    break
+                if t[0] == 'sep':
+                    self.next()
+                    if t[1] in (';', '\n') and rows[-1]:
+                        rows.append([])
+                    continue
+                rows[-1].append(self.expr())
+            self.inmatrix.pop()
+            rows = "[%s]" % ", ".join(["[%s]" % ", ".join(r) for r in rows if r])
+            return "R.matrix(%s)" % rows if closing == ']' else "R.cell(%s)" % rows
+        if tok[0] == 'op' and tok[1] == '@':
+            if self.isop('('):
+                self.next()
+                params = []
+                while not self.isop(')'):
+                    params.append(self.next()[1])
+                    if self.peek()[1] == ',':
+                        self.next()
+                self.next()
+                outer = self.locals
+                self.locals = outer | set(params)
+                self.inmatrix.append(False)
+                body = self.expr()
+                self.inmatrix.pop()
+                self.locals = outer
+                return "(lambda %s: %s)" % (", ".join(["_l_%s" % p for p in params]), body)
+            return "R.handle(%r)" % self.next()[1]
+        self.error("unexpected '%s'" % tok[1])
+
+_code_cache = {}
+
+def _compile(text):
+    code = _code_cache.get(text, None)
+    if code is None:
+        code = compile(_Translator(text).translate(), '<stubmatlab>', 'exec')
+        if len(_code_cache) > 1024:
+            _code_cache.clear()
+        _code_cache[text] = code
+    return code
+
+'''
+Values: numeric arrays are 2d ndarrays, or python floats and bools, strings are python strings,
+structs are dicts, cells are _Cell, and arrays of objects or structs are 2d object ndarrays.
+'''
+
+class _Colon:
+    pass
+
+class _CSList(list):
+    ''' a comma separated list, e.g. the fields of a struct array '''
+    pass
+
+class _Cell:
+    def __init__(self, items):
+        self.items = items # 2d object ndarray
+    @staticmethod
+    def empty(shape=(0, 0)):
+        return _Cell(np.empty(shape, dtype=object))
+
+class _NoResult:
+    pass
+
+def _isobject(v):
+    return isinstance(v, (_IData, _IFunc, dict))
+
+def _num(v):
+    ''' v as a 2d numeric ndarray '''
+    if isinstance(v, np.ndarray):
+        return v if v.ndim == 2 else np.atleast_2d(v)
+    if isinstance(v, (bool, np.bool_)):
+        return np.array([[v]], dtype=bool)
+    if isinstance(v, (int, float, np.number)):
+        return np.array([[float(v)]])
+    raise MatlabExecutionError("numeric value expected, got %s" % type(v).__name__)
+
+def _scalar(v):
+    a = _num(v)
+    if a.size != 1:
+        raise MatlabExecutionError("scalar value expected")
+    return a.flat[0]
+
+def _string(v):
+    if not isinstance(v, str):
+        raise MatlabExecutionError("string value expected")
+    return v
+
+def _simplify(a):
+    ''' single elements of numeric arrays are returned as python scalars '''
+    if isinstance(a, np.ndarray) and a.size == 1 and a.dtype != object:
+        return a.flat[0].item()
+    return a
+
+def _lin(arg, n):
+    ''' zero-based linear indices of the matlab subscript arg into n elements '''
+    if isinstance(arg, _Colon):
+        return np.arange(n)
+    a = np.asarray(arg)
+    if a.dtype == bool:
+        return np.flatnonzero(a.ravel(order='F'))
+    idx = np.rint(a.astype(np.float64)).astype(np.intp).ravel(order='F') - 1
+    if np.any(idx < 0):
+        raise MatlabExecutionError("Index in position 1 is invalid. Array indices must be positive integers.")
+    return idx
+
+def _isscalarindex(arg):
+    return not isinstance(arg, _Colon) and np.asarray(arg).size == 1 and np.asarray(arg).dtype != bool
+
+def _index_array(a, args):
+    ''' a(args) for 2d ndarrays a '''
+    args = [x for i, x in enumerate(args) if i < 2 or _scalar(x) != 1]
+    if len(args) == 1:
+        idx = _lin(args[0], a.size)
+        if len(idx) > 0 and idx.max() >= a.size:
+            raise MatlabExecutionError("Index exceeds the number of array elements (%d)." % a.size)
+        flat = a.ravel(order='F')[idx]
+        if _isscalarindex(args[0]):
+            return flat[0] if a.dtype == object else flat[0].item()
+        if a.shape[0] == 1 and not isinstance(args[0], _Colon):
+            return flat.reshape((1, -1))
+        return flat.reshape((-1, 1))
+    if len(args) == 2:
+        ri = _lin(args[0], a.shape[0])
+        ci = _lin(args[1], a.shape[1])
+        if (len(ri) > 0 and ri.max() >= a.shape[0]) or (len(ci) > 0 and ci.max() >= a.shape[1]):
+            raise MatlabExecutionError("Index exceeds array bounds.")
+        r = a[np.ix_(ri, ci)]
+        if _isscalarindex(args[0]) and _isscalarindex(args[1]):
+            return r[0, 0] if a.dtype == object else r[0, 0].item()
+        return r
+    raise MatlabExecutionError("only 1 and 2 dimensional indexing is supported")
+
+def _filler(val):
+    ''' the default element of arrays holding val '''
+    if isinstance(val, _IData):
+        return _IData()
+    if isinstance(val, _IFunc):
+        return _IFunc()
+    if isinstance(val, dict):
+        return dict([(k, np.zeros((0, 0))) for k in val])
+    return None
+
+def _grown(a, shape, val):
+    ''' a, grown to at least shape, new elements are zero or default objects '''
+    shape = (max(a.shape[0], shape[0]), max(a.shape[1], shape[1]))
+    if shape == a.shape:
+        return a
+    if a.dtype == object:
+        b = np.empty(shape, dtype=object)
+        for ij in np.ndindex(shape):
+            b[ij] = _filler(val)
+    else:
+        b = np.zeros(shape, dtype=a.dtype)
+    b[:a.shape[0], :a.shape[1]] = a
+    return b
+
+def _assign_array(a, args, subsasgn, val):
+    ''' a(args) = val, where subsasgn(element, val) assigns a single element, returns the resulting array '''
+    if a is None or (isinstance(a, np.ndarray) and a.size == 0 and a.dtype != object and (_isobject(val) or subsasgn is not None)):
+        a = np.empty((0, 0), dtype=object) if (_isobject(val) or subsasgn is not None) else np.zeros((0, 0))
+    a = _num(a) if not isinstance(a, np.ndarray) else a
+    args = [x for i, x in enumerate(args) if i < 2 or _scalar(x) != 1]
+    if len(args) == 1:
+        idx = _lin(args[0], a.size)
+        if len(idx) > 0 and idx.max() >= a.size:
+            m = idx.max() + 1
+            if a.size == 0 or a.shape[0] == 1:
+                a = _grown(a, (1, m), val)
+            elif a.shape[1] == 1:
+                a = _grown(a, (m, 1), val)
+            else:
+                raise MatlabExecutionError("Attempt to grow array along ambiguous dimension.")
+        coords = list(zip(*np.unravel_index(idx, a.shape, order='F')))
+    elif len(args) == 2:
+        ri = _lin(args[0], a.shape[0])
+        ci = _lin(args[1], a.shape[1])
+        if len(ri) > 0 and len(ci) > 0:
+            a = _grown(a, (ri.max() + 1, ci.max() + 1), val)
+        coords = [(i, j) for j in ci for i in ri]
+    else:
+        raise MatlabExecutionError("only 1 and 2 dimensional indexing is supported")
+
+    if subsasgn is not None:
+        for ij in coords:
+            a[ij] = subsasgn(a[ij], val)
+        return a
+    if _isobject(val) or isinstance(val, _Cell):
+        if a.dtype != object:
+            if a.size > 0:
+                raise MatlabExecutionError("Conversion to double from %s is not possible." % type(val).__name__)
+            a = a.astype(object)
+        for ij in coords:
+            a[ij] = copy.deepcopy(val)
+        return a
+    v = _num(val)
+    if v.size == 0 and len(coords) > 0:
+        raise MatlabExecutionError("deleting elements is not supported")
+    if v.size != 1 and v.size != len(coords):
+        raise MatlabExecutionError("Unable to perform assignment because the left and right sides have a different number of elements.")
+    if a.dtype == object and a.size > 0 and not all(isinstance(x, (float, int)) for x in a.flat):
+        raise MatlabExecutionError("Conversion of numeric values to objects is not possible.")
+    if v.dtype != bool and a.dtype == bool:
+        a = a.astype(np.float64)
+    flat = v.ravel(order='F')
+    for k, ij in enumerate(coords):
+        a[ij] = flat[0] if v.size == 1 else flat[k]
+    return a
+
+def _to_engine(v):
+    ''' converts a value to what the engine returns '''
+    if isinstance(v, (bool, np.bool_)):
+        return bool(v)
+    if isinstance(v, (int, float, np.number)):
+        return float(v)
+    if isinstance(v, str):
+        return v
+    if isinstance(v, dict):
+        return dict([(k, _to_engine(v[k])) for k in v])
+    if isinstance(v, _Cell):
+        return [_to_engine(x) for x in v.items.ravel(order='F')]
+    if isinstance(v, np.ndarray):
+        if v.dtype == object:
+            return [_to_engine(x) for x in v.ravel(order='F')]
+        if v.size == 1:
+            return _to_engine(v.flat[0])
+        return double(v.astype(np.float64))
+    if v is None:
+        return None
+    raise MatlabExecutionError("%s objects can not be returned to python" % type(v).__name__)
+
+def _bytes(v):
+    if isinstance(v, np.ndarray):
+        if v.dtype == object:
+            return sum([_bytes(x) for x in v.flat])
+        return v.nbytes
+    if isinstance(v, _Cell):
+        return _bytes(v.items)
+    if isinstance(v, dict):
+        return sum([_bytes(x) for x in v.values()])
+    if isinstance(v, _IData):
+        return sum([_bytes(x) for x in [v.signal, v.error, v.monitor] + v.axes if x is not None])
+    if isinstance(v, _IFunc):
+        return 8*len(v.parnames) + _bytes(v.values)
+    if isinstance(v, str):
+        return 2*len(v)
+    return 8
+
+def _sprintf(fmt, args):
+    ''' a subset of matlab sprintf, %d of non-integers prints as %g '''
+    args = list(args)
+    def conv(m):
+        spec = m.group(0)
+        if spec == '%%':
+            return '%'
+        if not args:
+            return ''
+        a = args.pop(0)
+        if not isinstance(a, str):
+            a = _scalar(a)
+            if spec[-1] in 'di' and float(a) != int(a):
+                spec = spec[:-1] + 'g'
+            elif spec[-1] in 'di':
+                a = int(a)
+        return spec % a
+    return re.sub(r"%%|%[-+ 0#]*\d*(?:\.\d+)?[dsfgeixc]", conv, fmt).replace('\\n', '\n')
+
+class _Workspace:
+    ''' the variables of an engine, and the runtime of translated statements '''
+    COLON = _Colon()
+
+    def __init__(self):
+        self.vars = {}
+        self.lasterr = ''
+        self.result = _NoResult
+
+    def run(self, cmd, nargout):
+        try:
+            code = _compile(cmd)
+            self.result = _NoResult
+            exec(code, {'R' : self})
+        except MatlabExecutionError:
+            raise
+        except RecursionError:
+            raise MatlabExecutionError("statement too deeply nested")
+        except Exception as e:
+            raise MatlabExecutionError("%s: %s" % (type(e).__name__, str(e)))
+        if nargout == 0:
+            return None
+        if self.result is _NoResult:
+            raise MatlabExecutionError("statement produced no output")
+        return _to_engine(self.result)
+
+    # references and calls
+    def ref(self, name):
+        if name in self.vars:
+            return self.vars[name]
+        return self.call_function(name, [])
+    def call(self, name, args, nargout=1):
+        if name in self.vars:
+            return self.index(self.vars[name], args)
+        return self.call_function(name, args, nargout)
+    def call_function(self, name, args, nargout=1):
+        f = _functions.get(name, None)
+        if f is None:
+            raise MatlabExecutionError("Undefined function or variable '%s'." % name)
+        if nargout > 1:
+            return f(self, *args, nargout=nargout)
+        return f(self, *args)
+    def handle(self, name):
+        return lambda *args: self.call_function(name, list(args))
+
+    # subscripts
+    def index(self, v, args):
+        if callable(v):
+            return v(*args)
+        if isinstance(v, (_IData, _IFunc, dict, str)) or not isinstance(v, (np.ndarray, _Cell)):
+            if isinstance(v, _IData) and len(args) == 1 and np.asarray(args[0]).dtype == bool:
+                return v.signal[np.asarray(args[0])]
+            if all(not isinstance(a, _Colon) and _scalar(a) == 1 for a in args):
+                return v
+            raise MatlabExecutionError("Index exceeds the number of array elements (1).")
+        if isinstance(v, _Cell):
+            r = _index_array(v.items, args)
+            return r if isinstance(r, np.ndarray) and r.dtype == object and r.ndim == 2 and not _isscalarindex(args[0]) else _Cell(np.array([[r]], dtype=object))
+        return _index_array(v, args)
+    def brace(self, v, args):
+        if isinstance(v, _IData):
+            return _getaxis(v, int(_scalar(args[0])))
+        if not isinstance(v, _Cell):
+            raise MatlabExecutionError("Brace indexing is not supported for variables of this type.")
+        r = _index_array(v.items, args)
+        if isinstance(r, np.ndarray) and r.dtype == object and r.ndim == 2 and not all(_isscalarindex(a) for a in args):
+            return _CSList(r.ravel(order='F'))
+        return r
+    def field(self, v, name):
+        name = _string(name)
+        if isinstance(v, dict):
+            if name not in v:
+                raise MatlabExecutionError("Reference to non-existent field '%s'." % name)
+            return v[name]
+        if isinstance(v, (_IData, _IFunc)):
+            return v.getfield(name)
+        if isinstance(v, np.ndarray) and v.dtype == object:
+            if v.size == 1:
+                return self.field(v.flat[0], name)
+            if all(isinstance(x, dict) for x in v.flat):
+                return _CSList([self.field(x, name) for x in v.ravel(order='F')])
+            raise MatlabExecutionError("field access on an array of %d objects" % v.size)
+        raise MatlabExecutionError("Dot indexing is not supported for variables of this type.")
+
+    def assign(self, name, subs, val):
+        if isinstance(val, _CSList):
+            if len(val) == 0:
+                raise MatlabExecutionError("Insufficient number of outputs from right hand side.")
+            val = val[0]
+        self.vars[name] = self._subsasgn(self.vars.get(name, None), subs, copy.deepcopy(val))
+    def _subsasgn(self, cur, subs, val):
+        if not subs:
+            return val
+        kind, arg = subs[0]
+        rest = subs[1:]
+        if kind == '.':
+            if isinstance(cur, np.ndarray) and cur.dtype == object and cur.size == 1:
+                cur.flat[0] = self._subsasgn(cur.flat[0], subs, val)
+                return cur
+            if cur is None or (isinstance(cur, np.ndarray) and cur.size == 0):
+                cur = {}
+            if isinstance(cur, dict):
+                cur[arg] = self._subsasgn(cur.get(arg, None), rest, val)
+                return cur
+            if isinstance(cur, (_IData, _IFunc)):
+                cur.setfield(arg, self._subsasgn(cur.getfield(arg) if rest else None, rest, val))
+                return cur
+            raise MatlabExecutionError("Unable to perform assignment because dot indexing is not supported for variables of this type.")
+        if kind == '{}':
+            if cur is None:
+                cur = _Cell.empty()
+            if not isinstance(cur, _Cell):
+                raise MatlabExecutionError("Brace indexing is not supported for variables of this type.")
+            cur.items = _assign_array(cur.items, arg, lambda e, v: self._subsasgn(e, rest, v), val)
+            return cur
+        # parenthesis
+        if isinstance(cur, _IData) and len(arg) == 1 and np.asarray(arg[0]).dtype == bool and not rest:
+            cur.signal = cur.signal.astype(np.float64)
+            cur.signal[np.asarray(arg[0])] = _scalar(val)
+            return cur
+        if isinstance(cur, (_IData, _IFunc, dict)) and all(_isscalarindex(a) and _scalar(a) == 1 for a in arg):
+            return self._subsasgn(cur, rest, val) if rest else val
+        if isinstance(cur, _Cell):
+            cur.items = _assign_array(cur.items, arg, None, val.items[0, 0] if isinstance(val, _Cell) else val)
+            return cur
+        return _assign_array(cur, arg, (lambda e, v: self._subsasgn(e, rest, v)) if rest else None, val)
+
+    # operators
+    def op(self, o, a, b):
+        if isinstance(a, _IData) or isinstance(b, _IData):
+            return _idata_op(o, a, b)
+        if isinstance(a, _IFunc) or isinstance(b, _IFunc):
+            return _ifunc_op(o, a, b)
+        x = _num(a)
+        y = _num(b)
+        with np.errstate(all='ignore'):
+            if o in ('+', '-', '.*', './', '.^'):
+                r = {'+' : np.add, '-' : np.subtract, '.*' : np.multiply, './' : np.divide, '.^' : np.power}[o](x, y)
+            elif o in ('*', '/', '^'):
+                if x.size == 1 or y.size == 1:
+                    r = {'*' : np.multiply, '/' : np.divide, '^' : np.power}[o](x, y)
+                elif o == '*':
+                    r = x.dot(y)
+                else:
+                    raise MatlabExecutionError("matrix division and powers are not supported")
+            elif o == '\\':
+                r = np.divide(y, x)
+            elif o in ('==', '~=', '<', '<=', '>', '>='):
+                r = {'==' : np.equal, '~=' : np.not_equal, '<' : np.less, '<=' : np.less_equal, '>' : np.greater, '>=' : np.greater_equal}[o](x, y)
+            elif o in ('&', '|'):
+                r = {'&' : np.logical_and, '|' : np.logical_or}[o](x != 0, y != 0)
+            else:
+                raise MatlabExecutionError("unsupported operator %s" % o)
+        return _simplify(r)
+    def negate(self, a):
+        return _simplify(_num(a) == 0)
+    def transpose(self, a):
+        if isinstance(a, _IData):
+            return _functions['transpose'](self, a)
+        if isinstance(a, _Cell):
+            return _Cell(a.items.T.copy())
+        if isinstance(a, np.ndarray):
+            return a.T.copy()
+        return a
+    def true(self, v):
+        if isinstance(v, (bool, np.bool_, int, float, np.number)):
+            return bool(v)
+        if isinstance(v, np.ndarray) and v.dtype != object:
+            return v.size > 0 and bool(np.all(v != 0))
+        if isinstance(v, str):
+            return len(v) > 0
+        raise MatlabExecutionError("Conversion to logical from %s is not possible." % type(v).__name__)
+    def range(self, a, step, b):
+        a, step, b = float(_scalar(a)), float(_scalar(step)), float(_scalar(b))
+        n = int(np.floor((b - a)/step + 1e-10)) + 1 if step != 0 else 0
+        return a + step*np.arange(max(n, 0), dtype=np.float64).reshape((1, -1))
+    def iter(self, v):
+        if isinstance(v, (int, float)):
+            return [v]
+        if isinstance(v, np.ndarray):
+            if v.shape[0] == 1:
+                return [x if v.dtype == object else x.item() for x in v[0]]
+            return [v[:, j:j+1] for j in range(v.shape[1])]
+        raise MatlabExecutionError("for loops over %s are not supported" % type(v).__name__)
+
+    # literals
+    def matrix(self, rows):
+        out = []
+        for row in rows:
+            items = []
+            for v in row:
+                items.extend(v if isinstance(v, _CSList) else [v])
+            if items and all(isinstance(v, str) for v in items):
+                out.append(''.join(items))
+                continue
+            if any(_isobject(v) for v in items):
+                objs = []
+                for v in items:
+                    objs.extend(list(v.ravel(order='F')) if isinstance(v, np.ndarray) else [v])
+                r = np.empty((1, len(objs)), dtype=object)
+                for j in range(len(objs)):
+                    r[0, j] = objs[j]
+                out.append(r)
+                continue
+            items = [_num(v) for v in items]
+            items = [v for v in items if v.size > 0]
+            if items:
+                out.append(np.hstack(items) if len(items) > 1 else items[0])
+        if not out:
+            return np.zeros((0, 0))
+        if all(isinstance(r, str) for r in out):
+            return out[0] if len(out) == 1 else np.array([[ord(c) for c in r] for r in out], dtype=np.float64)
+        return out[0] if len(out) == 1 else np.vstack(out)
+    def cell(self, rows):
+        rows = [[x for v in row for x in (v if isinstance(v, _CSList) else [v])] for row in rows]
+        if not rows:
+            return _Cell.empty()
+        items = np.empty((len(rows), len(rows[0])), dtype=object)
+        for i in range(len(rows)):
+            if len(rows[i]) != len(rows[0]):
+                raise MatlabExecutionError("Dimensions of arrays being concatenated are not consistent.")
+            for j in range(len(rows[i])):
+                items[i, j] = rows[i][j]
+        return _Cell(items)
+
+    def caught(self, e, name):
+        self.lasterr = str(e)
+        if name:
+            self.vars[name] = {'message' : self.lasterr, 'identifier' : ''}
+
+'''
+iData and iFunc stand-ins.
+'''
+
+class _IData:
+    ''' signal, error (None means sqrt(|signal|)) and monitor, with one axis per signal dimension, each with an alias name and a label '''
+    def __init__(self, signal=None):
+        self.signal = np.zeros((0, 0)) if signal is None else _num(signal).astype(np.float64)
+        self.error = None
+        self.monitor = 1.0
+        self.axes = []
+        self.names = []
+        self.labels = []
+        self.title = ''
+        self.label = 'Data Signal'
+
+    def ndims(self):
+        if self.signal.size == 0:
+            return 0
+        if min(self.signal.shape) == 1:
+            return 1
+        return self.signal.ndim
+
+    def axis(self, i):
+        ''' values of axis i, 1-based, defaulting to the signal indices '''
+        if i <= len(self.axes) and self.axes[i-1] is not None:
+            return self.axes[i-1]
+        n = self.signal.size if self.ndims() == 1 else (self.signal.shape[i-1] if i <= self.signal.ndim else 1)
+        return np.arange(1, n + 1, dtype=np.float64).reshape((-1, 1) if i == 1 else (1, -1))
+
+    def setaxis(self, i, vals, name=None, label=None):
+        while len(self.axes) < i:
+            self.axes.append(None)
+            self.names.append(None)
+            self.labels.append('')
+        self.axes[i-1] = _num(vals).astype(np.float64)
+        if name or not self.names[i-1]:
+            self.names[i-1] = name or ('x', 'y', 'z', 't')[i-1] if i <= 4 else 'x%d' % i
+        if label is not None:
+            self.labels[i-1] = label
+
+    def getfield(self, name):
+        if name == 'Signal':
+            return self.signal
+        if name == 'Error':
+            return np.sqrt(np.abs(self.signal)) if self.error is None else self.error
+        if name == 'Monitor':
+            return self.monitor
+        if name == 'Axes':
+            names = [n for n in self.names[:self.ndims()] if n]
+            items = np.empty((1, len(names)), dtype=object)
+            for j in range(len(names)):
+                items[0, j] = names[j]
+            return _Cell(items)
+        if name in ('Title', 'Label'):
+            return self.title if name == 'Title' else self.label
+        if name in ('setaxis', 'getaxis', 'xlabel', 'ylabel'):
+            return lambda *args: _functions[name](None, self, *args)
+        if name in self.names:
+            return self.axis(self.names.index(name) + 1)
+        raise MatlabExecutionError("iData: unknown field '%s'" % name)
+
+    def setfield(self, name, val):
+        if name == 'Signal':
+            self.signal = _num(val).astype(np.float64)
+        elif name == 'Error':
+            self.error = _num(val).astype(np.float64)
+        elif name == 'Monitor':
+            self.monitor = _simplify(_num(val).astype(np.float64))
+        elif name in ('Title', 'Label'):
+            setattr(self, name.lower(), _string(val))
+        elif name in self.names:
+            self.axes[self.names.index(name)] = _num(val).astype(np.float64)
+        else:
+            raise MatlabExecutionError("iData: unknown field '%s'" % name)
+
+    def column(self, vals):
+        ''' vals shaped like the signal, if it is a vector '''
+        return np.asarray(vals).reshape(self.signal.shape) if np.size(vals) == self.signal.size else vals
+
+def _getaxis(d, i):
+    if i == 0:
+        return d.signal
+    return d.axis(i)
+
+def _idata_op(o, a, b):
+    if o in ('==', '~=', '<', '<=', '>', '>='):
+        x = a.signal if isinstance(a, _IData) else _num(a)
+        y = b.signal if isinstance(b, _IData) else _num(b)
+        return {'==' : np.equal, '~=' : np.not_equal, '<' : np.less, '<=' : np.less_equal, '>' : np.greater, '>=' : np.greater_equal}[o](x, y)
+    o = o.lstrip('.')
+    if o not in ('+', '-', '*', '/', '^'):
+        raise MatlabExecutionError("iData: unsupported operator %s" % o)
+    d = copy.deepcopy(a if isinstance(a, _IData) else b)
+    s1, e1 = (a.signal/np.asarray(a.monitor), a.getfield('Error')/np.asarray(a.monitor)) if isinstance(a, _IData) else (_num(a), 0.0)
+    if isinstance(b, _IData):
+        s2, e2 = b.signal/np.asarray(b.monitor), b.getfield('Error')/np.asarray(b.monitor)
+        if s2.shape != d.signal.shape:
+            if d.ndims() != 1 or b.ndims() != 1:
+                raise MatlabExecutionError("iData: signal shapes %s and %s do not match" % (str(d.signal.shape), str(s2.shape)))
+            xa = d.axis(1).ravel()
+            xb = b.axis(1).ravel()
+            order = np.argsort(xb)
+            s2 = d.column(np.interp(xa, xb[order], s2.ravel()[order]))
+            e2 = d.column(np.interp(xa, xb[order], np.asarray(e2).ravel()[order]))
+    else:
+        s2, e2 = _num(b), 0.0
+    with np.errstate(all='ignore'):
+        if o == '+':
+            s, e = s1 + s2, np.sqrt(e1**2 + e2**2)
+        elif o == '-':
+            s, e = s1 - s2, np.sqrt(e1**2 + e2**2)
+        elif o == '*':
+            s = s1*s2
+            e = np.sqrt((e1*s2)**2 + (e2*s1)**2)
+        elif o == '/':
+            s = s1/s2
+            e = np.sqrt((e1/s2)**2 + (e2*s1/s2**2)**2)
+        else:
+            s = np.power(s1, s2)
+            e = np.abs(s2*np.power(s1, s2 - 1)*e1)
+    d.signal = np.asarray(s, dtype=np.float64)
+    d.error = np.broadcast_to(np.asarray(e, dtype=np.float64), d.signal.shape).copy()
+    d.monitor = 1.0
+    return d
+
+class _IFunc:
+    '''
+    A model given by spec, ('builtin', name), ('expr', expression), or (operator, spec, number of parameters of spec, spec),
+    with parameter names, values, empty until set, and the set of fixed parameters
+    '''
+    def __init__(self, spec=None, parnames=()):
+        self.spec = spec
+        self.parnames = list(parnames)
+        self.values = np.zeros((0, 0))
+        self.fixed = set()
+        self.name = '' if spec is None else _spec_name(spec)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop('_fn', None)
+        return state
+
+    def fn(self, p, x):
+        f = self.__dict__.get('_fn', None)
+        if f is None:
+            if self.spec is None:
+                raise MatlabExecutionError("iFunc: the model is empty")
+            f = _model_fn(self.spec)
+            self._fn = f
+        return f(np.asarray(p, dtype=np.float64).ravel(), x)
+
+    def getfield(self, name):
+        if name == 'Parameters':
+            items = np.empty((1, len(self.parnames)), dtype=object)
+            for j in range(len(self.parnames)):
+                items[0, j] = "%s %s" % (self.parnames[j], self.name)
+            return _Cell(items)
+        if name == 'ParameterValues':
+            return self.values
+        if name in ('Name', 'Expression'):
+            return self.name
+        if name in self.parnames:
+            if self.values.size != len(self.parnames):
+                return float('nan')
+            return self.values.flat[self.parnames.index(name)].item()
+        raise MatlabExecutionError("iFunc: unknown field '%s'" % name)
+
+    def setfield(self, name, val):
+        if name == 'ParameterValues':
+            v = _num(val).astype(np.float64).reshape((1, -1))
+            if v.size not in (0, len(self.parnames)):
+                raise MatlabExecutionError("iFunc: %d parameter values given for %d parameters" % (v.size, len(self.parnames)))
+            self.values = v
+        elif name in self.parnames:
+            if self.values.size != len(self.parnames):
+                self.values = np.full((1, len(self.parnames)), np.nan)
+            self.values[0, self.parnames.index(name)] = _scalar(val)
+        else:
+            raise MatlabExecutionError("iFunc: unknown field '%s'" % name)
+
+_MODELS = {
+    'gauss' : (('Amplitude', 'Centre', 'HalfWidth', 'Background'), lambda p, x: p[0]*np.exp(-0.5*((x - p[1])/p[2])**2) + p[3]),
+    'lorz' : (('Amplitude', 'Centre', 'HalfWidth', 'Background'), lambda p, x: p[0]/(1 + ((x - p[1])/p[2])**2) + p[3]),
+    'strline' : (('Gradient', 'Constant'), lambda p, x: p[0]*x + p[1]),
+    'expon' : (('Amplitude', 'Tau', 'Background'), lambda p, x: p[0]*np.exp(-x/p[1]) + p[2]),
+}
+
+def _spec_name(spec):
+    if spec[0] in ('builtin', 'expr'):
+        return spec[1]
+    return "(%s)%s(%s)" % (_spec_name(spec[1]), spec[0], _spec_name(spec[3]))
+
+_evaluator = None
+
+def _model_fn(spec):
+    global _evaluator
+    if spec[0] == 'builtin':
+        return _MODELS[spec[1]][1]
+    if spec[0] == 'expr':
+        if _evaluator is None:
+            _evaluator = _Workspace()
+        t = _Translator(spec[1])
+        t.locals = set(('p', 'x'))
+        src = "lambda _l_p, _l_x: %s" % t.expr()
+        if t.peek()[0] != 'eof':
+            raise MatlabExecutionError("iFunc: invalid expression %s" % spec[1])
+        f = eval(src, {'R' : _evaluator})
+        return lambda p, x: np.asarray(f(p.reshape((1, -1)), x), dtype=np.float64)
+    f1 = _model_fn(spec[1])
+    f2 = _model_fn(spec[3])
+    n = spec[2]
+    if spec[0] == '+':
+        return lambda p, x: f1(p[:n], x) + f2(p[n:], x)
+    return lambda p, x: f1(p[:n], x) * f2(p[n:], x)
+
+def _model_guess(spec, x, y):
+    ''' the automatic starting parameters of spec for data y(x), iFit-like '''
+    if spec[0] == 'builtin':
+        lo, hi = float(np.min(y)), float(np.max(y))
+        width = max((float(np.max(x)) - float(np.min(x)))/10, 1e-12)
+        if spec[1] in ('gauss', 'lorz'):
+            return [hi - lo, float(x[np.argmax(y)]), width, lo]
+        if spec[1] == 'strline':
+            return list(np.polyfit(x, y, 1)) if len(x) > 1 else [0.0, hi]
+        return [float(y[np.argmin(x)]) - lo, width*3, lo]
+    if spec[0] == 'expr':
+        idx = [int(k) for k in re.findall(r"p\((\d+)\)", spec[1])]
+        return [1.0]*(max(idx) if idx else 0)
+    return _model_guess(spec[1], x, y) + _model_guess(spec[3], x, y)
+
+def _ifunc_op(o, a, b):
+    o = o.lstrip('.')
+    if not (isinstance(a, _IFunc) and isinstance(b, _IFunc)) or o not in ('+', '*'):
+        raise MatlabExecutionError("iFunc: unsupported operation %s" % o)
+    names = list(a.parnames)
+    for n in b.parnames:
+        k = 1
+        name = n
+        while name in names:
+            name = "%s_%d" % (n, k)
+            k += 1
+        names.append(name)
+    m = _IFunc((o, a.spec, len(a.parnames), b.spec), names)
+    if a.values.size == len(a.parnames) and b.values.size == len(b.parnames):
+        m.values = np.hstack([a.values.reshape((1, -1)), b.values.reshape((1, -1))])
+    m.fixed = set(a.fixed) | set([names[len(a.parnames) + b.parnames.index(n)] for n in b.fixed])
+    return m
+
+'''
+Functions.
+'''
+
+_functions = {}
+
+def _function(*names):
+    def register(f):
+        for n in names:
+            _functions[n] = f
+        return f
+    return register
+
+@_function('addpath', 'disp', 'warning', 'drawnow')
+def _f_noop(R, *args):
+    return None
+
+@_function('genpath')
+def _f_genpath(R, path):
+    return path
+
+@_function('who')
+def _f_who(R):
+    names = sorted(R.vars)
+    items = np.empty((len(names), 1), dtype=object)
+    for i in range(len(names)):
+        items[i, 0] = names[i]
+    return _Cell(items)
+
+@_function('whos')
+def _f_whos(R, *names):
+    names = names or sorted(R.vars)
+    entries = [{'name' : n, 'bytes' : float(_bytes(R.vars[n])), 'class' : type(R.vars[n]).__name__} for n in names if n in R.vars]
+    s = np.empty((len(entries), 1), dtype=object)
+    for i in range(len(entries)):
+        s[i, 0] = entries[i]
+    return s
+
+@_function('clear')
+def _f_clear(R, *names):
+    if not names:
+        R.vars.clear()
+    for n in names:
+        R.vars.pop(n, None)
+
+@_function('save')
+def _f_save(R, filename, *names):
+    names = [n for n in names if n]
+    if len(names) == 2 and names[0] == '-struct':
+        data = dict(R.vars[names[1]])
+    else:
+        data = dict([(n, R.vars[n]) for n in (names or R.vars)])
+    if os.path.splitext(filename)[1] == '':
+        filename = filename + '.mat'
+    with open(filename, 'wb') as f:
+        pickle.dump(data, f)
+
+@_function('load')
+def _f_load(R, filename):
+    if os.path.splitext(filename)[1] == '':
+        filename = filename + '.mat'
+    with open(filename, 'rb') as f:
+        R.vars.update(pickle.load(f))
+
+@_function('error')
+def _f_error(R, *args):
+    if len(args) > 1 and re.match(r"^\w+(:\w+)+$", args[0]):
+        args = args[1:]
+    raise MatlabExecutionError(_sprintf(args[0], args[1:]))
+
+@_function('sprintf')
+def _f_sprintf(R, fmt, *args):
+    return _sprintf(fmt, args)
+
+@_function('lasterr')
+def _f_lasterr(R):
+    return R.lasterr
+
+@_function('tic')
+def _f_tic(R):
+    return time.time()
+
+@_function('toc')
+def _f_toc(R, t):
+    return time.time() - _scalar(t)
+
+@_function('eps')
+def _f_eps(R):
+    return float(np.finfo(np.float64).eps)
+
+@_function('nan', 'NaN')
+def _f_nan(R):
+    return float('nan')
+
+@_function('inf', 'Inf')
+def _f_inf(R):
+    return float('inf')
+
+@_function('pi')
+def _f_pi(R):
+    return float(np.pi)
+
+@_function('true')
+def _f_true(R):
+    return True
+
+@_function('false')
+def _f_false(R):
+    return False
+
+@_function('size')
+def _f_size(R, v, dim=None):
+    if isinstance(v, _IData):
+        s = v.signal.shape
+    elif isinstance(v, np.ndarray):
+        s = v.shape
+    elif isinstance(v, _Cell):
+        s = v.items.shape
+    elif isinstance(v, str):
+        s = (1, len(v))
+    else:
+        s = (1, 1)
+    if dim is not None:
+        d = int(_scalar(dim))
+        return float(s[d-1]) if d <= len(s) else 1.0
+    return np.array([s], dtype=np.float64)
+
+@_function('ndims')
+def _f_ndims(R, v):
+    if isinstance(v, _IData):
+        return float(v.ndims())
+    return 2.0
+
+@_function('numel')
+def _f_numel(R, v):
+    return float(np.prod(_f_size(R, v)))
+
+@_function('isempty')
+def _f_isempty(R, v):
+    if isinstance(v, str):
+        return len(v) == 0
+    if isinstance(v, _Cell):
+        return v.items.size == 0
+    if isinstance(v, _IData):
+        return v.signal.size == 0
+    if isinstance(v, np.ndarray):
+        return v.size == 0
+    return False
+
+@_function('isfield')
+def _f_isfield(R, s, name):
+    return isinstance(s, dict) and name in s
+
+@_function('struct')
+def _f_struct(R, *args):
+    if len(args) % 2 != 0:
+        raise MatlabExecutionError("struct: field and value input arguments must come in pairs")
+    s = {}
+    for i in range(0, len(args), 2):
+        v = args[i+1]
+        if isinstance(v, _Cell):
+            if v.items.size != 1:
+                raise MatlabExecutionError("struct: struct arrays are not supported")
+            v = v.items.flat[0]
+        s[_string(args[i])] = v
+    return s
+
+@_function('cell')
+def _f_cell(R, *dims):
+    dims = [int(_scalar(d)) for d in dims] or [0]
+    shape = (dims[0], dims[1] if len(dims) > 1 else dims[0])
+    c = _Cell.empty(shape)
+    for ij in np.ndindex(shape):
+        c.items[ij] = np.zeros((0, 0))
+    return c
+
+@_function('cellfun')
+def _f_cellfun(R, f, c, *options):
+    opts = dict(zip(options[0::2], options[1::2]))
+    items = np.empty(c.items.shape, dtype=object)
+    for ij in np.ndindex(c.items.shape):
+        items[ij] = f(c.items[ij])
+    if opts.get('UniformOutput', True):
+        return np.array([[_scalar(x) for x in row] for row in items], dtype=np.float64).reshape(items.shape)
+    return _Cell(items)
+
+@_function('zeros', 'ones')
+def _f_zeros(R, *args):
+    ''' zeros(m, n) and zeros(object, m, n), an array of empty objects '''
+    prototype = None
+    if args and (isinstance(args[0], (_IData, _IFunc))):
+        prototype = args[0]
+        args = args[1:]
+    dims = [int(_scalar(d)) for d in args] or [1]
+    shape = (dims[0], dims[1] if len(dims) > 1 else dims[0])
+    if prototype is None:
+        return np.zeros(shape)
+    a = np.empty(shape, dtype=object)
+    for ij in np.ndindex(shape):
+        a[ij] = type(prototype)()
+    return a
+
+@_function('linspace')
+def _f_linspace(R, a, b, n=100):
+    return np.linspace(_scalar(a), _scalar(b), int(_scalar(n))).reshape((1, -1))
+
+@_function('reshape')
+def _f_reshape(R, v, *dims):
+    dims = [-1 if isinstance(d, np.ndarray) and d.size == 0 else int(_scalar(d)) for d in dims]
+    if isinstance(v, _Cell):
+        return _Cell(v.items.reshape(dims, order='F'))
+    return _num(v).reshape(dims, order='F')
+
+def _reduce(fnum, v):
+    a = _num(v)
+    if a.size == 0:
+        return np.zeros((0, 0))
+    if 1 in a.shape:
+        return fnum(a).item()
+    return fnum(a, axis=0).reshape((1, -1))
+
+def _minmax(fnum, felem):
+    def f(R, a, b=None):
+        if b is None or (isinstance(b, np.ndarray) and b.size == 0):
+            return _reduce(fnum, a)
+        return _simplify(felem(_num(a), _num(b)))
+    return f
+_functions['min'] = _minmax(np.nanmin, np.fmin)
+_functions['max'] = _minmax(np.nanmax, np.fmax)
+
+@_function('sum')
+def _f_sum(R, v):
+    return _reduce(np.sum, v)
+
+def _elementwise(fnum):
+    def f(R, v):
+        if isinstance(v, np.ndarray) and v.dtype == object:
+            out = np.empty(v.shape, dtype=object) # arrays of iData, element by element
+            for ij in np.ndindex(v.shape):
+                out[ij] = f(R, v[ij])
+            return out
+        if isinstance(v, _IData):
+            d = copy.deepcopy(v)
+            with np.errstate(all='ignore'):
+                s = d.signal/np.asarray(d.monitor)
+                e = d.getfield('Error')/np.asarray(d.monitor)
+                d.signal = np.asarray(fnum(s), dtype=np.float64)
+                ds = (fnum(s + 1e-8*np.maximum(np.abs(s), 1)) - d.signal)/(1e-8*np.maximum(np.abs(s), 1)) # the derivative, for the error
+                d.error = np.abs(ds*e)
+                d.monitor = 1.0
+            return d
+        with np.errstate(all='ignore'):
+            return _simplify(np.asarray(fnum(_num(v)), dtype=np.float64))
+    return f
+for _name, _fnum in (('abs', np.abs), ('sqrt', np.sqrt), ('exp', np.exp), ('log', np.log), ('log10', np.log10),
+                     ('sin', np.sin), ('cos', np.cos), ('round', np.round), ('floor', np.floor), ('ceil', np.ceil)):
+    _functions[_name] = _elementwise(_fnum)
+
+@_function('real', 'double')
+def _f_real(R, v):
+    return v
+
+@_function('power')
+def _f_power(R, a, b):
+    return R.op('.^', a, b)
+
+@_function('transpose')
+def _f_transpose(R, v):
+    if not isinstance(v, _IData):
+        return _num(v).T.copy()
+    d = copy.deepcopy(v)
+    d.signal = d.signal.T.copy()
+    if d.error is not None:
+        d.error = d.error.T.copy()
+    if d.ndims() == 2:
+        d.axes = [None if a is None else a.T.copy() for a in d.axes[:2]][::-1] + d.axes[2:]
+        d.names = d.names[:2][::-1] + d.names[2:]
+        d.labels = d.labels[:2][::-1] + d.labels[2:]
+    return d
+
+@_function('copyobj')
+def _f_copyobj(R, v):
+    return copy.deepcopy(v)
+
+@_function('rgb2gray')
+def _f_rgb2gray(R, v):
+    a = np.asarray(v, dtype=np.float64)
+    if a.ndim == 3:
+        a = a[:, :, :3].dot([0.2989, 0.5870, 0.1140])
+    return a
+
+def _read_data(url):
+    ''' reads a numeric text file, McCode headers give axis names, labels and the 2d layout '''
+    if not os.path.isfile(url):
+        raise MatlabExecutionError("iData: file not found: %s" % url)
+    if os.path.splitext(url)[1].lower() in ('.png', '.jpg'):
+        from PIL import Image
+        return _IData(np.asarray(Image.open(url), dtype=np.float64))
+    header = {}
+    blocks = {'Data' : []}
+    block = 'Data'
+    with open(url) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('#'):
+                m = re.match(r"#\s*(\w+)\s*:\s*(.*)", line)
+                if m:
+                    header[m.group(1)] = m.group(2).strip()
+                m = re.match(r"#\s*(Data|Errors|Events)\b", line)
+                if m:
+                    block = m.group(1)
+                    blocks[block] = []
+                continue
+            if line:
+                blocks[block].append([float(x) for x in line.split()])
+    rows = blocks['Data']
+    if not rows:
+        raise MatlabExecutionError("iData: no data in %s" % url)
+    d = _IData()
+    d.title = header.get('title', os.path.basename(url))
+    if header.get('type', '').startswith('array_2d'):
+        d.signal = np.array(rows, dtype=np.float64)
+        if blocks.get('Errors', None):
+            d.error = np.array(blocks['Errors'], dtype=np.float64)
+        lims = [float(x) for x in header.get('xylimits', '').split()]
+        if len(lims) == 4:
+            d.setaxis(1, np.linspace(lims[2], lims[3], d.signal.shape[0]).reshape((-1, 1)), 'y', header.get('ylabel', ''))
+            d.setaxis(2, np.linspace(lims[0], lims[1], d.signal.shape[1]).reshape((1, -1)), 'x', header.get('xlabel', ''))
+        d.label = header.get('zlabel', d.label)
+        return d
+    cols = np.array(rows, dtype=np.float64)
+    if cols.shape[1] == 1:
+        d.signal = cols
+        return d
+    variables = header.get('variables', '').split()
+    d.signal = cols[:, 1:2].copy()
+    if cols.shape[1] > 2:
+        d.error = cols[:, 2:3].copy()
+    d.setaxis(1, cols[:, 0:1].copy(), header.get('xvar', variables[0] if variables else 'x'), header.get('xlabel', ''))
+    d.label = header.get('ylabel', d.label)
+    return d
+
+@_function('iData')
+def _f_idata(R, *args):
+    if not args:
+        return _IData()
+    v = args[0]
+    if isinstance(v, str):
+        return _read_data(v)
+    if isinstance(v, _IData):
+        return copy.deepcopy(v)
+    return _IData(v)
+
+@_function('combine')
+def _f_combine(R, *datasets):
+    ''' merges 1d datasets into one, sorted by axis values, and adds 2d datasets of equal shape '''
+    d = copy.deepcopy(datasets[0])
+    if all(x.ndims() == 1 for x in datasets):
+        x = np.concatenate([x.axis(1).ravel() for x in datasets])
+        s = np.concatenate([(x_.signal/np.asarray(x_.monitor)).ravel() for x_ in datasets])
+        e = np.concatenate([(x_.getfield('Error')/np.asarray(x_.monitor)).ravel() for x_ in datasets])
+        order = np.argsort(x, kind='stable')
+        d.signal = s[order].reshape((-1, 1))
+        d.error = e[order].reshape((-1, 1))
+        d.monitor = 1.0
+        d.setaxis(1, x[order].reshape((-1, 1)))
+        return d
+    for x in datasets[1:]:
+        d = _idata_op('+', d, x)
+    return d
+
+@_function('getaxis')
+def _f_getaxis(R, d, i):
+    return _getaxis(d, int(_scalar(i)))
+
+@_function('setaxis')
+def _f_setaxis(R, d, i, vals):
+    d = copy.deepcopy(d)
+    i = int(_scalar(i))
+    if i == 0:
+        d.signal = _num(vals).astype(np.float64)
+    else:
+        d.setaxis(i, vals)
+    return d
+
+def _label(i):
+    def f(R, d, label=None):
+        if label is None:
+            if i == 2 and d.ndims() <= 1:
+                return d.label
+            return d.labels[i-1] if i <= len(d.labels) else ''
+        d = copy.deepcopy(d)
+        if i == 2 and d.ndims() <= 1:
+            d.label = _string(label)
+        else:
+            if len(d.axes) < i:
+                d.setaxis(i, d.axis(i))
+            d.labels[i-1] = _string(label)
+        return d
+    return f
+_functions['xlabel'] = _label(1)
+_functions['ylabel'] = _label(2)
+
+def _limits(i):
+    def f(R, d, lims, mode='include'):
+        d = copy.deepcopy(d)
+        if d.ndims() < i:
+            return d
+        lo, hi = np.ravel(_num(lims))[:2]
+        x = d.axis(i)
+        keep = (x >= lo) & (x <= hi)
+        if mode == 'exclude':
+            keep = ~keep
+        keep = keep.ravel()
+        if d.ndims() == 1:
+            d.signal = d.signal.ravel()[keep].reshape((-1, 1))
+            d.error = d.getfield('Error') if d.error is None else d.error
+            d.error = np.asarray(d.error).ravel()[keep].reshape((-1, 1))
+            d.axes[0] = x.ravel()[keep].reshape((-1, 1))
+        else:
+            sl = (keep, slice(None)) if i == 1 else (slice(None), keep)
+            d.signal = d.signal[sl]
+            if d.error is not None:
+                d.error = d.error[sl]
+            d.axes[i-1] = x.ravel()[keep].reshape((-1, 1) if i == 1 else (1, -1))
+        return d
+    return f
+_functions['xlim'] = _limits(1)
+_functions['ylim'] = _limits(2)
+
+@_function('interp')
+def _f_interp(R, d, newaxis):
+    if d.ndims() != 1:
+        raise MatlabExecutionError("interp: only 1d datasets are supported by the stub engine")
+    d = copy.deepcopy(d)
+    x = d.axis(1).ravel()
+    order = np.argsort(x)
+    xn = np.ravel(_num(newaxis))
+    e = d.getfield('Error')
+    d.signal = np.interp(xn, x[order], d.signal.ravel()[order]).reshape((-1, 1))
+    d.error = np.interp(xn, x[order], np.ravel(e)[order]).reshape((-1, 1))
+    d.setaxis(1, xn.reshape((-1, 1)))
+    return d
+
+@_function('cat')
+def _f_cat(R, dim, datasets):
+    ''' stacks an array of 1d datasets as the columns of a 2d dataset, interpolated on the axis of the first '''
+    lst = list(datasets.ravel(order='F')) if isinstance(datasets, np.ndarray) else [datasets]
+    x = lst[0].axis(1).ravel()
+    rows = []
+    errs = []
+    for d in lst:
+        xd = d.axis(1).ravel()
+        order = np.argsort(xd)
+        rows.append(np.interp(x, xd[order], (d.signal/np.asarray(d.monitor)).ravel()[order]))
+        errs.append(np.interp(x, xd[order], np.ravel(d.getfield('Error'))[order]))
+    out = _IData(np.array(rows).T)
+    out.error = np.array(errs).T
+    out.setaxis(1, np.arange(1, len(lst) + 1, dtype=np.float64).reshape((-1, 1)))
+    out.setaxis(2, x.reshape((1, -1)))
+    return out
+
+def _builtin(name):
+    def f(R, *args):
+        m = _IFunc(('builtin', name), _MODELS[name][0])
+        if args:
+            m.values = _num(args[0]).astype(np.float64).reshape((1, -1))
+        return m
+    return f
+for _name in _MODELS:
+    _functions[_name] = _builtin(_name)
+
+@_function('iFunc')
+def _f_ifunc(R, expr=None):
+    if expr is None or expr == 'iFunc':
+        return _IFunc()
+    if isinstance(expr, _IFunc):
+        return copy.deepcopy(expr)
+    idx = [int(k) for k in re.findall(r"p\((\d+)\)", _string(expr))]
+    return _IFunc(('expr', expr), ["p%d" % (i + 1) for i in range(max(idx) if idx else 0)])
+
+@_function('feval')
+def _f_feval(R, m, p, x):
+    with np.errstate(all='ignore'):
+        return np.asarray(m.fn(np.ravel(_num(p)), _num(x)), dtype=np.float64).reshape((1, -1))
+
+def _fixing(fixed):
+    def f(R, m, *names):
+        m = copy.deepcopy(m)
+        for n in names:
+            if fixed:
+                m.fixed.add(n)
+            else:
+                m.fixed.discard(n)
+        return m
+    return f
+_functions['fix'] = _fixing(True)
+_functions['mlock'] = _fixing(True)
+_functions['munlock'] = _fixing(False)
+
+@_function('fits')
+def _f_fits(R, d, m, guess='', optimizer='', *options, nargout=1):
+    ''' [pars, criteria, message, output] = fits(data, model, guess, optimizer), a least squares fit using scipy '''
+    from scipy.optimize import least_squares
+    if not isinstance(d, _IData) or not isinstance(m, _IFunc):
+        raise MatlabExecutionError("fits: data and model expected")
+    if d.ndims() != 1:
+        raise MatlabExecutionError("fits: only 1d datasets are supported by the stub engine")
+    x = d.axis(1).ravel()
+    y = (d.signal/np.asarray(d.monitor)).ravel()
+    e = (np.asarray(d.getfield('Error'))/np.asarray(d.monitor)).ravel()
+    e = np.where(np.isfinite(e) & (e > 0), e, 1.0)
+    ok = np.isfinite(x) & np.isfinite(y)
+    x, y, e = x[ok], y[ok], e[ok]
+    if isinstance(guess, np.ndarray) and guess.size == len(m.parnames):
+        p0 = guess.astype(np.float64).ravel()
+    else:
+        p0 = np.array(_model_guess(m.spec, x, y), dtype=np.float64)
+    free = np.array([n not in m.fixed for n in m.parnames], dtype=bool)
+    t = time.time()
+    nfev = 0
+    if free.any() and len(x) > 0:
+        def residuals(pf):
+            p = p0.copy()
+            p[free] = pf
+            with np.errstate(all='ignore'):
+                r = (m.fn(p, x) - y)/e
+            return np.where(np.isfinite(r), r, 1e10)
+        res = least_squares(residuals, p0[free], method='lm' if len(x) >= free.sum() else 'trf')
+        p0[free] = res.x
+        nfev = res.nfev
+        message = res.message
+    else:
+        message = "no free parameters"
+    with np.errstate(all='ignore'):
+        chi2 = float(np.sum(((m.fn(p0, x) - y)/e)**2)/max(len(x) - free.sum(), 1))
+    fitted = copy.deepcopy(m)
+    fitted.values = p0.reshape((1, -1))
+    pars = p0.reshape((1, -1))
+    output = {'model' : fitted, 'iterations' : float(nfev), 'funcCount' : float(nfev), 'parsBest' : pars, 'criteria' : chi2,
+              'duration' : time.time() - t, 'optimizer' : optimizer}
+    return (pars, chi2, message, output)[:max(nargout, 1)] if nargout > 1 else pars